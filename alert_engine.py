@@ -0,0 +1,206 @@
+# alert_engine.py
+"""Threshold and pattern alerts on intake, visit and resource events.
+
+Rules are indexed by (event type, field), so an event only runs the rules
+watching a field it carries (or, for resources, a field that changed). An
+alert fires for a key such as a ward or a document number at most once per
+rule cooldown, and for resource levels only when the condition starts to
+hold, not on every update while it holds. Fired alerts go to a bounded queue
+that pages poll by sequence number.
+"""
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import datetime
+import pandas as pd
+from province_overview import ProvinceOverview
+
+QUEUE_SIZE = 500
+COOLDOWN_SECONDS = 30 * 60
+LOW_BEDS_FRACTION = 0.1
+LOW_STOCK_UNITS = 20
+HIGH_VISIT_COST = 20_000
+SEVERITIES = ('info', 'warning', 'critical')
+# Events reporting a level that persists: their alerts fire when the condition starts
+# holding, not on every update while it holds. Intakes and visits are one-off events.
+LEVEL_EVENTS = ('resource',)
+
+class Rule:
+    """A named check on one event type, run when any of its watched fields is present or changed.
+
+    `check(record)` returns True when the alert condition holds; `message` is
+    formatted with the record's fields; `key` names the fields that identify
+    what the alert is about (one ward, one document).
+    """
+    def __init__(self, name, event, watches, check, message, severity='warning', key=(), cooldown=COOLDOWN_SECONDS):
+        if severity not in SEVERITIES:
+            raise ValueError(f"Unknown severity '{severity}'")
+        self.name = name
+        self.event = event
+        self.watches = tuple(watches)
+        self.check = check
+        self.message = message
+        self.severity = severity
+        self.key = tuple(key)
+        self.cooldown = cooldown
+
+def threshold_rule(name, event, field, below=None, above=None, **kwargs):
+    """Rule firing when record[field] drops below `below` or rises above `above`"""
+    def check(record):
+        value = pd.to_numeric(record.get(field), errors='coerce')
+        if pd.isna(value):
+            return False
+        return (below is not None and value < below) or (above is not None and value > above)
+    return Rule(name, event, [field], check, **kwargs)
+
+def _low_beds(record):
+    total = pd.to_numeric(record.get('total_beds'), errors='coerce')
+    available = pd.to_numeric(record.get('available_beds'), errors='coerce')
+    return bool(total > 0 and available < total * LOW_BEDS_FRACTION)
+
+def _document_mismatch(record):
+    south_african = record.get('nationality') == 'South African'
+    return (record.get('doc_type') == 'RSA ID' and not south_african) or (record.get('doc_type') == 'Passport' and south_african)
+
+def _reused_document():
+    """Pattern: one document number presented under different names"""
+    names = {}
+    def check(record):
+        doc = str(record.get('doc_number') or '').strip().upper()
+        name = ' '.join(str(record.get('name') or '').lower().split())
+        if not doc or not name:
+            return False
+        previous = names.setdefault(doc, name)
+        record['previous_name'] = previous
+        return previous != name
+    return check
+
+def default_rules():
+    """Fresh instances of the built-in rules (pattern rules keep their own state)"""
+    return [
+        Rule('low_beds', 'resource', ['available_beds', 'total_beds'], _low_beds,
+             "{hospital} / {ward}: only {available_beds} of {total_beds} beds available",
+             severity='critical', key=['hospital', 'ward']),
+        threshold_rule('low_stock', 'resource', 'lowest_stock', below=LOW_STOCK_UNITS,
+                       message="{hospital} / {ward}: {lowest_stock_medication} down to {lowest_stock} units",
+                       key=['hospital', 'ward']),
+        threshold_rule('no_doctors', 'resource', 'doctors', below=1,
+                       message="{hospital} / {ward}: no doctors on duty", severity='critical', key=['hospital', 'ward']),
+        Rule('document_mismatch', 'intake', ['doc_type', 'nationality'], _document_mismatch,
+             "{name}: {doc_type} presented with nationality {nationality}", key=['doc_number']),
+        Rule('reused_document', 'intake', ['doc_number', 'name'], _reused_document(),
+             "Document {doc_number} presented by {name}, previously by {previous_name}",
+             severity='critical', key=['doc_number', 'name']),
+        threshold_rule('high_cost_visit', 'visit', 'cost', above=HIGH_VISIT_COST,
+                       message="{patient_name}: visit cost R{cost} at {hospital}", severity='info',
+                       key=['patient_name', 'visit_date']),
+    ]
+
+def _same(a, b):
+    return a == b or (pd.isna(a) and pd.isna(b))
+
+class _Fields(dict):
+    def __missing__(self, key):
+        return '?'
+
+class AlertEngine:
+    """Rule registry indexed by watched field, with de-duplication, cooldowns and a polled alert queue"""
+    def __init__(self, rules=None, queue_size=QUEUE_SIZE):
+        self._index = defaultdict(list)     # (event, field) -> rules watching it
+        self.rules = {}
+        self._active = set()                # (rule, key) whose condition currently holds
+        self._last_fired = {}               # (rule, key) -> monotonic time
+        self._queue = deque(maxlen=queue_size)
+        self._seq = 0
+        self._wards = {}                    # (hospital, ward) -> last seen resource levels
+        self._resources_version = None
+        self._lock = threading.Lock()
+        self.stats = {'events': 0, 'evaluated': 0, 'fired': 0, 'suppressed': 0}
+        for rule in default_rules() if rules is None else rules:
+            self.register(rule)
+
+    def register(self, rule):
+        if rule.name in self.rules:
+            raise ValueError(f"Rule '{rule.name}' already registered")
+        self.rules[rule.name] = rule
+        for field in rule.watches:
+            self._index[(rule.event, field)].append(rule)
+        return rule
+
+    def process(self, event, record, changed=None):
+        """Run the rules watching the record's fields (or only `changed`); returns the alerts fired"""
+        record = dict(record)
+        fields = record.keys() if changed is None else changed
+        rules = dict.fromkeys(rule for field in fields for rule in self._index.get((event, field), ()))
+        fired = []
+        with self._lock:
+            self.stats['events'] += 1
+            for rule in rules:
+                self.stats['evaluated'] += 1
+                state = (rule.name, tuple(str(record.get(field)) for field in rule.key))
+                if not rule.check(record):
+                    self._active.discard(state)
+                    continue
+                if event in LEVEL_EVENTS:
+                    if state in self._active:
+                        continue        # still the same condition: already alerted
+                    self._active.add(state)
+                now = time.monotonic()
+                if now - self._last_fired.get(state, float('-inf')) < rule.cooldown:
+                    self.stats['suppressed'] += 1
+                    continue
+                self._last_fired[state] = now
+                self._seq += 1
+                alert = {
+                    'seq': self._seq,
+                    'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                    'rule': rule.name,
+                    'severity': rule.severity,
+                    'event': event,
+                    'message': rule.message.format_map(_Fields(record)),
+                }
+                self._queue.append(alert)
+                self.stats['fired'] += 1
+                fired.append(alert)
+        return fired
+
+    def observe_resources(self, resources_df, version=None):
+        """Feed a resource snapshot; only wards with changed levels (and only their changed fields) are evaluated.
+
+        `version` is a cheap identity of the frame (the data cache's dataset
+        version); the frame is hashed only when none is given.
+        """
+        if version is None:
+            version = int(pd.util.hash_pandas_object(resources_df, index=False).sum()) if not resources_df.empty else 0
+        if version == self._resources_version:
+            return []
+        self._resources_version = version
+        overview = ProvinceOverview(resources_df)
+        stock = overview.stock.sort_values('stock', kind='stable').drop_duplicates(['hospital', 'ward'])
+        wards = overview.wards.merge(
+            stock.rename(columns={'stock': 'lowest_stock', 'medication': 'lowest_stock_medication'}),
+            on=['hospital', 'ward'], how='left'
+        )
+        fired = []
+        for row in wards.to_dict('records'):
+            ward = (row['hospital'], row['ward'])
+            previous = self._wards.get(ward)
+            changed = list(row) if previous is None else [f for f, value in row.items() if not _same(previous.get(f), value)]
+            self._wards[ward] = row
+            if changed:
+                fired.extend(self.process('resource', row, changed))
+        return fired
+
+    def poll(self, after=0, limit=None):
+        """Alerts with seq > after, oldest first; O(new alerts)"""
+        with self._lock:
+            new = []
+            for alert in reversed(self._queue):
+                if alert['seq'] <= after or (limit is not None and len(new) == limit):
+                    break
+                new.append(alert)
+        return new[::-1]
+
+    @property
+    def last_seq(self):
+        return self._seq
@@ -0,0 +1,138 @@
+# analytics_export.py
+import gzip
+import hashlib
+import hmac
+import os
+import sys
+import tempfile
+from functools import lru_cache
+import pandas as pd
+from data_loader import CHUNK_SIZE
+
+# Stable across exports so analysts can join extracts on tokens; never shipped with the data
+KEY_ENV = "ANALYTICS_HMAC_KEY"
+KEY_PATH = os.path.join("data", "analytics_export.key")
+KEY_BYTES = 32
+TOKEN_LENGTH = 16
+
+# Identifying column -> token column; the originals never leave the server. Where several
+# columns feed one token, the first with a real value wins, so the order is the priority.
+PII_COLUMNS = {
+    'full_name': 'patient_token',
+    'patient_name': 'patient_token',
+    'name': 'patient_token',
+    'doc_number': 'doc_token',
+    'id_number': 'doc_token',
+    'passport_number': 'doc_token',
+}
+# Direct identifiers with no analytic use are dropped; date of birth is coarsened to the year
+DROP_COLUMNS = ['medical_aid']
+# Filler the intake forms write instead of leaving a field blank; tokenized as missing
+PLACEHOLDER_VALUES = ['', 'unknown']
+
+def _read_key(path):
+    try:
+        with open(path, 'rb') as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+def load_key(path=KEY_PATH):
+    """HMAC key from the environment, else a per-install key created on first use.
+
+    A new key is written to a private temp file and linked into place, so a
+    concurrent reader sees either no key file or the whole key; the process
+    that loses the race uses the winner's key.
+    """
+    if os.environ.get(KEY_ENV):
+        return os.environ[KEY_ENV].encode('utf-8')
+    key = _read_key(path)
+    if key is None:
+        directory = os.path.dirname(path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")     # created 0600
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(os.urandom(KEY_BYTES).hex().encode('ascii'))
+                f.flush()
+                os.fsync(f.fileno())
+            try:
+                os.link(tmp_path, path)
+            except FileExistsError:
+                pass
+        finally:
+            os.remove(tmp_path)
+        key = _read_key(path)
+    if key is None or len(key) < 2 * KEY_BYTES:
+        raise ValueError(f"Analytics key at {path} is shorter than {2 * KEY_BYTES} hex characters")
+    return key
+
+class Pseudonymizer:
+    """Keyed HMAC-SHA256 tokens for names and document numbers, memoized per distinct value"""
+    def __init__(self, key=None, cache_size=1_000_000):
+        self._key = key or load_key()
+        self.token = lru_cache(maxsize=cache_size)(self._token)
+
+    def _token(self, kind, value):
+        digest = hmac.new(self._key, f"{kind}:{value}".encode('utf-8'), hashlib.sha256).hexdigest()
+        return digest[:TOKEN_LENGTH]
+
+    def tokenize(self, series, kind):
+        """Tokens for a column; only distinct values in the chunk are hashed, and repeats hit the cache"""
+        normalized = series.astype('string').str.strip().str.split().str.join(' ')
+        normalized = normalized.mask(normalized.str.lower().isin(PLACEHOLDER_VALUES))
+        normalized = normalized.str.upper() if kind == 'doc' else normalized.str.lower()
+        codes, uniques = pd.factorize(normalized)
+        tokens = pd.array([self.token(kind, value) for value in uniques] + [pd.NA], dtype='string')
+        # factorize marks missing values with -1, which indexes the trailing NA
+        return pd.Series(tokens[codes], index=series.index)
+
+    def token_for(self, value, kind):
+        """Token for a single value, normalized exactly as tokenize does; None if missing or a placeholder"""
+        token = self.tokenize(pd.Series([value], dtype=object), kind).iloc[0]
+        return None if pd.isna(token) else token
+
+    def pseudonymize(self, chunk):
+        out = chunk.drop(columns=[c for c in DROP_COLUMNS if c in chunk.columns])
+        if 'dob' in out.columns:
+            out['dob'] = pd.to_datetime(out['dob'], format='%Y-%m-%d', errors='coerce').dt.year.astype('Int64')
+            out = out.rename(columns={'dob': 'birth_year'})
+        for column, token_column in PII_COLUMNS.items():
+            if column in out.columns:
+                tokens = self.tokenize(out[column], 'doc' if token_column == 'doc_token' else 'name')
+                out = out.drop(columns=column)
+                if token_column in out.columns:
+                    out[token_column] = out[token_column].fillna(tokens)
+                else:
+                    out.insert(0, token_column, tokens)
+        return out
+
+def write_export(source, fileobj, chunksize=CHUNK_SIZE, pseudonymizer=None, compresslevel=6):
+    """Stream source CSV -> pseudonymized, gzipped CSV on fileobj, one chunk in memory at a time.
+
+    Returns the number of rows written.
+    """
+    pseudonymizer = pseudonymizer or Pseudonymizer()
+    rows = 0
+    with gzip.GzipFile(fileobj=fileobj, mode='wb', compresslevel=compresslevel) as gz:
+        for i, chunk in enumerate(pd.read_csv(source, chunksize=chunksize, encoding='utf-8-sig', dtype=str)):
+            gz.write(pseudonymizer.pseudonymize(chunk).to_csv(index=False, header=i == 0).encode('utf-8'))
+            rows += len(chunk)
+    return rows
+
+def export_file(source, destination, chunksize=CHUNK_SIZE, pseudonymizer=None):
+    """Write the export to a path via a temp file, so a partial extract is never left behind"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(destination) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            rows = write_export(source, f, chunksize, pseudonymizer)
+        os.replace(tmp_path, destination)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return rows
+
+if __name__ == "__main__":
+    source = sys.argv[1] if len(sys.argv) > 1 else os.path.join("data", "intake_logs.csv")
+    destination = sys.argv[2] if len(sys.argv) > 2 else "intake_logs_analytics.csv.gz"
+    print(f"Exported {export_file(source, destination)} rows to {destination}")
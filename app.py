@@ -2,10 +2,25 @@ import streamlit as st
 import pandas as pd
 import hashlib
 import logging
+import os
+import tempfile
 from datetime import datetime, timedelta
 import pytz
-from treatment_ai import generate_treatment_plan
-from resource_predictor import predict_resources
+from treatment_ai import generate_treatment_plan, treatment_ai
+from treatment_plans import CONDITIONS, tariff_catalog, patient_category
+from data_loader import load_streaming_aggregates, session_memory_report
+from invoicing import render_invoice, write_invoice_archive
+from medication_stock import ConsumptionEngine
+from capacity_simulator import ARRIVAL_HISTORY_DAYS
+from partitioned_store import hospital_options, hospital_view, has_partitions, append_visit, list_hospitals, load_resources
+from visit_segments import VisitSegmentStore
+from data_cache import SharedDataCache
+from schema_migration import CANONICAL_SCHEMAS, has_store, load_canonical
+from cost_rollups import CostRollups
+from audit_log import record_event
+from alert_engine import AlertEngine
+from resource_monitoring import (load_overview, display_province_overview, display_forecast,
+                                 display_capacity_simulation, display_ward_grid, display_hospital_summary)
 
 SA_TIMEZONE = pytz.timezone('Africa/Johannesburg')
 
@@ -40,57 +55,166 @@ if not authenticate_user():
     st.stop()
 
 # ====== DATA LOADING ======
-@st.cache_data(ttl=300)
+DATA_DIR = "data"
+PATIENTS_PATH = os.path.join(DATA_DIR, "intake_logs.csv")
+VISITS_PATH = os.path.join(DATA_DIR, "visits.csv")
+RESOURCES_PATH = os.path.join(DATA_DIR, "resources.csv")
+COSTS_PATH = os.path.join(DATA_DIR, "costs.csv")
+
+PATIENT_COLUMNS = ['name', 'doc_number', 'doc_type', 'nationality', 'result', 'legal_status', 'timestamp']
+VISIT_COLUMNS = ['patient_name', 'visit_date', 'diagnosis', 'treatment', 'cost', 'hospital', 'ward']
+RESOURCE_COLUMNS = ['hospital', 'ward', 'total_beds', 'available_beds', 'medications', 'medication_stock', 'doctors', 'nurses']
+# Older resources.csv files hold one headerless province-wide line in this layout instead of ward rows
+RESOURCE_SUMMARY_COLUMNS = list(CANONICAL_SCHEMAS['resource_summary'])
+
+def read_source(path, columns, required=()):
+    """CSV at path with at least the given columns; empty if missing or not in the expected layout"""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return pd.DataFrame(columns=columns)
+    df = pd.read_csv(path)
+    if not set(required).issubset(df.columns):
+        return pd.DataFrame(columns=columns)
+    for col in columns:
+        if col not in df.columns:
+            df[col] = pd.NA
+    return df
+
+def read_resource_summary(path):
+    """Numeric rows of a headerless province summary file; other lines are dropped"""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return pd.DataFrame(columns=RESOURCE_SUMMARY_COLUMNS)
+    summary = pd.read_csv(path, header=None, names=RESOURCE_SUMMARY_COLUMNS, dtype=str)
+    return summary.apply(pd.to_numeric, errors='coerce').dropna(how='all').reset_index(drop=True)
+
+def read_raw_sources():
+    """Visits, resources, resource summary and costs straight from the CSVs, reconciled on every load"""
+    visits_df = read_source(VISITS_PATH, VISIT_COLUMNS, required=['visit_date'])
+    resources_df = read_source(RESOURCES_PATH, RESOURCE_COLUMNS, required=['hospital', 'ward'])
+    costs_df = read_source(COSTS_PATH, ['date', 'amount'], required=['date'])
+
+    for col in RESOURCE_COLUMNS:
+        if col not in resources_df.columns:
+            resources_df[col] = '' if col in ['medications', 'doctors', 'nurses'] else 0
+
+    visits_df['visit_date'] = pd.to_datetime(
+        visits_df.get('visit_date', datetime.now(SA_TIMEZONE).strftime('%Y-%m-%d')),
+        errors='coerce'
+    ).dt.strftime('%Y-%m-%d')
+
+    costs_df['date'] = pd.to_datetime(
+        costs_df.get('date', datetime.now(SA_TIMEZONE).strftime('%Y-%m-%d')),
+        errors='coerce'
+    )
+    costs_df = costs_df[costs_df['date'].notna()].copy()
+    costs_df['date'] = costs_df['date'].dt.strftime('%Y-%m-%d')
+    costs_df['amount'] = pd.to_numeric(costs_df.get('amount', 0), errors='coerce')
+
+    summary_df = read_resource_summary(RESOURCES_PATH) if resources_df.empty else pd.DataFrame(columns=RESOURCE_SUMMARY_COLUMNS)
+    return visits_df, resources_df, summary_df, costs_df
+
+def read_data():
+    """Full load of the data files; runs on first use and in the cache's background refresh.
+
+    Visits, resources and costs come from the canonical store when one has been
+    migrated (rebuilt there if a source changed); read_raw_sources only runs
+    when there is no store. The intake log is not part of the store.
+    """
+    patients_df = read_source(PATIENTS_PATH, PATIENT_COLUMNS, required=['name', 'doc_number'])
+    if has_store(DATA_DIR):
+        canonical = load_canonical(DATA_DIR)
+        visits_df = canonical['visits'].assign(visit_date=canonical['visits']['visit_date'].dt.strftime('%Y-%m-%d'))
+        resources_df = canonical['resources']
+        summary_df = canonical['resource_summary']
+        costs_df = canonical['cost_ledger'].assign(date=canonical['cost_ledger']['date'].dt.strftime('%Y-%m-%d'))
+    else:
+        visits_df, resources_df, summary_df, costs_df = read_raw_sources()
+    # Ward rows live in the hospital partitions once those are written
+    if resources_df.empty and has_partitions():
+        resources_df = load_resources(list_hospitals())
+
+    patients_df['name'] = patients_df['name'].fillna('Unknown')
+    patients_df['doc_number'] = patients_df['doc_number'].fillna('')
+
+    for idx, row in patients_df.iterrows():
+        if row['doc_type'] == 'Passport' and row['nationality'] == 'South African':
+            patients_df.at[idx, 'result'] = 'Needs Verification'
+            patients_df.at[idx, 'legal_status'] = 'Pending'
+        elif row['doc_type'] == 'RSA ID' and row['nationality'] != 'South African':
+            patients_df.at[idx, 'result'] = 'Needs Verification'
+            patients_df.at[idx, 'legal_status'] = 'Pending'
+
+    return {'patients': patients_df, 'visits': visits_df, 'resources': resources_df,
+            'resource_summary': summary_df, 'costs': costs_df}
+
+@st.cache_resource
+def get_data_cache():
+    # One copy of the data per process, versioned by file mtimes and write-throughs
+    return SharedDataCache(read_data, [PATIENTS_PATH, VISITS_PATH, RESOURCES_PATH, COSTS_PATH])
+
 def load_data():
     try:
-        # Replace with actual CSV/database load in production
-        patients_df = pd.DataFrame(columns=['name', 'doc_number', 'doc_type', 'nationality', 'result', 'legal_status', 'timestamp'])
-        visits_df = pd.DataFrame(columns=['patient_name', 'visit_date', 'diagnosis', 'treatment', 'cost', 'hospital', 'ward'])
-        resources_df = pd.DataFrame(columns=['hospital', 'ward', 'total_beds', 'available_beds', 'medications', 'medication_stock', 'doctors', 'nurses'])
-        costs_df = pd.DataFrame(columns=['date', 'amount'])
-
-        patients_df['name'] = patients_df['name'].fillna('Unknown')
-        patients_df['doc_number'] = patients_df['doc_number'].fillna('')
-
-        for idx, row in patients_df.iterrows():
-            if row['doc_type'] == 'Passport' and row['nationality'] == 'South African':
-                patients_df.at[idx, 'result'] = 'Needs Verification'
-                patients_df.at[idx, 'legal_status'] = 'Pending'
-            elif row['doc_type'] == 'RSA ID' and row['nationality'] != 'South African':
-                patients_df.at[idx, 'result'] = 'Needs Verification'
-                patients_df.at[idx, 'legal_status'] = 'Pending'
-
-        required_resource_cols = ['hospital', 'ward', 'total_beds', 'available_beds', 'medications', 'medication_stock', 'doctors', 'nurses']
-        for col in required_resource_cols:
-            if col not in resources_df.columns:
-                resources_df[col] = '' if col in ['medications', 'doctors', 'nurses'] else 0
-
-        visits_df['visit_date'] = pd.to_datetime(
-            visits_df.get('visit_date', datetime.now(SA_TIMEZONE).strftime('%Y-%m-%d')),
-            errors='coerce'
-        ).dt.strftime('%Y-%m-%d')
-
-        costs_df['date'] = pd.to_datetime(
-            costs_df.get('date', datetime.now(SA_TIMEZONE).strftime('%Y-%m-%d')),
-            errors='coerce'
-        )
-        costs_df = costs_df[costs_df['date'].notna()]
-        costs_df['date'] = costs_df['date'].dt.strftime('%Y-%m-%d')
-        costs_df['amount'] = pd.to_numeric(costs_df.get('amount', 0), errors='coerce')
-
-        return patients_df, visits_df, resources_df, costs_df
-
+        frames, versions = get_data_cache().snapshot()
+        return frames['patients'], frames['visits'], frames['resources'], frames['resource_summary'], frames['costs'], versions
     except Exception as e:
         logging.error(f"Error loading data: {str(e)}")
         st.error("Failed to load application data")
         st.stop()
 
 try:
-    patients_df, visits_df, resources_df, costs_df = load_data()
+    patients_df, visits_df, resources_df, resource_summary_df, costs_df, data_versions = load_data()
 except Exception as e:
     st.error(f"Error loading data: {str(e)}")
     st.stop()
 
+def resource_totals(resources_df, summary_df):
+    """(available beds, medication units) summed over the wards, else from the province summary line"""
+    if not resources_df.empty:
+        beds = pd.to_numeric(resources_df['available_beds'], errors='coerce').sum()
+        stock = sum(int(x) for med in resources_df['medication_stock'] for x in str(med).split(',') if x.strip().isdigit())
+        return int(beds), stock
+    if not summary_df.empty:
+        latest = summary_df.iloc[-1].fillna(0)
+        return int(latest['beds_available']), int(latest['medication_stock'])
+    return 0, 0
+
+@st.cache_resource(max_entries=1)
+def get_streaming_aggregates(file_version):
+    # Visit and intake totals folded chunk by chunk from the CSVs; re-streamed only when a file changes
+    return load_streaming_aggregates(DATA_DIR)
+
+def streaming_aggregates():
+    return get_streaming_aggregates(get_data_cache().file_version())
+
+@st.cache_resource
+def get_consumption_engine():
+    # Shared by all sessions; kept current by record_visit as treatments are saved
+    return ConsumptionEngine().add_visits(visits_df)
+
+@st.cache_resource
+def get_visit_store():
+    # Daily segments with parsed dates; "today"/"last 7 days" read only their segments
+    return VisitSegmentStore.from_frame(visits_df)
+
+@st.cache_resource
+def get_cost_rollups():
+    # Day/week/month cost totals, updated as treatments are saved
+    return CostRollups.from_frames(visits_df, costs_df, patients_df)
+
+@st.cache_resource
+def load_treatment_history():
+    # Once per process; treatments saved afterwards are added through treatment_ai.record_visit
+    return treatment_ai.load_history(visits_df, patients_df)
+
+load_treatment_history()
+
+@st.cache_resource
+def get_alert_engine():
+    # Shared by all sessions; intake and visit events are fed as they are saved
+    return AlertEngine()
+
+# Cheap when nothing changed: only wards whose levels moved are re-evaluated
+get_alert_engine().observe_resources(resources_df, version=data_versions['resources'])
+
 # ====== PAGE CONFIG ======
 st.set_page_config(layout="wide", page_title="Batho Pele Hospital System")
 st.markdown("""
@@ -127,22 +251,32 @@ with st.sidebar:
     )
     st.divider()
     st.subheader("Patient Metrics")
-    sa_patients = len(patients_df[patients_df['nationality'] == 'South African'])
-    foreign_patients = len(patients_df[patients_df['nationality'] != 'South African'])
+    intake_totals = streaming_aggregates()[1]
+    nationalities = intake_totals.nationality_counts
+    sa_patients = int(nationalities.get('South African', 0)) if nationalities is not None else 0
+    foreign_patients = intake_totals.rows - sa_patients
     needs_referral = len(patients_df[patients_df['legal_status'] == 'Pending'])
     st.metric("SA Patients", sa_patients)
     st.metric("Foreign Nationals", foreign_patients)
     st.metric("Needs Referral", needs_referral)
     st.divider()
     st.subheader("Resource Monitoring")
-    total_beds = resources_df['available_beds'].sum() if not resources_df.empty else 0
+    total_beds, med_stock = resource_totals(resources_df, resource_summary_df)
     st.metric("Total Beds Available", total_beds)
-    med_stock = sum(int(x) for med in resources_df['medication_stock'] for x in str(med).split(',') if x.isdigit()) if not resources_df.empty else 0
     st.metric("Medication Stock", med_stock)
     doctors = sum(len(str(x).split(',')) for x in resources_df['doctors']) if not resources_df.empty else 0
     nurses = sum(len(str(x).split(',')) for x in resources_df['nurses']) if not resources_df.empty else 0
     st.metric("Doctors on Duty", doctors)
     st.metric("Nurses on Duty", nurses)
+    with st.expander("Memory Usage"):
+        memory_df, session_bytes = session_memory_report({
+            'patients': patients_df,
+            'visits': visits_df,
+            'resources': resources_df,
+            'costs': costs_df
+        })
+        st.dataframe(memory_df, hide_index=True, use_container_width=True)
+        st.caption(f"Session total: {session_bytes / 2**20:.2f} MB")
     st.divider()
     if st.button("Logout", use_container_width=True):
         st.session_state.authenticated = False
@@ -156,211 +290,263 @@ page_mapping = {
 }
 current_page = page_mapping.get(nav_option, "dashboard")
 
+# ====== PATIENT INTAKE FRAGMENTS ======
+# Intake runs as nested fragments keeping their state in st.session_state: editing
+# a field or clicking an action reruns only its own section, not authentication,
+# data loading, CSS and the sidebar. New records reach the other pages through
+# the shared data cache on their next full run.
+@st.fragment
+def patient_intake_section():
+    with st.expander("📋 Patient Information", expanded=True):
+        with st.form("patient_intake_form"):
+            cols = st.columns(2)
+            name = cols[0].text_input("Full Name*", placeholder="First Last")
+            nationality = cols[0].selectbox("Nationality*", ["South African", "Zimbabwean", "Malawian", "Mozambican", "Other"])
+            doc_number = cols[0].text_input("Document Number*", placeholder="ID/Passport Number")
+            dob_col = cols[1]
+            dob_col.markdown("Date of Birth*")
+            dob_known = dob_col.checkbox("Known DOB", value=True, key="dob_known")
+            if dob_known:
+                dob = dob_col.date_input("Date of Birth", min_value=datetime(1900,1,1), max_value=datetime.now(), label_visibility="collapsed")
+            else:
+                dob_col.markdown("Using estimated age (DOB unknown)")
+                age = dob_col.number_input("Estimated Age", min_value=0, max_value=120, value=30)
+                dob = (datetime.now() - timedelta(days=age*365)).date()
+            doc_type = cols[1].selectbox("Document Type*", ["RSA ID", "Passport", "Asylum Seeker Permit"])
+            medical_aid = cols[1].text_input("Medical Aid Number (if applicable)", placeholder="Leave blank if none")
+            conditions = st.text_area("Known Medical Conditions", placeholder="List any known conditions")
+            submitted = st.form_submit_button("Submit Patient Information")
+        if submitted:
+            if not name or not doc_number:
+                st.error("Please fill in all required fields (marked with *)")
+            else:
+                try:
+                    verification_result = {
+                        'result': 'Valid',
+                        'legal_status': 'Valid',
+                        'details': 'Verification successful for SA Citizen.'
+                    }
+                    if (doc_type == 'RSA ID' and nationality != 'South African') or (doc_type == 'Passport' and nationality == 'South African'):
+                        verification_result['result'] = 'Needs Verification'
+                        verification_result['legal_status'] = 'Pending'
+                        verification_result['details'] = 'Needs referral to Home Affairs.'
+                    patient_data = {
+                        "name": name,
+                        "dob": dob.strftime('%Y-%m-%d') if dob_known else f"Estimated age: {age}",
+                        "nationality": nationality,
+                        "doc_type": doc_type,
+                        "doc_number": doc_number,
+                        "medical_aid": medical_aid if medical_aid else "None",
+                        "conditions": conditions if conditions else "None reported",
+                        "timestamp": datetime.now(SA_TIMEZONE).strftime('%Y-%m-%d %H:%M:%S'),
+                        **verification_result
+                    }
+                    st.session_state.last_patient = patient_data
+                    st.success("Patient record created successfully!")
+                    st.info(patient_data['details'])
+                    st.session_state.show_treatment_form = True
+                    record_event(
+                        'intake', actor=st.session_state.username,
+                        name=name, doc_type=doc_type, doc_number=doc_number, nationality=nationality,
+                        legal_status=patient_data['legal_status'], result=patient_data['result']
+                    )
+                    get_alert_engine().process('intake', patient_data)
+                    # Write-through: persisted and visible to every session on their next rerun
+                    get_data_cache().append(
+                        'patients', [{col: patient_data[col] for col in PATIENT_COLUMNS}], path=PATIENTS_PATH
+                    )
+                except Exception as e:
+                    logging.error(f"Error processing patient: {str(e)}")
+                    st.error(f"Error processing patient: {str(e)}")
+    if st.session_state.get('show_treatment_form', False) and 'last_patient' in st.session_state:
+        treatment_section()
+
+@st.fragment
+def treatment_section():
+    patient = st.session_state.last_patient
+    with st.expander("🩺 Treatment Information", expanded=True):
+        diagnosis = st.selectbox("Diagnosis*", list(CONDITIONS.keys()) + ["Other"], key="diagnosis_select")
+        if diagnosis != "Other":
+            treatment_plan = CONDITIONS[diagnosis]["treatment_plan"]
+            cost = tariff_catalog.price(diagnosis, patient_category(patient['nationality'], patient['legal_status']))
+            st.text_area("Treatment Plan*", value=treatment_plan, key="treatment_plan_area")
+            st.write(f"### Estimated Cost: R{cost:,.2f}")
+            st.write("### Recommended Medications")
+            for med in CONDITIONS[diagnosis]["medications"]:
+                st.markdown(f"• **{med['name']}**: {med['dosage']} {med['frequency']}")
+            suggestions = generate_treatment_plan(diagnosis, patient_id=patient['doc_number'])
+            if suggestions.get("ai_recommendations"):
+                st.write("### AI Recommendations")
+                for rec in suggestions["ai_recommendations"]:
+                    st.markdown(f"• **{rec['type']}**: {rec['recommendation']}")
+        else:
+            treatment_plan = st.text_area("Treatment Plan*")
+            cost = st.number_input("Treatment Cost (R)*", min_value=0, value=1500)
+        med_cols = st.columns(3)
+        medication = med_cols[0].text_input("Medication name", placeholder="Enter medication")
+        dosage = med_cols[1].text_input("Dosage", placeholder="e.g., 500mg")
+        frequency = med_cols[2].text_input("Frequency", placeholder="e.g., 3x daily")
+        notes = st.text_area("Additional Notes", placeholder="Any special instructions")
+        if st.button("Submit Treatment Details"):
+            if not diagnosis or not treatment_plan:
+                st.error("Please fill in required diagnosis and treatment fields")
+            else:
+                try:
+                    visit_data = {
+                        "patient_name": patient['name'],
+                        "diagnosis": diagnosis,
+                        "treatment": treatment_plan,
+                        "medication": f"{medication} {dosage} {frequency}" if medication else "None",
+                        "cost": cost,
+                        "notes": notes,
+                        "hospital": "Hospital Demo",
+                        "ward": "Ward Demo",
+                        "visit_date": datetime.now(SA_TIMEZONE).strftime('%Y-%m-%d'),
+                        "timestamp": datetime.now(SA_TIMEZONE).strftime('%Y-%m-%d %H:%M:%S')
+                    }
+                    st.success("Treatment details saved successfully!")
+                    st.session_state.treatment_details = visit_data
+                    get_consumption_engine().record_visit(visit_data)
+                    get_visit_store().record_visit(visit_data)
+                    get_cost_rollups().record_visit({**visit_data, 'nationality': patient['nationality'], 'legal_status': patient['legal_status']})
+                    get_alert_engine().process('visit', visit_data)
+                    if has_partitions():
+                        append_visit(visit_data)
+                    treatment_ai.record_visit(
+                        patient['doc_number'],
+                        visit_data['visit_date'],
+                        diagnosis=diagnosis,
+                        treatment=treatment_plan
+                    )
+                    st.session_state.show_actions = True
+                    get_data_cache().append('visits', [visit_data], path=VISITS_PATH)
+                except Exception as e:
+                    logging.error(f"Error saving treatment: {str(e)}")
+                    st.error(f"Error saving treatment: {str(e)}")
+    if st.session_state.get('show_actions', False):
+        patient_actions()
+
+@st.fragment
+def patient_actions():
+    st.markdown("---")
+    st.subheader("Patient Actions")
+    action_cols = st.columns(3)
+    patient = st.session_state.last_patient
+    treatment = st.session_state.treatment_details
+    if action_cols[0].button("📄 Generate Invoice"):
+        with st.expander("🧾 Invoice", expanded=True):
+            st.subheader(f"Invoice for {patient['name']}")
+            st.write(f"**Date:** {datetime.now(SA_TIMEZONE).strftime('%Y-%m-%d')}")
+            st.write(f"**Patient:** {patient['name']} ({patient['nationality']})")
+            st.write(f"**Document:** {patient['doc_type']} {patient['doc_number']}")
+            st.write(f"**Diagnosis:** {treatment['diagnosis']}")
+            st.write(f"**Treatment:** {treatment['treatment']}")
+            if treatment['medication'] != "None":
+                st.write(f"**Medication:** {treatment['medication']}")
+            st.write(f"**Total Cost:** R{treatment['cost']:,.2f}")
+            invoice_text = render_invoice({
+                'invoice_no': f"{datetime.now(SA_TIMEZONE).strftime('%Y%m%d')}-{patient['doc_number']}",
+                'patient_name': patient['name'],
+                'doc_number': patient['doc_number'],
+                'hospital': treatment['hospital'],
+                'visit_date': treatment['visit_date'],
+                'diagnosis': treatment['diagnosis'],
+                'treatment': treatment['treatment'],
+                'medication': treatment['medication'],
+                'amount': treatment['cost']
+            }, invoice_date=datetime.now(SA_TIMEZONE).strftime('%Y-%m-%d'))
+            st.download_button(
+                label="Download Invoice",
+                data=invoice_text,
+                file_name=f"invoice_{patient['name']}_{datetime.now(SA_TIMEZONE).strftime('%Y%m%d')}.txt",
+                mime="text/plain"
+            )
+    if patient.get('legal_status') == 'Pending':
+        if action_cols[1].button("⚠️ Refer to Home Affairs"):
+            record_event('referral', actor=st.session_state.username, name=patient['name'],
+                         doc_number=patient['doc_number'], referred_to='Home Affairs')
+            st.success(f"Patient {patient['name']} referred to Home Affairs")
+    if action_cols[2].button("👤 View Full Record"):
+        with st.expander("Patient Record Summary", expanded=True):
+            st.write(f"**Name:** {patient['name']}")
+            st.write(f"**DOB:** {patient['dob']}")
+            st.write(f"**Nationality:** {patient['nationality']}")
+            st.write(f"**Status:** {patient.get('legal_status', 'Valid')}")
+            st.write(f"**Conditions:** {patient['conditions']}")
+            st.write("---")
+            st.write(f"**Last Treatment:** {treatment['diagnosis']}")
+            st.write(f"**Medication:** {treatment['medication']}")
+            st.write(f"**Cost:** R{treatment['cost']:,.2f}")
+            st.write(f"**Last Updated:** {treatment['timestamp']}")
+
+# ====== ALERTS ======
+ALERT_POLL_SECONDS = 15
+ALERTS_SHOWN = 20
+
+@st.fragment(run_every=ALERT_POLL_SECONDS)
+def alerts_panel():
+    # Polls only alerts newer than this session has seen, without rerunning the page
+    new_alerts = get_alert_engine().poll(after=st.session_state.get('alerts_seen', 0))
+    if new_alerts:
+        st.session_state.alerts_seen = new_alerts[-1]['seq']
+        st.session_state.recent_alerts = (st.session_state.get('recent_alerts', []) + new_alerts)[-ALERTS_SHOWN:]
+    recent = st.session_state.get('recent_alerts', [])
+    st.write("### 🚨 Alerts")
+    if not recent:
+        st.caption("No alerts.")
+        return
+    st.dataframe(
+        pd.DataFrame(recent[::-1])[['time', 'severity', 'rule', 'message']],
+        use_container_width=True, hide_index=True
+    )
+
 # ====== DASHBOARD ======
 if current_page == "dashboard":
     with st.container():
         st.markdown('<div class="header"><h1>🏥 Batho Pele Hospital System</h1></div>', unsafe_allow_html=True)
-        dashboard_cols = st.columns(4)
-        dashboard_cols[0].metric("Total Patients", len(patients_df))
-        dashboard_cols[1].metric("Visits Today", len(visits_df[visits_df['visit_date'] == datetime.now(SA_TIMEZONE).strftime('%Y-%m-%d')]))
-        dashboard_cols[2].metric("Beds Available", resources_df['available_beds'].sum() if not resources_df.empty else 0)
-        dashboard_cols[3].metric("Medication Stock", sum(int(x) for med in resources_df['medication_stock'] for x in str(med).split(',') if x.isdigit()) if not resources_df.empty else 0)
+        dashboard_cols = st.columns(5)
+        dashboard_cols[0].metric("Total Patients", streaming_aggregates()[1].rows)
+        today = datetime.now(SA_TIMEZONE).date()
+        dashboard_cols[1].metric("Visits Today", get_visit_store().count_between(today, today))
+        beds_available, medication_stock = resource_totals(resources_df, resource_summary_df)
+        dashboard_cols[2].metric("Beds Available", beds_available)
+        dashboard_cols[3].metric("Medication Stock", medication_stock)
+        dashboard_cols[4].metric("Today's Cost", f"R{get_cost_rollups().period_total('day', today, source='visits')[0]:,.2f}")
+        alerts_panel()
         st.write("### Quick Links")
         st.button("Go to Patient Intake", on_click=lambda: st.session_state.update({'nav_option': "📋 Patient Intake"}))
         st.button("Go to Resource Monitoring", on_click=lambda: st.session_state.update({'nav_option': "🏥 Resource Monitoring"}))
+        st.write("### Month-end Invoicing")
+        invoice_cols = st.columns(3)
+        invoice_range = invoice_cols[0].date_input("Visit Dates", value=(today.replace(day=1), today))
+        invoice_hospital = invoice_cols[1].selectbox("Hospital", ["All"] + list(visits_df['hospital'].dropna().unique()))
+        if invoice_cols[2].button("Build Invoice Archive") and len(invoice_range) == 2:
+            archive_path = os.path.join(tempfile.gettempdir(), f"invoices_{invoice_range[0]:%Y%m%d}_{invoice_range[1]:%Y%m%d}.zip")
+            try:
+                with open(archive_path, 'wb') as archive_file:
+                    reconciliation = write_invoice_archive(
+                        visits_df, archive_file, patients_df, costs_df,
+                        start=invoice_range[0], end=invoice_range[1],
+                        hospital=None if invoice_hospital == "All" else invoice_hospital
+                    )
+                st.dataframe(reconciliation, use_container_width=True, hide_index=True)
+                with open(archive_path, 'rb') as archive_file:
+                    st.download_button(
+                        label="Download Invoices",
+                        data=archive_file,
+                        file_name=os.path.basename(archive_path),
+                        mime="application/zip"
+                    )
+            except Exception as e:
+                logging.error(f"Error building invoice archive: {str(e)}")
+                st.error(f"Error building invoice archive: {str(e)}")
 
 # ====== PATIENT INTAKE ======
 elif current_page == "patient_intake":
     with st.container():
         st.markdown('<div class="header"><h1>📋 Patient Intake</h1></div>', unsafe_allow_html=True)
-        treatment_plans = {
-            # ... Treatment plans dictionary from previous message ...
-            # (copy full dictionary here as before)
-            "Hypertension": {
-                "plan": "Lifestyle changes (salt reduction, exercise, stress management) and medication based on severity",
-                "medications": [
-                    {"name": "Amlodipine", "dosage": "5-10 mg", "frequency": "Once daily"},
-                    {"name": "Hydrochlorothiazide", "dosage": "12.5-25 mg", "frequency": "Once daily"},
-                    {"name": "Enalapril/Losartan", "dosage": "10-40 mg", "frequency": "Once daily"}
-                ],
-                "costs": {
-                    "SA Residents": 0,
-                    "Legal Immigrants": 350,
-                    "Illegal Immigrants": 800
-                }
-            },
-            # ... (other conditions) ...
-        }
         st.title("🏥 Patient Intake System")
-        with st.expander("📋 Patient Information", expanded=True):
-            with st.form("patient_intake_form"):
-                cols = st.columns(2)
-                name = cols[0].text_input("Full Name*", placeholder="First Last")
-                nationality = cols[0].selectbox("Nationality*", ["South African", "Zimbabwean", "Malawian", "Mozambican", "Other"])
-                doc_number = cols[0].text_input("Document Number*", placeholder="ID/Passport Number")
-                dob_col = cols[1]
-                dob_col.markdown("Date of Birth*")
-                dob_known = dob_col.checkbox("Known DOB", value=True, key="dob_known")
-                if dob_known:
-                    dob = dob_col.date_input("Date of Birth", min_value=datetime(1900,1,1), max_value=datetime.now(), label_visibility="collapsed")
-                else:
-                    dob_col.markdown("Using estimated age (DOB unknown)")
-                    age = dob_col.number_input("Estimated Age", min_value=0, max_value=120, value=30)
-                    dob = (datetime.now() - timedelta(days=age*365)).date()
-                doc_type = cols[1].selectbox("Document Type*", ["RSA ID", "Passport", "Asylum Seeker Permit"])
-                medical_aid = cols[1].text_input("Medical Aid Number (if applicable)", placeholder="Leave blank if none")
-                conditions = st.text_area("Known Medical Conditions", placeholder="List any known conditions")
-                submitted = st.form_submit_button("Submit Patient Information")
-            if submitted:
-                if not name or not doc_number:
-                    st.error("Please fill in all required fields (marked with *)")
-                else:
-                    try:
-                        verification_result = {
-                            'result': 'Valid',
-                            'legal_status': 'Valid',
-                            'details': 'Verification successful for SA Citizen.'
-                        }
-                        if (doc_type == 'RSA ID' and nationality != 'South African') or (doc_type == 'Passport' and nationality == 'South African'):
-                            verification_result['result'] = 'Needs Verification'
-                            verification_result['legal_status'] = 'Pending'
-                            verification_result['details'] = 'Needs referral to Home Affairs.'
-                        patient_data = {
-                            "name": name,
-                            "dob": dob.strftime('%Y-%m-%d') if dob_known else f"Estimated age: {age}",
-                            "nationality": nationality,
-                            "doc_type": doc_type,
-                            "doc_number": doc_number,
-                            "medical_aid": medical_aid if medical_aid else "None",
-                            "conditions": conditions if conditions else "None reported",
-                            "timestamp": datetime.now(SA_TIMEZONE).strftime('%Y-%m-%d %H:%M:%S'),
-                            **verification_result
-                        }
-                        st.session_state.last_patient = patient_data
-                        st.success("Patient record created successfully!")
-                        st.info(patient_data['details'])
-                        st.session_state.show_treatment_form = True
-                        patients_df.loc[len(patients_df)] = [
-                            patient_data['name'],
-                            patient_data['doc_number'],
-                            patient_data['doc_type'],
-                            patient_data['nationality'],
-                            patient_data['result'],
-                            patient_data['legal_status'],
-                            patient_data['timestamp']
-                        ]
-                    except Exception as e:
-                        logging.error(f"Error processing patient: {str(e)}")
-                        st.error(f"Error processing patient: {str(e)}")
-        if st.session_state.get('show_treatment_form', False) and 'last_patient' in st.session_state:
-            patient = st.session_state.last_patient
-            with st.expander("🩺 Treatment Information", expanded=True):
-                diagnosis = st.selectbox("Diagnosis*", list(treatment_plans.keys()) + ["Other"], key="diagnosis_select")
-                if diagnosis != "Other":
-                    treatment_plan = treatment_plans[diagnosis]["plan"]
-                    cost = (
-                        treatment_plans[diagnosis]["costs"]["SA Residents"]
-                        if patient['nationality'] == 'South African'
-                        else treatment_plans[diagnosis]["costs"]["Legal Immigrants"]
-                        if patient['legal_status'] == 'Valid'
-                        else treatment_plans[diagnosis]["costs"]["Illegal Immigrants"]
-                    )
-                    st.text_area("Treatment Plan*", value=treatment_plan, key="treatment_plan_area")
-                    st.write(f"### Estimated Cost: R{cost:,.2f}")
-                    st.write("### Recommended Medications")
-                    for med in treatment_plans[diagnosis]["medications"]:
-                        st.markdown(f"• **{med['name']}**: {med['dosage']} {med['frequency']}")
-                else:
-                    treatment_plan = st.text_area("Treatment Plan*")
-                    cost = st.number_input("Treatment Cost (R)*", min_value=0, value=1500)
-                med_cols = st.columns(3)
-                medication = med_cols[0].text_input("Medication name", placeholder="Enter medication")
-                dosage = med_cols[1].text_input("Dosage", placeholder="e.g., 500mg")
-                frequency = med_cols[2].text_input("Frequency", placeholder="e.g., 3x daily")
-                notes = st.text_area("Additional Notes", placeholder="Any special instructions")
-                if st.button("Submit Treatment Details"):
-                    if not diagnosis or not treatment_plan:
-                        st.error("Please fill in required diagnosis and treatment fields")
-                    else:
-                        try:
-                            visit_data = {
-                                "patient_name": patient['name'],
-                                "diagnosis": diagnosis,
-                                "treatment": treatment_plan,
-                                "medication": f"{medication} {dosage} {frequency}" if medication else "None",
-                                "cost": cost,
-                                "notes": notes,
-                                "hospital": "Hospital Demo",
-                                "ward": "Ward Demo",
-                                "visit_date": datetime.now(SA_TIMEZONE).strftime('%Y-%m-%d'),
-                                "timestamp": datetime.now(SA_TIMEZONE).strftime('%Y-%m-%d %H:%M:%S')
-                            }
-                            st.success("Treatment details saved successfully!")
-                            st.session_state.treatment_details = visit_data
-                            st.session_state.show_actions = True
-                            visits_df.loc[len(visits_df)] = [
-                                visit_data['patient_name'],
-                                visit_data['visit_date'],
-                                visit_data['diagnosis'],
-                                visit_data['treatment'],
-                                visit_data['cost'],
-                                visit_data['hospital'],
-                                visit_data['ward']
-                            ]
-                        except Exception as e:
-                            logging.error(f"Error saving treatment: {str(e)}")
-                            st.error(f"Error saving treatment: {str(e)}")
-        if st.session_state.get('show_actions', False):
-            st.markdown("---")
-            st.subheader("Patient Actions")
-            action_cols = st.columns(3)
-            patient = st.session_state.last_patient
-            treatment = st.session_state.treatment_details
-            if action_cols[0].button("📄 Generate Invoice"):
-                with st.expander("🧾 Invoice", expanded=True):
-                    st.subheader(f"Invoice for {patient['name']}")
-                    st.write(f"**Date:** {datetime.now(SA_TIMEZONE).strftime('%Y-%m-%d')}")
-                    st.write(f"**Patient:** {patient['name']} ({patient['nationality']})")
-                    st.write(f"**Document:** {patient['doc_type']} {patient['doc_number']}")
-                    st.write(f"**Diagnosis:** {treatment['diagnosis']}")
-                    st.write(f"**Treatment:** {treatment['treatment']}")
-                    if treatment['medication'] != "None":
-                        st.write(f"**Medication:** {treatment['medication']}")
-                    st.write(f"**Total Cost:** R{treatment['cost']:,.2f}")
-                    invoice_text = f"""
-                    BATHO PELE HEALTHCARE INITIATIVE
-                    ---------------------------------
-                    Invoice Date: {datetime.now(SA_TIMEZONE).strftime('%Y-%m-%d')}
-                    Patient: {patient['name']}
-                    ID: {patient['doc_number']}
-                    ---------------------------------
-                    Diagnosis: {treatment['diagnosis']}
-                    Treatment: {treatment['treatment']}
-                    Medication: {treatment['medication']}
-                    ---------------------------------
-                    TOTAL COST: R{treatment['cost']:,.2f}
-                    """
-                    st.download_button(
-                        label="Download Invoice",
-                        data=invoice_text,
-                        file_name=f"invoice_{patient['name']}_{datetime.now(SA_TIMEZONE).strftime('%Y%m%d')}.txt",
-                        mime="text/plain"
-                    )
-            if patient.get('legal_status') == 'Pending':
-                if action_cols[1].button("⚠️ Refer to Home Affairs"):
-                    st.success(f"Patient {patient['name']} referred to Home Affairs")
-            if action_cols[2].button("👤 View Full Record"):
-                with st.expander("Patient Record Summary", expanded=True):
-                    st.write(f"**Name:** {patient['name']}")
-                    st.write(f"**DOB:** {patient['dob']}")
-                    st.write(f"**Nationality:** {patient['nationality']}")
-                    st.write(f"**Status:** {patient.get('legal_status', 'Valid')}")
-                    st.write(f"**Conditions:** {patient['conditions']}")
-                    st.write("---")
-                    st.write(f"**Last Treatment:** {treatment['diagnosis']}")
-                    st.write(f"**Medication:** {treatment['medication']}")
-                    st.write(f"**Cost:** R{treatment['cost']:,.2f}")
-                    st.write(f"**Last Updated:** {treatment['timestamp']}")
+        patient_intake_section()
 
 # ====== PATIENT SEARCH ======
 elif current_page == "patient_search":
@@ -419,79 +605,29 @@ elif current_page == "resource_monitoring":
     with st.container():
         st.markdown('<div class="header"><h1>🏥 Resource Monitoring</h1></div>', unsafe_allow_html=True)
         st.subheader("Daily Hospital Resource Metrics")
-        if resources_df.empty:
+        hospitals = hospital_options(resources_df)
+        if not hospitals:
             st.warning("No resource data available.")
+            # The forecast is province-wide and needs only the materialized series (admissions come from visits)
+            display_forecast()
         else:
-            hospitals = resources_df['hospital'].dropna().unique()
+            overview = load_overview(resources_df, visits_df, version=(data_versions['resources'], data_versions['visits']))
+            display_province_overview(overview)
             selected_hospital = st.selectbox("Select Hospital", hospitals)
-            hospital_resources = resources_df[resources_df['hospital'] == selected_hospital]
-            resource_types = ["Beds", "Doctors", "Nurses", "Medications"]
-            selected_resource = st.selectbox("Select resource to predict", resource_types)
-            forecast = predict_resources(selected_resource.lower())
-            if forecast is not None:
-                st.write(f"### Next 7 Days Forecast for {selected_resource}")
-                st.dataframe(forecast, use_container_width=True)
-            else:
-                st.info("Not enough historical data for prediction.")
-            for _, ward_data in hospital_resources.iterrows():
-                ward_name = ward_data.get('ward', 'Unknown')
-                st.markdown(f"### 🏥 Ward: {ward_name}")
-                cols = st.columns([1, 2, 2, 2])
-                total_beds = int(ward_data.get('total_beds', 0))
-                available_beds = int(ward_data.get('available_beds', 0))
-                bed_percentage = (available_beds / total_beds * 100) if total_beds > 0 else 0
-                cols[0].metric("Available Beds", f"{available_beds}/{total_beds}", f"{bed_percentage:.1f}% available")
-                doctors = [d.strip() for d in str(ward_data.get('doctors', '')).split(',') if d.strip()]
-                nurses = [n.strip() for n in str(ward_data.get('nurses', '')).split(',') if n.strip()]
-                cols[1].markdown("**Doctors on Duty:**")
-                for doctor in doctors:
-                    cols[1].markdown(f"- {doctor}")
-                cols[1].markdown("**Nurses on Duty:**")
-                for nurse in nurses:
-                    cols[1].markdown(f"- {nurse}")
-                medications = [m.strip() for m in str(ward_data.get('medications', '')).split(',') if m.strip()]
-                stocks = [s.strip() for s in str(ward_data.get('medication_stock', '')).split(',') if s.strip()]
-                med_stock_map = {}
-                for med, stock in zip(medications, stocks):
-                    med_stock_map[med] = int(stock) if stock.isdigit() else stock
-                cols[2].markdown("**Medication Stock:**")
-                for med, stock in med_stock_map.items():
-                    cols[2].markdown(f"- {med}: {stock}")
-                today_str = datetime.now(SA_TIMEZONE).strftime('%Y-%m-%d')
-                today_patients = visits_df[
-                    (visits_df['hospital'] == selected_hospital) &
-                    (visits_df['ward'] == ward_name) &
-                    (visits_df['visit_date'] == today_str)
-                ]
-                cols[3].markdown("**Patients Admitted Today:**")
-                if not today_patients.empty:
-                    for pname in today_patients['patient_name']:
-                        cols[3].markdown(f"- {pname}")
-                else:
-                    cols[3].markdown("_No new patients today_")
-            st.subheader("Hospital Daily Summary")
-            total_hospital_beds = hospital_resources['total_beds'].sum()
-            available_hospital_beds = hospital_resources['available_beds'].sum()
-            st.metric("Total Beds Available", f"{available_hospital_beds}/{total_hospital_beds}")
-            doctors_names = set()
-            nurses_names = set()
-            medication_stock_total = {}
-            for _, ward in hospital_resources.iterrows():
-                doctors_names.update([d.strip() for d in str(ward.get('doctors', '')).split(',') if d.strip()])
-                nurses_names.update([n.strip() for n in str(ward.get('nurses', '')).split(',') if n.strip()])
-                meds = [m.strip() for m in str(ward.get('medications', '')).split(',') if m.strip()]
-                stocks = [s.strip() for s in str(ward.get('medication_stock', '')).split(',') if s.strip()]
-                for med, stock in zip(meds, stocks):
-                    medication_stock_total[med] = medication_stock_total.get(med, 0) + (int(stock) if stock.isdigit() else 0)
-            st.write("**Doctors on Duty Today:**")
-            for d in sorted(doctors_names):
-                st.write(f"- {d}")
-            st.write("**Nurses on Duty Today:**")
-            for n in sorted(nurses_names):
-                st.write(f"- {n}")
-            st.write("**Total Medication Stock Today:**")
-            for med, stock in medication_stock_total.items():
-                st.write(f"- {med}: {stock}")
+            # Only the selected hospital's partitions (and recent visit months) are read
+            hospital_resources, hospital_visits = hospital_view(
+                selected_hospital, resources_df, visits_df,
+                since=datetime.now(SA_TIMEZONE).date() - timedelta(days=ARRIVAL_HISTORY_DAYS)
+            )
+            display_forecast()
+            stock_report = get_consumption_engine().days_of_stock(hospital_resources)
+            stock_report = stock_report[stock_report['hospital'] == selected_hospital]
+            if not stock_report.empty:
+                st.write("### Medication Days of Stock")
+                st.dataframe(stock_report, use_container_width=True, hide_index=True)
+            display_capacity_simulation(hospital_resources, hospital_visits)
+            display_ward_grid(overview, selected_hospital)
+            display_hospital_summary(overview, selected_hospital)
 
 # ====== FOOTER ======
 st.markdown("---")
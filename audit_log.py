@@ -0,0 +1,296 @@
+# audit_log.py
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from analytics_export import Pseudonymizer
+try:
+    import fcntl
+except ImportError:     # Windows: only in-process appends are serialized
+    fcntl = None
+
+# data/audit_log.jsonl: one JSON record per line, each carrying the previous record's hash
+# data/audit_checkpoints.jsonl: a Merkle root over every CHECKPOINT_INTERVAL records
+AUDIT_PATH = os.path.join("data", "audit_log.jsonl")
+CHECKPOINT_PATH = os.path.join("data", "audit_checkpoints.jsonl")
+CHECKPOINT_INTERVAL = 1024
+GENESIS_HASH = "0" * 64
+EVENT_TYPES = ('intake', 'verification', 'referral')
+# Identifying details are logged as analytics-export tokens (detail -> (token key, kind)), so the log
+# joins with pseudonymized extracts without holding names or document numbers
+PII_DETAILS = {'name': ('patient_token', 'name'), 'doc_number': ('doc_token', 'doc')}
+
+def _canonical(record):
+    return json.dumps(record, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+
+def record_hash(record):
+    """SHA-256 over the canonical JSON of everything but the hash itself"""
+    body = {key: value for key, value in record.items() if key != 'hash'}
+    return hashlib.sha256(_canonical(body).encode('utf-8')).hexdigest()
+
+# Leaves and inner nodes are domain-separated so a leaf can't be passed off as a subtree
+def _leaf(hex_hash):
+    return hashlib.sha256(b'\x00' + bytes.fromhex(hex_hash)).digest()
+
+def _node(left, right):
+    return hashlib.sha256(b'\x01' + left + right).digest()
+
+def _merkle_levels(hashes):
+    levels = [[_leaf(h) for h in hashes]]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        levels.append([_node(level[i], level[i + 1]) if i + 1 < len(level) else level[i]
+                       for i in range(0, len(level), 2)])
+    return levels
+
+def merkle_root(hashes):
+    return _merkle_levels(hashes)[-1][0].hex() if hashes else GENESIS_HASH
+
+def merkle_proof(hashes, index):
+    """Sibling path from leaf `index` up to the root, as (hex hash, side) pairs"""
+    proof = []
+    for level in _merkle_levels(hashes)[:-1]:
+        sibling = index ^ 1
+        if sibling < len(level):
+            proof.append((level[sibling].hex(), 'L' if sibling < index else 'R'))
+        index //= 2
+    return proof
+
+def verify_proof(hex_hash, proof, root):
+    """O(log n): fold the sibling path and compare with the checkpoint root"""
+    node = _leaf(hex_hash)
+    for sibling, side in proof:
+        node = _node(bytes.fromhex(sibling), node) if side == 'L' else _node(node, bytes.fromhex(sibling))
+    return node.hex() == root
+
+def _parse(line):
+    """A record, or a placeholder that fails every check if the line was mangled"""
+    try:
+        record = json.loads(line)
+        return record if isinstance(record, dict) else {'seq': None, 'unparseable': line}
+    except ValueError:
+        return {'seq': None, 'unparseable': line}
+
+def _read_records(path, start, end=None):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read() if end is None else f.read(end - start)
+    return [_parse(line) for line in data.decode('utf-8', errors='replace').splitlines() if line.strip()]
+
+def verify_segment(path, checkpoint, prev_hash):
+    """Problems found in one checkpointed segment: record hashes, chain links and the Merkle root"""
+    problems = []
+    try:
+        records = _read_records(path, checkpoint['offset'], checkpoint['end_offset'])
+    except (OSError, ValueError) as e:
+        return [f"segment {checkpoint['segment']}: unreadable ({e})"]
+    expected_seqs = range(checkpoint['first_seq'], checkpoint['last_seq'] + 1)
+    if [r.get('seq') for r in records] != list(expected_seqs):
+        problems.append(f"segment {checkpoint['segment']}: records missing, added or reordered")
+    for record in records:
+        if record_hash(record) != record.get('hash'):
+            problems.append(f"record {record.get('seq')}: contents altered")
+        if record.get('prev_hash') != prev_hash:
+            problems.append(f"record {record.get('seq')}: chain broken")
+        prev_hash = record.get('hash')
+    try:
+        root = merkle_root([r.get('hash') for r in records])
+    except (TypeError, ValueError):
+        root = None
+    if root != checkpoint['root']:
+        problems.append(f"segment {checkpoint['segment']}: Merkle root mismatch")
+    return problems
+
+class AuditLog:
+    """Append-only, hash-chained audit trail for intake, verification and referral events.
+
+    Each append hashes one record against the previous hash and writes one line,
+    so it is O(1). Every CHECKPOINT_INTERVAL records a Merkle root over the
+    segment is written to the checkpoint file (amortised O(1) per append). A
+    single record then verifies in O(log n) against its checkpoint, and whole
+    segments verify independently, in parallel.
+    """
+    def __init__(self, path=AUDIT_PATH, checkpoint_path=CHECKPOINT_PATH, interval=CHECKPOINT_INTERVAL, pseudonymizer=None):
+        self.path = path
+        self.checkpoint_path = checkpoint_path
+        self.interval = interval
+        self._pseudonymizer = pseudonymizer     # created on first append, so importing never touches the key file
+        self._lock = threading.Lock()
+        self._size = None          # bytes of the log this instance has accounted for
+
+    def checkpoints(self):
+        if not os.path.exists(self.checkpoint_path):
+            return []
+        with open(self.checkpoint_path, encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def _load_state(self):
+        """Chain tip and the current segment's leaf hashes; reads only records after the last checkpoint"""
+        checkpoints = self.checkpoints()
+        self._last_checkpoint = checkpoints[-1] if checkpoints else None
+        self._segment_offset = self._last_checkpoint['end_offset'] if checkpoints else 0
+        self._next_seq = self._last_checkpoint['last_seq'] + 1 if checkpoints else 0
+        self._last_hash = self._last_checkpoint['tip'] if checkpoints else GENESIS_HASH
+        self._pending = []
+        self._size = self._segment_offset
+        if os.path.exists(self.path):
+            with open(self.path, 'rb') as f:
+                f.seek(self._segment_offset)
+                for line in f:
+                    self._size += len(line)
+                    record = _parse(line)
+                    if record.get('seq') is None or 'hash' not in record:
+                        continue    # left for verify() to report; appends carry on from the last good record
+                    self._pending.append(record['hash'])
+                    self._next_seq = record['seq'] + 1
+                    self._last_hash = record['hash']
+                    if len(self._pending) == self.interval:
+                        self._checkpoint()
+
+    def _checkpoint(self):
+        previous = self._last_checkpoint
+        checkpoint = {
+            'segment': previous['segment'] + 1 if previous else 0,
+            'first_seq': self._next_seq - len(self._pending),
+            'last_seq': self._next_seq - 1,
+            'offset': self._segment_offset,
+            'end_offset': self._size,
+            'root': merkle_root(self._pending),
+            'tip': self._last_hash,
+            'prev_checkpoint': previous['hash'] if previous else GENESIS_HASH,
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+        }
+        checkpoint['hash'] = record_hash(checkpoint)
+        with open(self.checkpoint_path, 'a', encoding='utf-8') as f:
+            f.write(_canonical(checkpoint) + '\n')
+        self._last_checkpoint = checkpoint
+        self._segment_offset = self._size
+        self._pending = []
+
+    def _pseudonymize(self, details):
+        if self._pseudonymizer is None:
+            self._pseudonymizer = Pseudonymizer()
+        details = dict(details)
+        for key, (token_key, kind) in PII_DETAILS.items():
+            if key in details:
+                details[token_key] = self._pseudonymizer.token_for(details.pop(key), kind)
+        return details
+
+    def append(self, event, actor=None, **details):
+        """Chain and write one event record; returns it.
+
+        The log file is flock'ed from reading the chain head to the fsync, so
+        appends from other processes (CLI jobs, load-test clerks) can't chain
+        from the same previous hash and fork the log.
+        """
+        if event not in EVENT_TYPES:
+            raise ValueError(f"Unknown audit event '{event}'")
+        details = self._pseudonymize(details)
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with self._lock, open(self.path, 'ab') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                if self._size != os.fstat(f.fileno()).st_size:
+                    # First use, or another process appended since our last write
+                    self._load_state()
+                record = {
+                    'seq': self._next_seq,
+                    'timestamp': datetime.now().isoformat(timespec='seconds'),
+                    'event': event,
+                    'actor': actor,
+                    'details': details,
+                    'prev_hash': self._last_hash,
+                }
+                record['hash'] = record_hash(record)
+                line = (_canonical(record) + '\n').encode('utf-8')
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+                self._size += len(line)
+                self._next_seq += 1
+                self._last_hash = record['hash']
+                self._pending.append(record['hash'])
+                if len(self._pending) == self.interval:
+                    self._checkpoint()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+            return record
+
+    def proof(self, seq):
+        """(record, Merkle proof, checkpoint) for a checkpointed record, or None if not yet checkpointed"""
+        segment = seq // self.interval
+        checkpoints = self.checkpoints()
+        if segment >= len(checkpoints):
+            return None
+        checkpoint = checkpoints[segment]
+        records = _read_records(self.path, checkpoint['offset'], checkpoint['end_offset'])
+        index = seq - checkpoint['first_seq']
+        return records[index], merkle_proof([r['hash'] for r in records], index), checkpoint
+
+    def verify_record(self, seq):
+        """True if record `seq` is unaltered and included in its checkpoint's Merkle root; None if not yet checkpointed"""
+        try:
+            found = self.proof(seq)
+            if found is None:
+                return None
+            record, proof, checkpoint = found
+            return (record.get('seq') == seq
+                    and record_hash(record) == record.get('hash')
+                    and record_hash(checkpoint) == checkpoint['hash']
+                    and verify_proof(record['hash'], proof, checkpoint['root']))
+        except (KeyError, IndexError, TypeError, ValueError):
+            # Mangled lines or shifted offsets: the segment no longer matches its checkpoint
+            return False
+
+    def verify(self, workers=None):
+        """Full integrity check: checkpoint chain, every segment in parallel, then the unchecked tail"""
+        checkpoints = self.checkpoints()
+        problems = []
+        prev_checkpoint = GENESIS_HASH
+        for checkpoint in checkpoints:
+            if record_hash(checkpoint) != checkpoint['hash'] or checkpoint['prev_checkpoint'] != prev_checkpoint:
+                problems.append(f"checkpoint {checkpoint['segment']}: altered or out of sequence")
+            prev_checkpoint = checkpoint['hash']
+
+        if not os.path.exists(self.path):
+            return {'ok': not checkpoints and not problems, 'segments': len(checkpoints), 'problems': problems or (['log file missing'] if checkpoints else [])}
+        if checkpoints and os.path.getsize(self.path) < checkpoints[-1]['end_offset']:
+            problems.append("log truncated before last checkpoint")
+
+        tips = [GENESIS_HASH] + [c['tip'] for c in checkpoints[:-1]]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for segment_problems in pool.map(verify_segment, [self.path] * len(checkpoints), checkpoints, tips):
+                problems.extend(segment_problems)
+
+        # Records after the last checkpoint are covered by the hash chain alone
+        prev_hash = checkpoints[-1]['tip'] if checkpoints else GENESIS_HASH
+        next_seq = checkpoints[-1]['last_seq'] + 1 if checkpoints else 0
+        tail = _read_records(self.path, checkpoints[-1]['end_offset'] if checkpoints else 0)
+        for record in tail:
+            if record.get('seq') != next_seq:
+                problems.append(f"record {record.get('seq')}: out of sequence (expected {next_seq})")
+            if record_hash(record) != record.get('hash'):
+                problems.append(f"record {record.get('seq')}: contents altered")
+            if record.get('prev_hash') != prev_hash:
+                problems.append(f"record {record.get('seq')}: chain broken")
+            prev_hash = record.get('hash')
+            next_seq = (record.get('seq') or 0) + 1
+        return {'ok': not problems, 'segments': len(checkpoints), 'tail_records': len(tail), 'problems': problems}
+
+# Global instance
+audit_log = AuditLog()
+
+def record_event(event, actor=None, **details):
+    """Append an intake/verification/referral event to the shared audit log"""
+    return audit_log.append(event, actor=actor, **details)
+
+if __name__ == "__main__":
+    result = audit_log.verify()
+    print(f"Audit log {'OK' if result['ok'] else 'FAILED'}: {result['segments']} checkpointed segments, "
+          f"{result.get('tail_records', 0)} records since the last checkpoint")
+    for problem in result['problems']:
+        print(f"  {problem}")
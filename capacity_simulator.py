@@ -0,0 +1,129 @@
+# capacity_simulator.py
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+
+DEFAULT_TRAJECTORIES = 5000
+DEFAULT_HORIZON_DAYS = 14
+# Visits carry no discharge date, so length of stay falls back to this mean when it can't be measured
+DEFAULT_LOS_DAYS = 3.0
+ARRIVAL_HISTORY_DAYS = 90
+
+def ward_parameters(visits_df, resources_df, history_days=ARRIVAL_HISTORY_DAYS):
+    """Arrival rate, mean length of stay, capacity and current occupancy per (hospital, ward)"""
+    if resources_df.empty or not {'ward', 'total_beds', 'available_beds'}.issubset(resources_df.columns):
+        return pd.DataFrame(columns=['hospital', 'ward', 'total_beds', 'occupied', 'arrival_rate', 'mean_los'])
+
+    beds = resources_df.assign(
+        hospital=resources_df['hospital'].astype('string') if 'hospital' in resources_df else 'Unknown',
+        ward=resources_df['ward'].astype('string'),
+        total_beds=pd.to_numeric(resources_df['total_beds'], errors='coerce'),
+        available_beds=pd.to_numeric(resources_df['available_beds'], errors='coerce')
+    ).groupby(['hospital', 'ward'])[['total_beds', 'available_beds']].sum()
+    beds['occupied'] = (beds['total_beds'] - beds['available_beds']).clip(lower=0)
+
+    beds['arrival_rate'] = 0.0
+    beds['mean_los'] = DEFAULT_LOS_DAYS
+    if not visits_df.empty and 'ward' in visits_df.columns:
+        visits = visits_df.assign(
+            hospital=visits_df['hospital'].astype('string'),
+            ward=visits_df['ward'].astype('string'),
+            day=pd.to_datetime(visits_df['visit_date'], errors='coerce').dt.normalize()
+        ).dropna(subset=['hospital', 'ward', 'day'])
+        if not visits.empty:
+            end = visits['day'].max()
+            recent = visits[visits['day'] > end - pd.Timedelta(days=history_days)]
+            span = max((end - recent['day'].min()).days + 1, 1)
+            rates = recent.groupby(['hospital', 'ward']).size() / span
+            beds['arrival_rate'] = rates.reindex(beds.index).fillna(0.0).astype('float64')
+            if 'discharge_date' in recent.columns:
+                stay = (pd.to_datetime(recent['discharge_date'], errors='coerce') - recent['day']).dt.days
+                los = stay[stay > 0].groupby([recent['hospital'], recent['ward']]).mean()
+                beds['mean_los'] = los.reindex(beds.index).fillna(DEFAULT_LOS_DAYS).astype('float64')
+
+    params = beds[beds['total_beds'] > 0]
+    return params[['total_beds', 'occupied', 'arrival_rate', 'mean_los']].reset_index()
+
+def simulate_ward(total_beds, occupied, arrival_rate, mean_los, horizon_days=DEFAULT_HORIZON_DAYS,
+                  trajectories=DEFAULT_TRAJECTORIES, seed=None):
+    """Probability, per day, that a ward has run out of beds at least once by that day.
+
+    All trajectories advance together: Poisson arrivals, and each occupied bed
+    is freed with probability 1/mean_los per day (geometric length of stay).
+    """
+    # ward_parameters yields float bed counts; the in-place clip below needs integers
+    total_beds = int(total_beds)
+    occupied = int(occupied) if pd.notna(occupied) else 0
+    rng = np.random.default_rng(seed)
+    discharge_p = min(1.0, 1.0 / max(mean_los, 1e-9))
+    occupancy = np.full(trajectories, occupied, dtype=np.int64)
+    arrivals = rng.poisson(arrival_rate, size=(horizon_days, trajectories))
+    ran_out = np.zeros(trajectories, dtype=bool)
+    p_full = np.empty(horizon_days)
+    for day in range(horizon_days):
+        occupancy = occupancy - rng.binomial(occupancy, discharge_p) + arrivals[day]
+        ran_out |= occupancy > total_beds
+        # Patients beyond capacity are diverted, not admitted
+        np.minimum(occupancy, total_beds, out=occupancy)
+        p_full[day] = ran_out.mean()
+    return p_full
+
+class CapacitySimulator:
+    """Monte Carlo bed-capacity runs per ward, parallel across wards and cached per data version"""
+    CACHE_SIZE = 64
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers
+        self._cache = OrderedDict()
+
+    @staticmethod
+    def data_version(params):
+        """Identity of the simulation inputs; changes whenever visits or resources change them"""
+        return int(pd.util.hash_pandas_object(params, index=False).sum()) if not params.empty else 0
+
+    def run(self, visits_df, resources_df, horizon_days=DEFAULT_HORIZON_DAYS, trajectories=DEFAULT_TRAJECTORIES,
+            arrival_multiplier=1.0, los_multiplier=1.0, extra_beds=0, seed=0):
+        """Per-ward probability of running out of beds for a scenario; returns (summary, daily probability matrix)"""
+        params = ward_parameters(visits_df, resources_df)
+        key = (self.data_version(params), horizon_days, trajectories,
+               arrival_multiplier, los_multiplier, extra_beds, seed)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+        scenario = params.assign(
+            arrival_rate=params['arrival_rate'] * arrival_multiplier,
+            mean_los=params['mean_los'] * los_multiplier,
+            total_beds=params['total_beds'] + extra_beds
+        )
+        jobs = [
+            (row.total_beds, row.occupied, row.arrival_rate, row.mean_los, horizon_days, trajectories, seed + i)
+            for i, row in enumerate(scenario.itertuples(index=False))
+        ]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            curves = list(pool.map(lambda job: simulate_ward(*job), jobs))
+
+        days = pd.RangeIndex(1, horizon_days + 1, name='day')
+        daily = pd.DataFrame(
+            np.column_stack(curves) if curves else np.empty((horizon_days, 0)),
+            index=days,
+            columns=pd.MultiIndex.from_frame(scenario[['hospital', 'ward']]) if curves else None
+        )
+        summary = scenario.assign(
+            p_full=[curve[-1] for curve in curves],
+            first_risk_day=[int(np.argmax(curve >= 0.5)) + 1 if (curve >= 0.5).any() else None for curve in curves]
+        ).sort_values('p_full', ascending=False, kind='stable').reset_index(drop=True)
+
+        result = (summary, daily)
+        self._cache[key] = result
+        if len(self._cache) > self.CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return result
+
+# Global instance
+capacity_simulator = CapacitySimulator()
+
+def simulate_capacity(visits_df, resources_df, **scenario):
+    """Run (or reuse) a capacity simulation for the given scenario"""
+    return capacity_simulator.run(visits_df, resources_df, **scenario)
@@ -0,0 +1,129 @@
+# cost_rollups.py
+from datetime import datetime
+import pandas as pd
+from data_loader import visit_costs
+from treatment_plans import patient_categories
+
+# Grain name -> pandas period frequency (weeks start on Monday)
+GRAINS = {'day': 'D', 'week': 'W-SUN', 'month': 'M'}
+ROLLUP_KEYS = ['period', 'source', 'hospital', 'cost_category', 'patient_category']
+UNKNOWN = 'Unknown'
+
+def _clean_name(series):
+    return series.astype('string').str.strip().str.rstrip(',').str.strip()
+
+def _empty_table():
+    index = pd.MultiIndex.from_arrays([[] for _ in ROLLUP_KEYS], names=ROLLUP_KEYS)
+    return pd.DataFrame({'amount': pd.Series(dtype='float64'), 'entries': pd.Series(dtype='float64')}, index=index)
+
+def _categories_for(names, rows, patients_df):
+    """Patient category per row: from the row itself, else patients_df by name, else Unknown"""
+    if {'nationality', 'legal_status'}.issubset(rows.columns):
+        people = rows[['nationality', 'legal_status']]
+    elif patients_df is not None and not patients_df.empty and 'nationality' in patients_df.columns:
+        name_col = 'full_name' if 'full_name' in patients_df.columns else 'name'
+        lookup = (
+            patients_df.assign(_name=_clean_name(patients_df[name_col]))
+            .reindex(columns=['_name', 'nationality', 'legal_status'])
+            .drop_duplicates('_name', keep='last')
+            .set_index('_name')
+        )
+        people = lookup.reindex(names.to_numpy())
+        people.index = rows.index
+    else:
+        return pd.Series(UNKNOWN, index=rows.index)
+    categories = pd.Series(patient_categories(people['nationality'], people['legal_status']), index=rows.index)
+    return categories.where(people['nationality'].notna(), UNKNOWN)
+
+def visit_entries(visits_df, patients_df=None):
+    """Visits as cost entries (date, source, hospital, cost_category, patient_category, amount)"""
+    if visits_df.empty or not {'cost', 'cost_cents'}.intersection(visits_df.columns):
+        return pd.DataFrame(columns=['date'] + ROLLUP_KEYS[1:] + ['amount'])
+    names = _clean_name(visits_df['patient_name']) if 'patient_name' in visits_df else pd.Series(pd.NA, index=visits_df.index)
+    entries = pd.DataFrame({
+        'date': pd.to_datetime(visits_df['visit_date'], errors='coerce'),
+        'source': 'visits',
+        'hospital': visits_df['hospital'].astype('string').fillna(UNKNOWN) if 'hospital' in visits_df else UNKNOWN,
+        'cost_category': visits_df['visit_type'].astype('string').fillna('Visit') if 'visit_type' in visits_df else 'Visit',
+        'patient_category': _categories_for(names, visits_df, patients_df),
+        'amount': visit_costs(visits_df).astype('float64'),
+    }, index=visits_df.index)
+    return entries.dropna(subset=['date', 'amount'])
+
+def ledger_entries(ledger_df, patients_df=None):
+    """Ledger rows with an amount as cost entries; summary-only rows (daily_cost etc.) are skipped"""
+    if ledger_df.empty or not {'date', 'amount'}.issubset(ledger_df.columns):
+        return pd.DataFrame(columns=['date'] + ROLLUP_KEYS[1:] + ['amount'])
+    names = _clean_name(ledger_df['patient_name']) if 'patient_name' in ledger_df else pd.Series(pd.NA, index=ledger_df.index)
+    entries = pd.DataFrame({
+        'date': pd.to_datetime(ledger_df['date'], errors='coerce'),
+        'source': 'ledger',
+        'hospital': ledger_df['hospital'].astype('string').fillna(UNKNOWN) if 'hospital' in ledger_df else UNKNOWN,
+        'cost_category': ledger_df['category'].astype('string').fillna('Uncategorised') if 'category' in ledger_df else 'Uncategorised',
+        'patient_category': _categories_for(names, ledger_df, patients_df),
+        'amount': pd.to_numeric(ledger_df['amount'], errors='coerce').astype('float64'),
+    }, index=ledger_df.index)
+    return entries.dropna(subset=['date', 'amount'])
+
+class CostRollups:
+    """Cost totals by day, week and month x hospital x cost category x patient category.
+
+    New visits and ledger rows are grouped on arrival and added into each grain's
+    table, so dashboards read a handful of pre-aggregated rows instead of
+    rescanning every visit and ledger entry.
+    """
+    def __init__(self):
+        self.tables = {grain: _empty_table() for grain in GRAINS}
+
+    @classmethod
+    def from_frames(cls, visits_df, ledger_df, patients_df=None):
+        return cls().add_visits(visits_df, patients_df).add_ledger(ledger_df, patients_df)
+
+    def _fold(self, entries):
+        if entries.empty:
+            return self
+        for grain, freq in GRAINS.items():
+            update = (
+                entries.assign(period=entries['date'].dt.to_period(freq).dt.start_time)
+                .groupby(ROLLUP_KEYS)['amount'].agg(amount='sum', entries='count')
+                .astype('float64')
+            )
+            table = self.tables[grain]
+            self.tables[grain] = update if table.empty else table.add(update, fill_value=0)
+        return self
+
+    def add_visits(self, visits_df, patients_df=None):
+        return self._fold(visit_entries(visits_df, patients_df))
+
+    def add_ledger(self, ledger_df, patients_df=None):
+        return self._fold(ledger_entries(ledger_df, patients_df))
+
+    def record_visit(self, visit, patients_df=None):
+        """Incremental update for a single visit dict"""
+        return self.add_visits(pd.DataFrame([visit]), patients_df)
+
+    def record_ledger_entry(self, entry, patients_df=None):
+        return self.add_ledger(pd.DataFrame([entry]), patients_df)
+
+    def rollup(self, grain='day', start=None, end=None, source=None, by=None):
+        """Rollup rows for a grain, optionally limited to periods in [start, end] and one source.
+
+        `by` regroups onto a subset of ROLLUP_KEYS (e.g. ['period', 'hospital']).
+        """
+        table = self.tables[grain].reset_index()
+        if start is not None:
+            table = table[table['period'] >= pd.Timestamp(start).to_period(GRAINS[grain]).start_time]
+        if end is not None:
+            table = table[table['period'] <= pd.Timestamp(end)]
+        if source is not None:
+            table = table[table['source'] == source]
+        if by is not None:
+            table = table.groupby(by, as_index=False)[['amount', 'entries']].sum()
+        table = table.assign(average=table['amount'] / table['entries'].where(table['entries'] > 0))
+        return table.reset_index(drop=True)
+
+    def period_total(self, grain='day', when=None, source=None):
+        """(amount, entries) for the period containing `when` (default: now)"""
+        when = pd.Timestamp(when or datetime.now())
+        rows = self.rollup(grain, start=when, end=when, source=source)
+        return float(rows['amount'].sum()), int(rows['entries'].sum())
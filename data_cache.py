@@ -0,0 +1,154 @@
+# data_cache.py
+import itertools
+import logging
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+import pandas as pd
+try:
+    import fcntl
+except ImportError:     # Windows: writers are only serialized within a process
+    fcntl = None
+
+# Serial per cache, so a replacement cache never reissues its predecessor's versions
+_instances = itertools.count()
+
+class SharedDataCache:
+    """Process-wide frames keyed by dataset version, shared by every session.
+
+    The version is the (mtime, size) of each source file plus a change counter
+    bumped on every write-through. Reads never wait on a reload: when a source
+    file changes underneath the cache, the current frames keep being served while
+    a background thread rebuilds them, and the new set is swapped in atomically.
+    Frames are replaced, never mutated, so callers must treat them as read-only.
+    """
+    def __init__(self, loader, sources):
+        self.loader = loader              # () -> dict of name -> DataFrame
+        self.sources = list(sources)
+        self.changes = 0
+        self._instance = next(_instances)
+        self._generation = 0             # bumped on every full load
+        self._appends = {}               # dataset name -> write-throughs since the last load
+        self._lock = threading.Lock()
+        self._frames = None
+        self._file_version = None
+        self._refresh_thread = None
+
+    def file_version(self):
+        return tuple(_stat(path) for path in self.sources)
+
+    @property
+    def version(self):
+        return (self._file_version, self.changes)
+
+    def _loaded(self, frames):
+        self._frames = frames
+        self._generation += 1
+        self._appends = {}
+
+    def get(self):
+        """Current frames; the first call loads synchronously, later ones never block on a reload"""
+        return self.snapshot()[0]
+
+    def snapshot(self):
+        """(frames, {name: version}) read together; a dataset's version changes on a reload or a write-through to it.
+
+        Versions carry the cache's serial: a cache rebuilt after clearing
+        st.cache_resource restarts its generations, and must not match keys
+        that consumers cached against the old one.
+        """
+        with self._lock:
+            if self._frames is None:
+                self._file_version = self.file_version()
+                self._loaded(self.loader())
+            elif self.file_version() != self._file_version and not self.refreshing:
+                self._refresh_thread = threading.Thread(target=self._refresh, args=(self.changes,), daemon=True)
+                self._refresh_thread.start()
+            versions = {name: (self._instance, self._generation, self._appends.get(name, 0)) for name in self._frames}
+            return self._frames, versions
+
+    @property
+    def refreshing(self):
+        return self._refresh_thread is not None and self._refresh_thread.is_alive()
+
+    def _refresh(self, changes):
+        try:
+            version = self.file_version()
+            frames = self.loader()
+        except Exception as e:
+            logging.error(f"Background data refresh failed: {str(e)}")
+            return
+        with self._lock:
+            # A write-through landed mid-load; drop this result and let the next read reload again
+            if self.changes != changes:
+                return
+            self._loaded(frames)
+            self._file_version = version
+            self.changes += 1
+
+    def append(self, name, rows, path=None):
+        """Write-through: persist rows to path (if given) and publish them to every session at once"""
+        rows = pd.DataFrame(rows)
+        with self._lock:
+            if path:
+                before = append_csv(rows, path)
+            frames = dict(self._frames if self._frames is not None else self.loader())
+            current = frames.get(name)
+            frames[name] = rows if current is None or current.empty else pd.concat([current, rows], ignore_index=True)
+            if self._frames is None:
+                self._loaded(frames)
+            self._frames = frames
+            self._appends[name] = self._appends.get(name, 0) + 1
+            if path in self.sources:
+                # Our own write on top of the file we last loaded: record it so it doesn't trigger a
+                # reload. If another process wrote in between, leave the version stale so the next
+                # read reloads the file with their rows as well as ours.
+                versions = list(self._file_version or self.file_version())
+                index = self.sources.index(path)
+                if before == versions[index]:
+                    versions[index] = _stat(path)
+                    self._file_version = tuple(versions)
+            self.changes += 1
+        return frames[name]
+
+@contextmanager
+def file_lock(path):
+    """Exclusive lock on `path` shared by every process that writes it, held on a sidecar .lock file"""
+    if fcntl is None:
+        yield
+        return
+    with open(f"{path}.lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+def _stat(path):
+    try:
+        stat = os.stat(path)
+        return (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        return None
+
+def append_csv(rows, path):
+    """Append rows to a CSV, aligning to its existing header.
+
+    Returns the file's (mtime, size) just before the write, taken under the lock.
+    """
+    with file_lock(path):
+        before = _stat(path)
+        if before is None or before[1] == 0:
+            rows.to_csv(path, index=False)
+            return before
+        columns = pd.read_csv(path, nrows=0).columns
+        if set(rows.columns) <= set(columns):
+            rows.reindex(columns=columns).to_csv(path, mode='a', index=False, header=False)
+        else:
+            # New fields: rewrite with the widened header via a private temp file, then swap it in
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+            with os.fdopen(fd, "w", newline="") as tmp:
+                pd.concat([pd.read_csv(path), rows], ignore_index=True).to_csv(tmp, index=False)
+            os.replace(tmp_path, path)
+        return before
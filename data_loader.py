@@ -1,62 +1,98 @@
 import pandas as pd
+import numpy as np
 import os
 import streamlit as st
 from datetime import datetime, timedelta
+from medication_stock import ConsumptionEngine
+from schema_migration import has_store, load_canonical
 
-def load_all_data():
-    """Load all application data with real-time metrics support"""
+# ====== COLUMN DEFINITIONS WITH ENHANCED DATA TYPES ======
+PATIENTS_COLUMNS = {
+    'id': 'string',
+    'timestamp': 'datetime64[ns]',
+    'full_name': 'string',
+    'nationality': 'category',
+    'id_number': 'string',
+    'passport_number': 'string',
+    'document_type': 'category',
+    'legal_status': 'category',
+    'status': 'string',
+    'last_visit': 'datetime64[ns]'
+}
+
+VISITS_COLUMNS = {
+    'visit_id': 'string',
+    'patient_id': 'string',
+    'patient_name': 'string',
+    'hospital': 'category',
+    'visit_date': 'datetime64[ns]',
+    'visit_type': 'category',
+    'doctor': 'string',
+    'diagnosis': 'string',
+    'ward': 'category',
+    'medication': 'string',
+    'cost': 'float64',
+    'duration_minutes': 'int64'
+}
+
+RESOURCES_COLUMNS = {
+    'resource_id': 'string',
+    'resource_type': 'category',
+    'name': 'string',
+    'quantity': 'float64',
+    'unit': 'category',
+    'status': 'category',
+    'location': 'string',
+    'last_updated': 'datetime64[ns]'
+}
+
+COSTS_COLUMNS = {
+    'date': 'datetime64[ns]',
+    'total_cost': 'float64',
+    'medication_cost': 'float64',
+    'staff_cost': 'float64',
+    'facility_cost': 'float64',
+    'patient_count': 'int64'
+}
+
+INTAKE_LOG_COLUMNS = {
+    'timestamp': 'datetime64[ns]',
+    'name': 'string',
+    'nationality': 'category',
+    'doc_type': 'category',
+    'doc_number': 'string',
+    'legal_status': 'string',
+    'result': 'category'
+}
+
+# Rows read per chunk in streaming mode
+CHUNK_SIZE = 50_000
+
+# Memory-budget mode: dictionary-encoded labels and integer cents for money
+COMPACT_CATEGORIES = ['nationality', 'hospital', 'ward', 'document_type', 'doc_type', 'legal_status', 'visit_type']
+COMPACT_CENTS = ['cost', 'amount']
+
+
+def _coerce_column(series, dtype):
+    """Convert a column, turning unparseable values into NA instead of dropping the column"""
+    if dtype.startswith('datetime64'):
+        return pd.to_datetime(series, errors='coerce')
+    if dtype.lower().startswith(('int', 'float')):
+        numeric = pd.to_numeric(series, errors='coerce')
+        return numeric.astype('Int64' if dtype.lower().startswith('int') else dtype)
+    return series.astype(dtype)
+
+def load_all_data(compact=False):
+    """Load all application data with real-time metrics support.
+
+    compact=True returns the memory-budget layout produced by compact_frame, for
+    offline jobs and reports. The app keeps the full layout: its shared cache
+    appends new rows in place, which categorical columns would reject for unseen
+    labels, and several pages still read `cost` directly.
+    """
     base_path = "data"
     os.makedirs(base_path, exist_ok=True)
     
-    # ====== COLUMN DEFINITIONS WITH ENHANCED DATA TYPES ======
-    patients_columns = {
-        'id': 'string',
-        'timestamp': 'datetime64[ns]',
-        'full_name': 'string',
-        'nationality': 'category',
-        'id_number': 'string',
-        'passport_number': 'string',
-        'document_type': 'category',
-        'legal_status': 'category',
-        'status': 'string',
-        'last_visit': 'datetime64[ns]'
-    }
-    
-    visits_columns = {
-        'visit_id': 'string',
-        'patient_id': 'string',
-        'patient_name': 'string',
-        'hospital': 'category',
-        'visit_date': 'datetime64[ns]',
-        'visit_type': 'category',
-        'doctor': 'string',
-        'diagnosis': 'string',
-        'ward': 'category',
-        'medication': 'string',
-        'cost': 'float64',
-        'duration_minutes': 'int64'
-    }
-    
-    resources_columns = {
-        'resource_id': 'string',
-        'resource_type': 'category',
-        'name': 'string',
-        'quantity': 'float64',
-        'unit': 'category',
-        'status': 'category',
-        'location': 'string',
-        'last_updated': 'datetime64[ns]'
-    }
-    
-    costs_columns = {
-        'date': 'datetime64[ns]',
-        'total_cost': 'float64',
-        'medication_cost': 'float64',
-        'staff_cost': 'float64',
-        'facility_cost': 'float64',
-        'patient_count': 'int64'
-    }
-
     # ====== COMPREHENSIVE SAMPLE DATA ======
     sample_patients = [
         {
@@ -153,8 +189,8 @@ def load_all_data():
                     if col in df.columns:
                         try:
                             df[col] = df[col].astype(dtype)
-                        except:
-                            df[col] = None
+                        except (ValueError, TypeError):
+                            df[col] = _coerce_column(df[col], dtype)
                     else:
                         df[col] = pd.Series(dtype=dtype)
                 
@@ -176,31 +212,37 @@ def load_all_data():
             st.error(f"Error loading {filepath}: {str(e)}")
             return pd.DataFrame({col: pd.Series(dtype=dtype) for col, dtype in columns.items()})
 
-    # Load data with proper typing
-    patients = load_or_initialize(
-        f"{base_path}/patients.csv", 
-        patients_columns,
-        sample_patients
-    )
-    
-    visits = load_or_initialize(
-        f"{base_path}/visits.csv", 
-        visits_columns,
-        sample_visits
-    )
-    
-    resources = load_or_initialize(
-        f"{base_path}/resources.csv", 
-        resources_columns,
-        sample_resources
-    )
-    
-    costs = load_or_initialize(
-        f"{base_path}/costs.csv", 
-        costs_columns,
-        sample_costs
-    )
-    
+    if has_store(base_path):
+        # Already typed and validated by the migration; skip the per-file reconciliation
+        canonical = load_canonical(base_path)
+        patients, visits, resources = canonical['patients'], canonical['visits'], canonical['resources']
+        costs = canonical['cost_summary']
+    else:
+        # Load data with proper typing
+        patients = load_or_initialize(
+            f"{base_path}/patients.csv", 
+            PATIENTS_COLUMNS,
+            sample_patients
+        )
+
+        visits = load_or_initialize(
+            f"{base_path}/visits.csv", 
+            VISITS_COLUMNS,
+            sample_visits
+        )
+
+        resources = load_or_initialize(
+            f"{base_path}/resources.csv", 
+            RESOURCES_COLUMNS,
+            sample_resources
+        )
+
+        costs = load_or_initialize(
+            f"{base_path}/costs.csv", 
+            COSTS_COLUMNS,
+            sample_costs
+        )
+
     # Process intake logs
     intake_logs_path = f"{base_path}/intake_logs.csv"
     if os.path.exists(intake_logs_path):
@@ -219,16 +261,21 @@ def load_all_data():
         except Exception as e:
             st.error(f"Error processing intake logs: {str(e)}")
     
+    if compact:
+        patients, visits, resources, costs = (
+            compact_frame(df) for df in (patients, visits, resources, costs)
+        )
+
     return patients, visits, resources, costs
 
-def get_realtime_metrics(patients_df, visits_df, resources_df):
+def get_realtime_metrics(patients_df, visits_df, resources_df, visit_aggregates=None, consumption=None):
     """Calculate real-time metrics for dashboard"""
     metrics = {
         'sa_patients': 0,
         'legal_immigrants': 0,
         'needs_review': 0,
         'beds_available': 0,
-        'med_stock_days': 9,  # Default value
+        'med_stock_days': None,  # Unknown until medication consumption is recorded
         'today_cost': 0
     }
     
@@ -257,19 +304,187 @@ def get_realtime_metrics(patients_df, visits_df, resources_df):
                 (resources_df['status'] == 'Available')
             ])
             
-            # Medication stock (simplified calculation)
-            meds = resources_df[resources_df['resource_type'] == 'Medication']
-            if not meds.empty:
-                metrics['med_stock_days'] = int(meds['quantity'].mean() / 10)  # Example calculation
+            # Medication stock: days until the first ward runs out at its current burn rate
+            engine = consumption or ConsumptionEngine().add_visits(visits_df)
+            metrics['med_stock_days'] = engine.min_days_of_stock(resources_df)
         
         # Cost metrics (today's cost)
-        if not visits_df.empty:
+        if visit_aggregates is not None:
+            metrics['today_cost'] = visit_aggregates.cost_on(datetime.now())
+        elif not visits_df.empty:
             today = datetime.now().date()
             visits_df['visit_date'] = pd.to_datetime(visits_df['visit_date']).dt.date
             today_visits = visits_df[visits_df['visit_date'] == today]
-            metrics['today_cost'] = today_visits['cost'].sum()
+            metrics['today_cost'] = visit_costs(today_visits).sum()
             
     except Exception as e:
         st.error(f"Error calculating metrics: {str(e)}")
     
-    return metrics
\ No newline at end of file
+    return metrics
+
+# ====== STREAMING INGESTION ======
+def _fold(running, update, how='sum'):
+    """Merge a per-chunk aggregate into its running total"""
+    if running is None:
+        return update
+    if update.empty:
+        return running
+    return pd.concat([running, update]).groupby(level=list(range(update.index.nlevels))).agg(how)
+
+def stream_csv(filepath, columns, usecols=None, chunksize=CHUNK_SIZE):
+    """Yield fixed-size chunks of a CSV typed with the declared dtypes"""
+    if not os.path.exists(filepath):
+        return
+
+    wanted = list(usecols or columns)
+    header = pd.read_csv(filepath, nrows=0).columns
+    present = [col for col in wanted if col in header]
+    dates = [col for col in present if columns.get(col, '').startswith('datetime64')]
+    # Nullable ints: historical rows often leave count columns blank
+    dtype = {
+        col: ('Int64' if columns.get(col) == 'int64' else columns.get(col, 'string'))
+        for col in present if col not in dates
+    }
+
+    for chunk in pd.read_csv(filepath, usecols=present, dtype=dtype, chunksize=chunksize):
+        for col in dates:
+            chunk[col] = pd.to_datetime(chunk[col], errors='coerce')
+        for col in wanted:
+            if col not in chunk.columns:
+                chunk[col] = pd.Series(index=chunk.index, dtype=columns.get(col, 'string'))
+        yield chunk
+
+class VisitAggregates:
+    """Running visit aggregates, updated one chunk at a time"""
+    USECOLS = ['patient_id', 'patient_name', 'hospital', 'ward', 'visit_date', 'cost']
+
+    def __init__(self):
+        self.rows = 0
+        self.total_cost = 0.0
+        self.daily_counts = None
+        self.daily_cost = None
+        self.hospital_cost = None
+        self.ward_admissions = None
+        self.last_visit = None
+
+    def update(self, chunk):
+        """Fold one chunk of visits into the running aggregates"""
+        self.rows += len(chunk)
+        day = chunk['visit_date'].dt.normalize()
+        cost = chunk['cost'].fillna(0)
+        hospital = chunk['hospital'].astype('string').fillna('Unknown')
+        ward = chunk['ward'].astype('string').fillna('Unassigned')
+        patient = chunk['patient_name'].fillna(chunk['patient_id'])
+
+        self.total_cost += float(cost.sum())
+        self.daily_counts = _fold(self.daily_counts, day.value_counts())
+        self.daily_cost = _fold(self.daily_cost, cost.groupby(day).sum())
+        self.hospital_cost = _fold(self.hospital_cost, cost.groupby(hospital).sum())
+        self.ward_admissions = _fold(self.ward_admissions, chunk.groupby([hospital, ward]).size())
+        self.last_visit = _fold(self.last_visit, chunk['visit_date'].groupby(patient).max(), 'max')
+
+    def visits_on(self, day):
+        """Number of visits recorded on a given day"""
+        if self.daily_counts is None:
+            return 0
+        return int(self.daily_counts.get(pd.Timestamp(day).normalize(), 0))
+
+    def cost_on(self, day):
+        """Total visit cost recorded on a given day"""
+        if self.daily_cost is None:
+            return 0.0
+        return float(self.daily_cost.get(pd.Timestamp(day).normalize(), 0.0))
+
+class IntakeAggregates:
+    """Running intake log aggregates, updated one chunk at a time"""
+    USECOLS = ['timestamp', 'name', 'doc_number', 'nationality', 'result']
+
+    def __init__(self):
+        self.rows = 0
+        self.daily_counts = None
+        self.result_counts = None
+        self.nationality_counts = None
+        self.last_intake = None
+
+    def update(self, chunk):
+        """Fold one chunk of intake logs into the running aggregates"""
+        self.rows += len(chunk)
+        day = chunk['timestamp'].dt.normalize()
+        patient = chunk['doc_number'].fillna(chunk['name'])
+
+        self.daily_counts = _fold(self.daily_counts, day.value_counts())
+        self.result_counts = _fold(self.result_counts, chunk['result'].astype('string').value_counts())
+        self.nationality_counts = _fold(self.nationality_counts, chunk['nationality'].astype('string').value_counts())
+        self.last_intake = _fold(self.last_intake, chunk['timestamp'].groupby(patient).max(), 'max')
+
+def load_streaming_aggregates(base_path="data", chunksize=CHUNK_SIZE):
+    """Streaming mode: aggregate visits and intake logs without holding either file in memory"""
+    visits = VisitAggregates()
+    intake = IntakeAggregates()
+    try:
+        for chunk in stream_csv(f"{base_path}/visits.csv", VISITS_COLUMNS, VisitAggregates.USECOLS, chunksize):
+            visits.update(chunk)
+        for chunk in stream_csv(f"{base_path}/intake_logs.csv", INTAKE_LOG_COLUMNS, IntakeAggregates.USECOLS, chunksize):
+            intake.update(chunk)
+    except Exception as e:
+        st.error(f"Error streaming data: {str(e)}")
+    return visits, intake
+
+
+# ====== MEMORY BUDGET MODE ======
+def _smallest_int(series, candidates=('Int8', 'Int16', 'Int32')):
+    """Downcast an integer column to the narrowest nullable type that holds its range"""
+    values = series.dropna()
+    if values.empty:
+        return series.astype(candidates[0])
+    for dtype in candidates:
+        info = np.iinfo(dtype.lower())
+        if info.min <= values.min() and values.max() <= info.max:
+            return series.astype(dtype)
+    return series.astype('Int64')
+
+def to_cents(series):
+    """Rand amounts as nullable integer cents"""
+    cents = (pd.to_numeric(series, errors='coerce') * 100).round().astype('Int64')
+    return _smallest_int(cents, candidates=('Int32',))
+
+def visit_costs(visits_df):
+    """Per-visit cost in rand, from either a full (`cost`) or compact (`cost_cents`) frame"""
+    if 'cost_cents' in visits_df.columns:
+        return visits_df['cost_cents'].astype('Float64') / 100
+    return pd.to_numeric(visits_df['cost'], errors='coerce')
+
+def compact_frame(df):
+    """Memory-budget copy of a frame: categoricals, integer cents, and narrow ints"""
+    df = df.copy()
+    for col in list(df.columns):
+        series = df[col]
+        if col in COMPACT_CENTS:
+            df.insert(df.columns.get_loc(col), f"{col}_cents", to_cents(series))
+            df = df.drop(columns=col)
+        elif col in COMPACT_CATEGORIES:
+            df[col] = series.astype('category')
+        elif pd.api.types.is_integer_dtype(series):
+            df[col] = _smallest_int(series)
+    return df
+
+def memory_report(frames):
+    """Deep memory usage per named DataFrame"""
+    report = pd.DataFrame(
+        [
+            {'frame': name, 'rows': len(df), 'columns': df.shape[1], 'bytes': int(df.memory_usage(deep=True).sum())}
+            for name, df in frames.items()
+        ],
+        columns=['frame', 'rows', 'columns', 'bytes']
+    )
+    report['mb'] = (report['bytes'] / 2**20).round(3)
+    return report
+
+def session_memory_report(frames=None):
+    """Memory held by this session: the given frames plus any DataFrames kept in session_state"""
+    tracked = dict(frames or {})
+    for key, value in st.session_state.items():
+        if isinstance(value, pd.DataFrame):
+            tracked[f"session_state.{key}"] = value
+    report = memory_report(tracked)
+    return report, int(report['bytes'].sum())
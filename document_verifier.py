@@ -4,11 +4,13 @@ from datetime import datetime
 from deepface import DeepFace  # Would be used in real implementation
 import streamlit as st
 import random
+from home_affairs_client import HomeAffairsClient, CsvTransport, home_affairs, REGISTRY_CSV
 
 class DocumentVerifier:
-    def __init__(self):
-        self.db_path = "data/mock_home_affairs.csv"
+    def __init__(self, client=None):
+        self.db_path = REGISTRY_CSV
         self._initialize_db()
+        self.client = client or home_affairs
         
     def _initialize_db(self):
         """Initialize database if not exists"""
@@ -21,7 +23,7 @@ class DocumentVerifier:
 
     def enhanced_verify(self, doc_type, doc_number, nationality, face_image=None):
         """Enhanced verification with facial recognition"""
-        base_result = verify_document(doc_type, doc_number, nationality, self.db_path)
+        base_result = verify_document(doc_type, doc_number, nationality, self.db_path, client=self.client)
         
         if base_result != "Valid":
             return base_result
@@ -42,20 +44,19 @@ class DocumentVerifier:
             st.error(f"AI verification error: {str(e)}")
             return base_result  # Fallback to base result
 
-def verify_document(doc_type, doc_number, nationality, db_path):
+def verify_document(doc_type, doc_number, nationality, db_path=REGISTRY_CSV, client=None):
     """
-    Basic document verification stub.
-    Checks if the document exists in the mock database.
+    Basic document verification against the Home Affairs registry.
+    Checks that the document exists for the given nationality.
     """
+    if client is None:
+        client = home_affairs if db_path == REGISTRY_CSV else HomeAffairsClient(CsvTransport(db_path))
     try:
-        df = pd.read_csv(db_path)
-        if doc_type == "ID":
-            match = df[(df['id_number'] == doc_number) & (df['nationality'] == nationality)]
-        elif doc_type == "Passport":
-            match = df[(df['passport_number'] == doc_number) & (df['nationality'] == nationality)]
-        else:
+        if doc_type not in ("ID", "Passport"):
             return "Invalid Document Type"
-        if not match.empty:
+        record = client.lookup(doc_number)
+        column = 'id_number' if doc_type == "ID" else 'passport_number'
+        if record is not None and str(record.get(column) or '').upper() == str(doc_number).strip().upper() and record.get('nationality') == nationality:
             return "Valid"
         else:
             return "Not Found"
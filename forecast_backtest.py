@@ -0,0 +1,126 @@
+# forecast_backtest.py
+"""Rolling-origin backtests of the ResourcePredictor forecast engines.
+
+Each engine is refit at a series of forecast origins on every daily series and
+scored on the `horizon` days that follow: MAPE of yhat, coverage of the
+[yhat_lower, yhat_upper] interval, and the wall time spent fitting and
+predicting. Jobs (engine x series x origin) run in parallel in a process pool.
+
+    python forecast_backtest.py [--series series.csv] [--engines prophet seasonal_naive] [--horizon 7]
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from resource_predictor import ENGINES, FORECAST_DAYS
+from resource_series import resource_series
+
+VISITS_PATH = os.path.join("data", "visits.csv")
+INITIAL_DAYS = 21
+STEP_DAYS = 7
+RESULT_COLUMNS = ['engine', 'series', 'cutoff', 'mape', 'coverage', 'fit_seconds', 'predict_seconds', 'error']
+
+def visit_series(visits_df):
+    """Daily visit counts per hospital as long (series, ds, y), with days without visits as 0"""
+    dates = pd.to_datetime(visits_df['visit_date'], errors='coerce').dt.normalize()
+    counts = visits_df.assign(ds=dates).dropna(subset=['ds']).groupby(['hospital', 'ds']).size()
+    if counts.empty:
+        return pd.DataFrame(columns=['series', 'ds', 'y'])
+    days = pd.date_range(counts.index.get_level_values('ds').min(), counts.index.get_level_values('ds').max(), freq='D')
+    full = pd.MultiIndex.from_product([counts.index.get_level_values('hospital').unique(), days], names=['series', 'ds'])
+    counts.index = counts.index.set_names(['series', 'ds'])
+    return counts.reindex(full, fill_value=0).rename('y').reset_index()
+
+def rolling_origins(length, initial=INITIAL_DAYS, horizon=FORECAST_DAYS, step=STEP_DAYS):
+    """Training lengths for each forecast origin that leaves a full horizon to score"""
+    return list(range(initial, length - horizon + 1, step))
+
+def score(actual, forecast):
+    """(MAPE over days with non-zero actuals, share of actuals inside the interval)"""
+    actual = np.asarray(actual, dtype=float)
+    yhat = forecast['yhat'].to_numpy(dtype=float)
+    nonzero = actual != 0
+    mape = float(np.mean(np.abs((actual[nonzero] - yhat[nonzero]) / actual[nonzero])) * 100) if nonzero.any() else np.nan
+    inside = (actual >= forecast['yhat_lower'].to_numpy(dtype=float)) & (actual <= forecast['yhat_upper'].to_numpy(dtype=float))
+    return mape, float(inside.mean())
+
+def run_fold(engine_name, series, train, actual):
+    """Fit one engine on one training window and score it on the following days"""
+    row = {'engine': engine_name, 'series': series, 'cutoff': train['ds'].max(),
+           'mape': np.nan, 'coverage': np.nan, 'fit_seconds': np.nan, 'predict_seconds': np.nan, 'error': None}
+    engine = ENGINES[engine_name]()
+    try:
+        started = time.perf_counter()
+        model = engine.fit(train)
+        row['fit_seconds'] = time.perf_counter() - started
+        started = time.perf_counter()
+        forecast = engine.predict(model, len(actual))
+        row['predict_seconds'] = time.perf_counter() - started
+        row['mape'], row['coverage'] = score(actual, forecast)
+    except Exception as e:
+        # One failing fit is reported, not allowed to sink the whole suite
+        row['error'] = f"{type(e).__name__}: {e}"
+    return row
+
+def _jobs(series_df, engines, horizon, initial, step):
+    for series, frame in series_df.sort_values('ds').groupby('series', sort=False):
+        frame = frame[['ds', 'y']].reset_index(drop=True)
+        for length in rolling_origins(len(frame), initial, horizon, step):
+            train = frame.iloc[:length]
+            actual = frame['y'].iloc[length:length + horizon].to_numpy()
+            for engine_name in engines:
+                yield engine_name, series, train, actual
+
+def backtest(series_df, engines=None, horizon=FORECAST_DAYS, initial=INITIAL_DAYS, step=STEP_DAYS, workers=None):
+    """One row per (engine, series, origin); series_df is long (series, ds, y)"""
+    engines = list(engines or ENGINES)
+    unknown = set(engines) - set(ENGINES)
+    if unknown:
+        raise ValueError(f"Unknown forecast engines: {', '.join(sorted(unknown))}")
+    series_df = series_df.assign(ds=pd.to_datetime(series_df['ds']), y=pd.to_numeric(series_df['y'], errors='coerce'))
+    jobs = list(_jobs(series_df.dropna(subset=['ds', 'y']), engines, horizon, initial, step))
+    if not jobs:
+        return pd.DataFrame(columns=RESULT_COLUMNS)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        rows = list(pool.map(run_fold, *zip(*jobs), chunksize=max(1, len(jobs) // (4 * (workers or os.cpu_count() or 1)))))
+    return pd.DataFrame(rows, columns=RESULT_COLUMNS)
+
+def summarize(results):
+    """Per-engine accuracy next to its cost: mean MAPE and coverage, and fit/predict seconds per origin"""
+    ok = results[results['error'].isna()]
+    summary = ok.groupby('engine').agg(
+        folds=('mape', 'size'),
+        mape=('mape', 'mean'),
+        coverage=('coverage', 'mean'),
+        fit_seconds=('fit_seconds', 'mean'),
+        predict_seconds=('predict_seconds', 'mean'),
+    ).reindex(pd.Index(results['engine'].unique(), name='engine'))
+    summary['folds'] = summary['folds'].fillna(0).astype('int64')
+    summary['failed'] = results[results['error'].notna()].groupby('engine').size().reindex(summary.index, fill_value=0)
+    summary['seconds_per_forecast'] = summary['fit_seconds'] + summary['predict_seconds']
+    return summary.sort_values('mape', na_position='last').reset_index()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rolling-origin backtest of the resource forecast engines")
+    parser.add_argument("--series", help="CSV of daily series with columns series, ds, y "
+                                         "(default: the materialized resource series, else visits per hospital)")
+    parser.add_argument("--engines", nargs="+", choices=list(ENGINES), default=list(ENGINES))
+    parser.add_argument("--horizon", type=int, default=FORECAST_DAYS)
+    parser.add_argument("--initial", type=int, default=INITIAL_DAYS, help="days of history before the first origin")
+    parser.add_argument("--step", type=int, default=STEP_DAYS, help="days between origins")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--results", help="also write the per-fold results to this CSV")
+    args = parser.parse_args()
+    if args.series:
+        series_df = pd.read_csv(args.series)
+    elif resource_series.manifest()['chunks']:
+        series_df = resource_series.to_frame()
+    else:
+        series_df = visit_series(pd.read_csv(VISITS_PATH))
+    results = backtest(series_df, args.engines, args.horizon, args.initial, args.step, args.workers)
+    if args.results:
+        results.to_csv(args.results, index=False)
+    print(f"{results['series'].nunique()} series, {len(results)} engine fits")
+    print(summarize(results).to_string(index=False, float_format=lambda x: f"{x:.4f}"))
@@ -0,0 +1,302 @@
+# home_affairs_client.py
+"""Home Affairs registry client used by utils.verify_legal_status and DocumentVerifier.
+
+Lookups go through a TTL cache (with a shorter-lived negative cache for
+unknown documents), identical in-flight lookups are coalesced onto one request,
+and a circuit breaker fails fast while the registry is down. Transport is a
+pool of keep-alive HTTP connections when HOME_AFFAIRS_URL is set, otherwise
+the local mock CSV.
+
+    python home_affairs_client.py --port 8765 --latency 0.25   # offline stub registry
+"""
+import argparse
+import http.client
+import json
+import os
+import queue
+import random
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote, unquote, urlsplit
+import pandas as pd
+
+REGISTRY_CSV = os.path.join("data", "mock_home_affairs.csv")
+URL_ENV = "HOME_AFFAIRS_URL"
+CACHE_TTL = 15 * 60
+NEGATIVE_TTL = 60
+CACHE_SIZE = 50_000
+POOL_SIZE = 8
+REQUEST_TIMEOUT = 5.0
+FAILURE_THRESHOLD = 5
+RESET_TIMEOUT = 30.0
+REGISTRY_FIELDS = ['id_number', 'passport_number', 'nationality', 'full_name', 'legal_status']
+# How a pooled keep-alive connection the server has since closed fails on reuse
+# (RemoteDisconnected is a ConnectionResetError)
+STALE_CONNECTION_ERRORS = (ConnectionResetError, ConnectionAbortedError, BrokenPipeError)
+
+class RegistryUnavailable(Exception):
+    """The registry failed or the circuit breaker is open"""
+
+def _normalize_doc(doc_number):
+    return str(doc_number).strip().upper()
+
+def load_registry(csv_path=REGISTRY_CSV):
+    """Registry rows indexed by every document number they carry (ID and passport)"""
+    df = pd.read_csv(csv_path, dtype=str).reindex(columns=REGISTRY_FIELDS)
+    records = {}
+    for row in df.to_dict('records'):
+        row = {key: (None if pd.isna(value) else value) for key, value in row.items()}
+        for column in ('id_number', 'passport_number'):
+            if row[column]:
+                records[_normalize_doc(row[column])] = row
+    return records
+
+class CsvTransport:
+    """Local registry backed by the mock CSV, reloaded when the file changes"""
+    def __init__(self, csv_path=REGISTRY_CSV):
+        self.csv_path = csv_path
+        self._mtime = None
+        self._records = {}
+        self._lock = threading.Lock()
+
+    def fetch(self, doc_number):
+        with self._lock:
+            try:
+                mtime = os.path.getmtime(self.csv_path)
+            except OSError as e:
+                raise RegistryUnavailable(f"Registry file unavailable: {e}") from e
+            if mtime != self._mtime:
+                self._records = load_registry(self.csv_path)
+                self._mtime = mtime
+            return self._records.get(doc_number)
+
+class HttpTransport:
+    """GET {base}/records/<doc_number> over a pool of persistent HTTP/1.1 connections"""
+    def __init__(self, base_url, pool_size=POOL_SIZE, timeout=REQUEST_TIMEOUT):
+        parts = urlsplit(base_url)
+        self.scheme = parts.scheme or 'http'
+        self.host = parts.hostname
+        self.port = parts.port
+        self.prefix = parts.path.rstrip('/')
+        self.timeout = timeout
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        self._slots = threading.BoundedSemaphore(pool_size)
+
+    def _connect(self):
+        connection_class = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+        return connection_class(self.host, self.port, timeout=self.timeout)
+
+    def _get(self, connection, path):
+        connection.request('GET', path, headers={'Connection': 'keep-alive', 'Accept': 'application/json'})
+        response = connection.getresponse()
+        return response, response.read()
+
+    def fetch(self, doc_number):
+        path = f"{self.prefix}/records/{quote(doc_number, safe='')}"
+        with self._slots:
+            try:
+                connection, pooled = self._pool.get_nowait(), True
+            except queue.Empty:
+                connection, pooled = self._connect(), False
+            try:
+                try:
+                    response, body = self._get(connection, path)
+                except STALE_CONNECTION_ERRORS:
+                    if not pooled:
+                        raise
+                    # The server dropped this idle connection; that says nothing about the registry, so retry once fresh
+                    connection.close()
+                    connection = self._connect()
+                    response, body = self._get(connection, path)
+            except (OSError, http.client.HTTPException) as e:
+                connection.close()
+                raise RegistryUnavailable(f"Registry request failed: {e}") from e
+            if response.will_close:
+                connection.close()
+            else:
+                self._pool.put_nowait(connection)
+        if response.status == 404:
+            return None
+        if response.status != 200:
+            raise RegistryUnavailable(f"Registry returned HTTP {response.status}")
+        return json.loads(body)
+
+class CircuitBreaker:
+    """Opens after consecutive failures; after reset_timeout one trial call is let through"""
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        return 'half-open' if time.monotonic() - self.opened_at >= self.reset_timeout else 'open'
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                self.opened_at = time.monotonic()
+
+class _InFlight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class HomeAffairsClient:
+    """Cached, coalescing, circuit-broken lookups of registry records by document number"""
+    def __init__(self, transport, ttl=CACHE_TTL, negative_ttl=NEGATIVE_TTL, cache_size=CACHE_SIZE, breaker=None):
+        self.transport = transport
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.cache_size = cache_size
+        self.breaker = breaker or CircuitBreaker()
+        self._cache = OrderedDict()     # doc -> (expires_at, record or None)
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'coalesced': 0, 'rejected': 0}
+
+    @classmethod
+    def from_env(cls, **kwargs):
+        base_url = os.environ.get(URL_ENV)
+        return cls(HttpTransport(base_url) if base_url else CsvTransport(), **kwargs)
+
+    def lookup(self, doc_number):
+        """Registry record for a document number, None if unknown; raises RegistryUnavailable"""
+        doc = _normalize_doc(doc_number)
+        with self._lock:
+            cached = self._cache.get(doc)
+            if cached and cached[0] > time.monotonic():
+                self._cache.move_to_end(doc)
+                self.stats['hits'] += 1
+                return cached[1]
+            flight = self._in_flight.get(doc)
+            leader = flight is None
+            if leader:
+                flight = self._in_flight[doc] = _InFlight()
+                self.stats['misses'] += 1
+            else:
+                self.stats['coalesced'] += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error:
+                raise flight.error
+            return flight.result
+
+        try:
+            if not self.breaker.allow():
+                self.stats['rejected'] += 1
+                raise RegistryUnavailable("Home Affairs registry circuit open")
+            try:
+                flight.result = self.transport.fetch(doc)
+            except Exception:
+                # Any failure (bad JSON, unreadable registry file) counts, or a half-open trial never ends
+                self.breaker.failure()
+                raise
+            self.breaker.success()
+            ttl = self.ttl if flight.result is not None else self.negative_ttl
+            with self._lock:
+                self._cache[doc] = (time.monotonic() + ttl, flight.result)
+                self._cache.move_to_end(doc)
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+            return flight.result
+        except Exception as e:
+            # Followers re-raise this instead of reading an empty result as "not found"
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(doc, None)
+            flight.done.set()
+
+    def verify_status(self, name, nationality, doc_number):
+        """Registry legal status when name and nationality match the document's record, else 'Unknown'"""
+        record = self.lookup(doc_number)
+        if record is None:
+            return "Unknown"
+        same_name = str(record.get('full_name') or '').strip().lower() == str(name).strip().lower()
+        same_nationality = str(record.get('nationality') or '').strip().lower() == str(nationality).strip().lower()
+        if not (same_name and same_nationality):
+            return "Unknown"
+        return record.get('legal_status') or "Unknown"
+
+# Global instance
+home_affairs = HomeAffairsClient.from_env()
+
+# ====== LOCAL STUB REGISTRY ======
+def make_stub_handler(csv_path=REGISTRY_CSV, latency=0.0, jitter=0.0, failure_rate=0.0):
+    records = load_registry(csv_path)
+
+    class StubRegistryHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'    # keep-alive, so the client's pool is exercised
+
+        def do_GET(self):
+            time.sleep(latency + random.uniform(0, jitter))
+            if random.random() < failure_rate:
+                return self._send(503, {'error': 'registry unavailable'})
+            if not self.path.startswith('/records/'):
+                return self._send(404, {'error': 'not found'})
+            record = records.get(_normalize_doc(unquote(self.path[len('/records/'):])))
+            self._send(200, record) if record else self._send(404, {'error': 'not found'})
+
+        def _send(self, status, payload):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return StubRegistryHandler
+
+def start_stub_server(csv_path=REGISTRY_CSV, port=0, latency=0.0, jitter=0.0, failure_rate=0.0):
+    """Serve the mock CSV over HTTP in a background thread; returns (server, base_url)"""
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_stub_handler(csv_path, latency, jitter, failure_rate))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub Home Affairs registry serving the mock CSV")
+    parser.add_argument("--csv", default=REGISTRY_CSV)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random latency, up to this many seconds")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    args = parser.parse_args()
+    server, url = start_stub_server(args.csv, args.port, args.latency, args.jitter, args.failure_rate)
+    print(f"Stub registry on {url} (set {URL_ENV}={url})")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,169 @@
+# identity_matcher.py
+"""Fuzzy identity matching of gate details against the Home Affairs registry.
+
+Candidates come from two blocks: records carrying the presented document
+number, and records of the same nationality sharing a phonetic (Soundex) key
+with any of the presented names. Only candidates inside a block are scored,
+with a token-order-insensitive edit distance, so spelling variants such as
+"Tabo Mokwena" for "Thabo Mokoena" resolve without a manual review.
+"""
+import os
+import re
+import threading
+from home_affairs_client import REGISTRY_CSV, home_affairs, load_registry
+from reverification import NATIONALITY_ALIASES
+
+# Minimum name similarity (1 - edit distance / length) to accept a match
+NAME_THRESHOLD = 0.8
+# A near-miss document number (phonetic block only) may differ by this many edits
+MAX_DOC_EDITS = 1
+
+_SOUNDEX_CODES = {c: str(d) for d, letters in enumerate(['aeiouyhw', 'bfpv', 'cgjkqsxz', 'dt', 'l', 'mn', 'r']) for c in letters}
+
+def normalize_doc(doc_number):
+    return re.sub(r'[\s-]+', '', str(doc_number or '')).upper()
+
+def normalize_name(name):
+    return ' '.join(re.sub(r'[^\w\s]', '', str(name or '').lower()).split())
+
+def normalize_nationality(nationality):
+    key = str(nationality or '').strip().lower()
+    return NATIONALITY_ALIASES.get(key, key)
+
+def soundex(token):
+    """Four-character Soundex code of one name token"""
+    letters = [c for c in token.lower() if c.isalpha()]
+    if not letters:
+        return ''
+    code, previous = letters[0].upper(), _SOUNDEX_CODES.get(letters[0], '')
+    for c in letters[1:]:
+        digit = _SOUNDEX_CODES.get(c, '')
+        if digit not in ('', '0') and digit != previous:
+            code += digit
+        if c not in 'hw':       # h and w don't separate letters with the same code
+            previous = digit
+    return (code + '000')[:4]
+
+def edit_distance(a, b, limit=None):
+    """Levenshtein distance; with `limit`, only the diagonal band of that width is computed
+    and limit + 1 is returned as soon as the distance must exceed it"""
+    if len(a) < len(b):
+        a, b = b, a
+    if limit is None:
+        limit = len(a)
+    if len(a) - len(b) > limit:
+        return limit + 1
+    over = limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        lo, hi = max(1, i - limit), min(len(b), i + limit)
+        current = [over] * (len(b) + 1)
+        if lo == 1:
+            current[0] = i
+        for j in range(lo, hi + 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != b[j - 1]))
+        if min(current[lo - 1:hi + 1]) > limit:
+            return over
+        previous = current
+    return min(previous[-1], over)
+
+def name_similarity(a, b, threshold=0.0):
+    """1 - edit distance / length on normalized names with their tokens sorted, so word order doesn't count.
+
+    Scores below `threshold` come back as 0.0 without computing the full distance.
+    """
+    a = ' '.join(sorted(normalize_name(a).split()))
+    b = ' '.join(sorted(normalize_name(b).split()))
+    if not a or not b:
+        return 0.0
+    length = max(len(a), len(b))
+    limit = int((1 - threshold) * length + 1e-9)
+    distance = edit_distance(a, b, limit)
+    return 0.0 if distance > limit else 1 - distance / length
+
+class IdentityMatcher:
+    """Registry records blocked by document number and by (nationality, name Soundex)"""
+    def __init__(self, records=()):
+        self.by_doc = {}
+        self.by_phonetic = {}
+        for record in records:
+            self.add(record)
+
+    @classmethod
+    def from_csv(cls, csv_path=REGISTRY_CSV):
+        return cls(list({id(r): r for r in load_registry(csv_path).values()}.values()))
+
+    def add(self, record):
+        for column in ('id_number', 'passport_number'):
+            if record.get(column):
+                self.by_doc.setdefault(normalize_doc(record[column]), []).append(record)
+        nationality = normalize_nationality(record.get('nationality'))
+        for key in {soundex(token) for token in normalize_name(record.get('full_name')).split()}:
+            self.by_phonetic.setdefault((nationality, key), []).append(record)
+
+    def match(self, name, nationality, doc_number, doc_candidates=None):
+        """(record, name score, 'document' or 'phonetic') of the best match, or None.
+
+        `doc_candidates` replaces the local document block, e.g. with the
+        record a remote registry returned for the document number.
+        """
+        doc = normalize_doc(doc_number)
+        nationality = normalize_nationality(nationality)
+        best = None
+        candidates = self.by_doc.get(doc, []) if doc_candidates is None else doc_candidates
+        for record in candidates:
+            if normalize_nationality(record.get('nationality')) != nationality:
+                continue
+            score = name_similarity(name, record.get('full_name'), NAME_THRESHOLD)
+            if score >= NAME_THRESHOLD and (best is None or score > best[1]):
+                best = (record, score, 'document')
+        if best:
+            return best
+
+        # Mistyped document number: same nationality, a name that sounds alike, and the document within MAX_DOC_EDITS
+        seen = set()
+        for key in {soundex(token) for token in normalize_name(name).split()}:
+            for record in self.by_phonetic.get((nationality, key), []):
+                if id(record) in seen:
+                    continue
+                seen.add(id(record))
+                docs = [normalize_doc(record.get(c)) for c in ('id_number', 'passport_number') if record.get(c)]
+                if not any(edit_distance(doc, d, MAX_DOC_EDITS) <= MAX_DOC_EDITS for d in docs):
+                    continue
+                score = name_similarity(name, record.get('full_name'), NAME_THRESHOLD)
+                if score >= NAME_THRESHOLD and (best is None or score > best[1]):
+                    best = (record, score, 'phonetic')
+        return best
+
+class RegistryMatcher:
+    """IdentityMatcher over the local registry CSV, rebuilt when the file changes"""
+    def __init__(self, csv_path=REGISTRY_CSV):
+        self.csv_path = csv_path
+        self._mtime = None
+        self._matcher = IdentityMatcher()
+        self._lock = threading.Lock()
+
+    def matcher(self):
+        with self._lock:
+            mtime = os.path.getmtime(self.csv_path) if os.path.exists(self.csv_path) else None
+            if mtime != self._mtime:
+                self._matcher = IdentityMatcher.from_csv(self.csv_path) if mtime is not None else IdentityMatcher()
+                self._mtime = mtime
+            return self._matcher
+
+# Global instance
+registry_matcher = RegistryMatcher()
+
+def verify_status(name, nationality, doc_number, client=None, matcher=None):
+    """Registry legal status for the best fuzzy identity match, else 'Unknown'.
+
+    The document block comes from the registry client (cached and pooled);
+    the phonetic block from the local registry index.
+    """
+    client = client or home_affairs
+    matcher = matcher or registry_matcher.matcher()
+    record = client.lookup(doc_number)
+    found = matcher.match(name, nationality, doc_number, doc_candidates=[record] if record else [])
+    if found is None:
+        return "Unknown"
+    return found[0].get('legal_status') or "Unknown"
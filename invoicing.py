@@ -0,0 +1,169 @@
+# invoicing.py
+import os
+import re
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from string import Template
+import numpy as np
+import pandas as pd
+from data_loader import visit_costs
+from treatment_plans import price_visits
+
+# Compiled once and shared by the intake page and the month-end batch
+INVOICE_TEMPLATE = Template("""BATHO PELE HEALTHCARE INITIATIVE
+---------------------------------
+Invoice No: $invoice_no
+Invoice Date: $invoice_date
+Patient: $patient_name
+ID: $doc_number
+Hospital: $hospital
+Visit Date: $visit_date
+---------------------------------
+Diagnosis: $diagnosis
+Treatment: $treatment
+Medication: $medication
+---------------------------------
+TOTAL COST: $total
+""")
+
+INVOICE_FIELDS = ['invoice_no', 'patient_name', 'doc_number', 'hospital', 'visit_date',
+                  'diagnosis', 'treatment', 'medication', 'amount']
+
+# Invoices rendered per worker task
+BATCH_SIZE = 500
+
+def _clean_name(series):
+    return series.astype('string').str.strip().str.rstrip(',').str.strip()
+
+def render_invoice(record, invoice_date=None):
+    """Render one invoice from a dict with INVOICE_FIELDS"""
+    values = {key: ('' if pd.isna(value) else value) for key, value in record.items()}
+    values['invoice_date'] = invoice_date or datetime.now().strftime('%Y-%m-%d')
+    values['total'] = f"R{float(record.get('amount') or 0):,.2f}"
+    return INVOICE_TEMPLATE.safe_substitute(values)
+
+def _invoice_filename(record):
+    name = re.sub(r'[^A-Za-z0-9]+', '_', str(record.get('patient_name') or 'patient')).strip('_')
+    return f"invoice_{record['invoice_no']}_{name}.txt"
+
+def _render_batch(records, invoice_date):
+    """Worker task: render a batch of invoices to (filename, text) pairs"""
+    return [(_invoice_filename(r), render_invoice(r, invoice_date)) for r in records]
+
+def select_billable(visits_df, patients_df=None, start=None, end=None, hospital=None):
+    """Visits in the date range/hospital with a positive amount, in INVOICE_FIELDS layout"""
+    visits = visits_df.copy()
+    visits['visit_date'] = pd.to_datetime(visits['visit_date'], errors='coerce')
+    mask = visits['visit_date'].notna()
+    if start is not None:
+        mask &= visits['visit_date'] >= pd.Timestamp(start)
+    if end is not None:
+        mask &= visits['visit_date'] < pd.Timestamp(end) + pd.Timedelta(days=1)
+    if hospital:
+        mask &= visits['hospital'] == hospital
+    visits = visits[mask]
+
+    # Recorded cost wins; fall back to the tariff where none was captured
+    if {'cost', 'cost_cents'}.intersection(visits.columns):
+        amount = visit_costs(visits).astype('float64')
+    else:
+        amount = pd.Series(np.nan, index=visits.index)
+    if amount.isna().any() and 'diagnosis' in visits.columns:
+        try:
+            amount = amount.fillna(price_visits(visits, patients_df))
+        except ValueError:
+            pass
+
+    out = pd.DataFrame(index=visits.index)
+    visit_id = visits['visit_id'] if 'visit_id' in visits.columns else pd.Series(pd.NA, index=visits.index)
+    fallback_id = pd.Series(visits.index, index=visits.index).astype(str)
+    out['invoice_no'] = (
+        visits['visit_date'].dt.strftime('%Y%m%d') + '-' + visit_id.astype('string').fillna(fallback_id)
+    )
+    out['patient_name'] = _clean_name(visits['patient_name']) if 'patient_name' in visits.columns else pd.NA
+    out['doc_number'] = pd.NA
+    if patients_df is not None and 'doc_number' in patients_df.columns:
+        name_col = 'full_name' if 'full_name' in patients_df.columns else 'name'
+        docs = patients_df.assign(_name=_clean_name(patients_df[name_col]))
+        docs = docs[docs['_name'].notna()].drop_duplicates('_name', keep='last').set_index('_name')['doc_number']
+        named = out['patient_name'].notna()
+        out.loc[named, 'doc_number'] = out.loc[named, 'patient_name'].map(docs)
+    for col in ['hospital', 'diagnosis', 'treatment', 'medication']:
+        out[col] = visits[col] if col in visits.columns else pd.NA
+    out['visit_date'] = visits['visit_date'].dt.strftime('%Y-%m-%d')
+    out['amount'] = amount
+    return out[out['amount'] > 0][INVOICE_FIELDS].reset_index(drop=True)
+
+def reconcile_invoices(invoices_df, ledger_df):
+    """One row per invoice compared with the cost ledger, plus ledger entries no invoice accounts for.
+
+    Ledger rows are matched by invoice_no when the ledger carries one, else by
+    patient and day; in that case `ledger` and `difference` are for the
+    patient's whole day, repeated on each of that day's invoices. Invoices
+    without a patient name can't be matched and are reported missing.
+    """
+    by_invoice = 'invoice_no' in ledger_df.columns
+    key = ['invoice_no'] if by_invoice else ['patient_name', 'date']
+    invoices = invoices_df.assign(
+        patient_name=_clean_name(invoices_df['patient_name']),
+        date=invoices_df['visit_date'],
+        invoiced=pd.to_numeric(invoices_df['amount'], errors='coerce')
+    )[['invoice_no', 'patient_name', 'date', 'invoiced']]
+
+    if {'amount'}.union(key).issubset(ledger_df.columns):
+        ledger = ledger_df[ledger_df['amount'].notna()]
+    else:
+        ledger = pd.DataFrame(columns=['amount'] + key)
+    ledger = pd.DataFrame({
+        'invoice_no': ledger['invoice_no'].astype('string') if by_invoice else pd.NA,
+        'patient_name': _clean_name(ledger['patient_name']) if 'patient_name' in ledger else pd.NA,
+        'date': pd.to_datetime(ledger['date'], errors='coerce').dt.strftime('%Y-%m-%d') if 'date' in ledger else pd.NA,
+        'ledger': pd.to_numeric(ledger['amount'], errors='coerce'),
+    }, index=ledger.index).dropna(subset=key)
+    ledger_totals = ledger.groupby(key)['ledger'].sum()
+
+    report = invoices.merge(ledger_totals.reset_index(), on=key, how='left')
+    matched = report['ledger'].notna()
+    invoiced = report['invoiced'] if by_invoice else report.groupby(key, dropna=False)['invoiced'].transform('sum')
+    report['difference'] = (invoiced - report['ledger']).where(matched)
+    report['status'] = 'match'
+    report.loc[report['difference'].abs() >= 0.005, 'status'] = 'mismatch'
+    report.loc[~matched, 'status'] = 'missing from ledger'
+
+    invoice_keys = pd.MultiIndex.from_frame(invoices[key].dropna())
+    ledger_only = ledger_totals[~ledger_totals.index.isin(invoice_keys if len(key) > 1 else invoice_keys.get_level_values(0))]
+    if len(ledger_only):
+        extra = ledger_only.reset_index().assign(invoiced=np.nan, difference=-ledger_only.to_numpy(), status='ledger only')
+        report = pd.concat([report, extra], ignore_index=True)
+    return report[['invoice_no', 'patient_name', 'date', 'invoiced', 'ledger', 'difference', 'status']]
+
+def write_invoice_archive(visits_df, fileobj, patients_df=None, ledger_df=None, start=None, end=None,
+                          hospital=None, workers=None, batch_size=BATCH_SIZE):
+    """Render billable invoices across a process pool and stream them into a zip archive.
+
+    At most two batches per worker are in flight, so memory stays bounded by
+    batch_size rather than by the number of invoices. Returns the reconciliation
+    report, which is also written into the archive.
+    """
+    invoices = select_billable(visits_df, patients_df, start, end, hospital)
+    invoice_date = datetime.now().strftime('%Y-%m-%d')
+    workers = workers or os.cpu_count() or 1
+
+    with zipfile.ZipFile(fileobj, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+            for offset in range(0, len(invoices), batch_size):
+                records = invoices.iloc[offset:offset + batch_size].to_dict('records')
+                pending.append(pool.submit(_render_batch, records, invoice_date))
+                if len(pending) >= workers * 2:
+                    for filename, text in pending.popleft().result():
+                        archive.writestr(filename, text)
+            while pending:
+                for filename, text in pending.popleft().result():
+                    archive.writestr(filename, text)
+
+        report = reconcile_invoices(invoices, ledger_df if ledger_df is not None else pd.DataFrame())
+        archive.writestr('reconciliation.csv', report.to_csv(index=False))
+    return report
@@ -0,0 +1,252 @@
+# load_test.py
+"""Concurrent-clerk load test for the app.py intake -> treatment -> invoice flow.
+
+Each simulated clerk drives headless sessions with Streamlit's AppTest against
+a scratch copy of data/, so runs never touch the real files. AppTest swaps a
+process-global runtime on every run, so each clerk gets its own worker process;
+clerks still contend for the node's CPU and share the same data files.
+
+    python load_test.py --clerks 8 --flows 5 --report load_test_report.json
+    python load_test.py --clerks 8 --baseline previous_report.json
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import numpy as np
+from treatment_plans import CONDITIONS
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_PATH = os.path.join(REPO_DIR, "app.py")
+STEPS = ['login', 'open_intake', 'intake', 'treatment', 'invoice']
+PERCENTILES = [50, 95, 99]
+
+FIRST_NAMES = ["Thabo", "Lerato", "Sipho", "Naledi", "Tendai", "Chipo", "Amina", "Joao", "Fatima", "Kagiso"]
+LAST_NAMES = ["Mokoena", "Dlamini", "Nkosi", "Moyo", "Banda", "Hussein", "Sithole", "Mabaso", "Phiri", "Khumalo"]
+NATIONALITIES = ["South African", "Zimbabwean", "Malawian", "Mozambican", "Other"]
+DOC_TYPES = ["RSA ID", "Passport", "Asylum Seeker Permit"]
+
+def synthetic_patient(rng):
+    """A random intake; SA citizens mostly carry an RSA ID, everyone else a passport or permit"""
+    nationality = rng.choice(NATIONALITIES)
+    if nationality == "South African":
+        doc_type = "RSA ID" if rng.random() < 0.9 else "Passport"
+        doc_number = "".join(rng.choice("0123456789") for _ in range(13))
+    else:
+        doc_type = rng.choice(DOC_TYPES[1:]) if rng.random() < 0.9 else "RSA ID"
+        doc_number = f"{nationality[:2].upper()}{rng.randint(2015, 2025)}{rng.randint(0, 999999):06d}"
+    return {
+        'name': f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+        'nationality': nationality,
+        'doc_type': doc_type,
+        'doc_number': doc_number,
+        'diagnosis': rng.choice(list(CONDITIONS) + ["Other"]),
+        'medication': rng.choice(["Amlodipine", "Metformin", ""]),
+    }
+
+def rss_bytes():
+    """Current resident set size of this process"""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def _by_label(elements, label):
+    for element in elements:
+        if element.label == label:
+            return element
+    raise LookupError(f"No widget labelled {label!r}")
+
+def _find(at, kind, label):
+    """Widget by label; a miss reports the errors the page showed instead"""
+    try:
+        return _by_label(getattr(at, kind), label)
+    except LookupError as e:
+        shown = [error.value for error in at.error]
+        raise LookupError(f"{e} (page errors: {shown})" if shown else str(e)) from None
+
+def _checked(at, step):
+    """A step fails on an uncaught exception or on any st.error the page shows"""
+    if at.exception:
+        raise RuntimeError(f"{step}: {at.exception[0].message}")
+    if at.error:
+        raise RuntimeError(f"{step}: {at.error[0].value}")
+    return at
+
+def run_flow(patient, timeout=60):
+    """One clerk session: log in, intake, treatment, invoice. Returns {step: seconds}"""
+    from streamlit.testing.v1 import AppTest
+    timings = {}
+
+    def timed(step, action):
+        start = time.perf_counter()
+        result = _checked(action(), step)
+        timings[step] = time.perf_counter() - start
+        return result
+
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+    at.session_state['authenticated'] = True
+    at.session_state['username'] = 'clerk'
+    timed('login', at.run)
+    timed('open_intake', lambda: at.sidebar.radio[0].set_value("📋 Patient Intake").run())
+
+    _find(at, 'text_input', "Full Name*").input(patient['name'])
+    _find(at, 'selectbox', "Nationality*").select(patient['nationality'])
+    _find(at, 'text_input', "Document Number*").input(patient['doc_number'])
+    _find(at, 'selectbox', "Document Type*").select(patient['doc_type'])
+    timed('intake', lambda: _find(at, 'button', "Submit Patient Information").click().run())
+
+    _find(at, 'selectbox', "Diagnosis*").select(patient['diagnosis'])
+    at.run()
+    if patient['diagnosis'] == "Other":
+        _find(at, 'text_area', "Treatment Plan*").input("Supportive care and review in two weeks")
+    if patient['medication']:
+        _find(at, 'text_input', "Medication name").input(patient['medication'])
+        _find(at, 'text_input', "Frequency").input("2x daily")
+    timed('treatment', lambda: _find(at, 'button', "Submit Treatment Details").click().run())
+    timed('invoice', lambda: _find(at, 'button', "📄 Generate Invoice").click().run())
+    return timings
+
+def _prepare_workdir():
+    """Scratch copy of data/ and assets/ so write-throughs don't touch the real files"""
+    workdir = tempfile.mkdtemp(prefix="batho_pele_load_")
+    for name in ["data", "assets"]:
+        source = os.path.join(REPO_DIR, name)
+        if os.path.isdir(source):
+            shutil.copytree(source, os.path.join(workdir, name))
+    return workdir
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def summarize(samples):
+    """p50/p95/p99/mean/max seconds per step"""
+    summary = {}
+    for step in STEPS:
+        values = np.array([s[step] for s in samples if step in s])
+        if values.size == 0:
+            continue
+        summary[step] = {f"p{p}": float(np.percentile(values, p)) for p in PERCENTILES}
+        summary[step].update(mean=float(values.mean()), max=float(values.max()), count=int(values.size))
+    return summary
+
+def _clerk(workdir, patients, timeout, started):
+    """Worker process: run this clerk's flows in order and report timings and RSS samples"""
+    if REPO_DIR not in sys.path:
+        sys.path.insert(0, REPO_DIR)
+    os.chdir(workdir)
+    samples, errors = [], []
+    memory = [(time.time() - started, rss_bytes())]
+    for patient in patients:
+        try:
+            samples.append(run_flow(patient, timeout))
+        except Exception as e:
+            errors.append(str(e))
+        memory.append((time.time() - started, rss_bytes()))
+    return samples, errors, memory
+
+def run_load_test(clerks=4, flows=5, seed=0, timeout=60):
+    """Run clerks x flows sessions concurrently and return the report dict"""
+    workdir = _prepare_workdir()
+    rng = random.Random(seed)
+    patients = [synthetic_patient(rng) for _ in range(clerks * flows)]
+    samples, errors, memory = [], [], []
+    started = time.time()
+    try:
+        with ProcessPoolExecutor(max_workers=clerks) as pool:
+            futures = [pool.submit(_clerk, workdir, patients[offset::clerks], timeout, started)
+                       for offset in range(clerks)]
+            for future in futures:
+                clerk_samples, clerk_errors, clerk_memory = future.result()
+                samples += clerk_samples
+                errors += clerk_errors
+                memory.append(clerk_memory)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    elapsed = time.time() - started
+    start_rss = sum(trace[0][1] for trace in memory)
+    end_rss = sum(trace[-1][1] for trace in memory)
+    return {
+        'run_at': datetime.now().isoformat(timespec='seconds'),
+        'revision': _git_revision(),
+        'config': {'clerks': clerks, 'flows_per_clerk': flows, 'seed': seed},
+        'completed_flows': len(samples),
+        'failed_flows': len(errors),
+        'errors': errors[:20],
+        'elapsed_seconds': elapsed,
+        'throughput_flows_per_minute': len(samples) / elapsed * 60 if elapsed else 0.0,
+        'latency_seconds': summarize(samples),
+        'memory': {
+            # Summed over clerk processes; growth is what the sessions added after start-up
+            'start_rss_mb': start_rss / 2**20,
+            'peak_rss_mb': sum(max(value for _, value in trace) for trace in memory) / 2**20,
+            'end_rss_mb': end_rss / 2**20,
+            'growth_mb': (end_rss - start_rss) / 2**20,
+            'growth_per_flow_kb': (end_rss - start_rss) / 1024 / max(len(samples), 1),
+            'rss_trace_mb': [[(round(t, 2), round(v / 2**20, 1)) for t, v in trace] for trace in memory],
+        },
+    }
+
+def compare(report, baseline):
+    """Per-step p95 and throughput change against a previous report (positive = slower / more)"""
+    rows = []
+    for step in STEPS:
+        new = report['latency_seconds'].get(step, {}).get('p95')
+        old = baseline.get('latency_seconds', {}).get(step, {}).get('p95')
+        if new is not None and old:
+            rows.append((f"{step} p95", old, new, (new - old) / old * 100))
+    old_tp = baseline.get('throughput_flows_per_minute')
+    if old_tp:
+        new_tp = report['throughput_flows_per_minute']
+        rows.append(("throughput/min", old_tp, new_tp, (new_tp - old_tp) / old_tp * 100))
+    return rows
+
+def format_report(report):
+    lines = [
+        f"Load test {report['run_at']} (rev {report['revision'] or 'unknown'}): "
+        f"{report['config']['clerks']} clerks x {report['config']['flows_per_clerk']} flows",
+        f"Completed {report['completed_flows']} flows, {report['failed_flows']} failed, "
+        f"{report['throughput_flows_per_minute']:.1f} flows/min",
+        f"{'step':<12}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}",
+    ]
+    for step, stats in report['latency_seconds'].items():
+        lines.append(f"{step:<12}{stats['p50']:>9.3f}{stats['p95']:>9.3f}{stats['p99']:>9.3f}{stats['max']:>9.3f}")
+    memory = report['memory']
+    lines.append(f"RSS {memory['start_rss_mb']:.1f} -> {memory['end_rss_mb']:.1f} MB "
+                 f"(peak {memory['peak_rss_mb']:.1f}, {memory['growth_per_flow_kb']:.0f} KB/flow)")
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent-clerk load test for the intake flow")
+    parser.add_argument("--clerks", type=int, default=4, help="concurrent sessions")
+    parser.add_argument("--flows", type=int, default=5, help="intake flows per clerk")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=int, default=60, help="seconds allowed per script run")
+    parser.add_argument("--report", default="load_test_report.json")
+    parser.add_argument("--baseline", help="previous report to compare against")
+    args = parser.parse_args()
+
+    report = run_load_test(args.clerks, args.flows, args.seed, args.timeout)
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=2)
+    print(format_report(report))
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        for label, old, new, change in compare(report, baseline):
+            print(f"{label:<16}{old:>10.3f} -> {new:>10.3f} ({change:+.1f}%)")
+    print(f"Report written to {args.report}")
@@ -1,10 +1,30 @@
 # logic.py
+import numpy as np
+import pandas as pd
+
+# Intake eligibility outcomes, as shown on the intake page and in intake_logs.csv
+ELIGIBLE_FREE = "✅ Eligible for Free Public Healthcare"
+ELIGIBLE_SUBSIDIZED = "🟡 Eligible for Subsidized or Emergency Care"
+PAYMENT_REQUIRED = "🔴 Payment Required or Refer to Admin"
+MANUAL_REVIEW = "⚠️ Needs Manual Review"
+
+def _is(values, *options):
+    """Boolean mask of values among options; missing values (None, NaN, pd.NA) never match"""
+    return pd.Series(values).isin(options).to_numpy(dtype=bool)
+
+def classify_patients(nationality, doc_type, legal_status):
+    """Intake eligibility rules over aligned arrays, first matching rule wins"""
+    valid = _is(legal_status, "Valid")
+    return np.select(
+        [
+            _is(nationality, "South African") & _is(doc_type, "RSA ID") & valid,
+            _is(doc_type, "Permit", "Asylum") & valid,
+            _is(doc_type, "Passport", "No Document") | _is(legal_status, "Invalid"),
+        ],
+        [ELIGIBLE_FREE, ELIGIBLE_SUBSIDIZED, PAYMENT_REQUIRED],
+        default=MANUAL_REVIEW
+    )
+
 def classify_patient(nationality, doc_type, legal_status):
-    if nationality == "South African":
-        return " Eligible for Free Public Healthcare"
-    elif doc_type in ["Permit", "Asylum"] and legal_status == "Valid":
-        return "Eligible for Subsidized or Emergency Care"
-    elif doc_type == "Passport" or doc_type == "No Document":
-        return "Payment Required or Refer to Admin"
-    else:
-        return "Needs Manual Review"
\ No newline at end of file
+    """One patient through the same rules as classify_patients"""
+    return str(classify_patients([nationality], [doc_type], [legal_status])[0])
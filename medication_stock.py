@@ -0,0 +1,137 @@
+# medication_stock.py
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+# Days of consumption used for the rolling burn rate, and how much daily history is kept
+BURN_WINDOW_DAYS = 7
+HISTORY_DAYS = 90
+
+# "Amlodipine 5mg", "Metformin 500–1000 mg 2x daily", "Ridaq, Hypothiazide"
+_NAME_PATTERN = r'^(?P<name>[A-Za-z][A-Za-z\-/ ]*?)\s*(?:[\d,(]|$)'
+_FREQUENCY_PATTERN = r'(?i)(?P<times>\d+)\s*x\s*daily'
+_WORD_FREQUENCIES = {'once daily': 1, 'twice daily': 2, 'three times daily': 3}
+_NO_MEDICATION = {'', 'none', 'n/a', 'nan'}
+
+KEY_COLUMNS = ['medication', 'hospital', 'ward']
+
+def _empty(name):
+    index = pd.MultiIndex.from_arrays([[], [], []], names=KEY_COLUMNS)
+    return pd.Series(index=index, dtype='float64', name=name)
+
+def _key(series):
+    return series.astype('string').str.strip().str.lower()
+
+def parse_medications(visits_df):
+    """Explode visit medication text into one row per (medication, hospital, ward, day) dose count"""
+    if visits_df.empty or 'medication' not in visits_df.columns:
+        return pd.DataFrame(columns=KEY_COLUMNS + ['day', 'units'])
+
+    items = pd.DataFrame({
+        'medication': visits_df['medication'].astype('string').str.split(';'),
+        'hospital': visits_df['hospital'].astype('string').fillna('Unknown') if 'hospital' in visits_df else 'Unknown',
+        'ward': visits_df['ward'].astype('string').fillna('Unassigned') if 'ward' in visits_df else 'Unassigned',
+        'day': pd.to_datetime(visits_df['visit_date'], errors='coerce').dt.normalize()
+    }).explode('medication')
+    items['medication'] = items['medication'].astype('string').str.strip()
+    items = items[items['day'].notna() & ~items['medication'].str.lower().isin(_NO_MEDICATION).fillna(True)]
+
+    text = items['medication']
+    times = pd.to_numeric(text.str.extract(_FREQUENCY_PATTERN)['times'], errors='coerce')
+    for phrase, count in _WORD_FREQUENCIES.items():
+        times = times.mask(times.isna() & text.str.lower().str.contains(phrase, regex=False), count)
+    items['units'] = times.fillna(1).astype('float64')
+    items['medication'] = _key(text.str.extract(_NAME_PATTERN)['name'])
+    return items[items['medication'].notna() & (items['medication'] != '')][KEY_COLUMNS + ['day', 'units']]
+
+def stock_levels(resources_df):
+    """Current stock per (medication, hospital, ward) from either resources layout"""
+    if resources_df.empty:
+        return _empty('stock')
+
+    if {'medications', 'medication_stock', 'ward'}.issubset(resources_df.columns):
+        # Ward layout: comma-separated medications aligned with comma-separated stock counts
+        wards = pd.DataFrame({
+            'hospital': resources_df['hospital'].astype('string').fillna('Unknown') if 'hospital' in resources_df else 'Unknown',
+            'ward': resources_df['ward'].astype('string').fillna('Unassigned'),
+            'medication': resources_df['medications'].astype('string').str.split(','),
+            'stock': resources_df['medication_stock'].astype('string').str.split(',')
+        }).dropna(subset=['medication', 'stock'])
+        wards = wards[wards['medication'].str.len() == wards['stock'].str.len()]
+        levels = wards.explode(['medication', 'stock'])
+    elif {'resource_type', 'name', 'quantity'}.issubset(resources_df.columns):
+        # Item layout: one Medication row per stocked item, located in a ward or pharmacy
+        meds = resources_df[resources_df['resource_type'] == 'Medication']
+        levels = pd.DataFrame({
+            'hospital': meds['hospital'].astype('string') if 'hospital' in meds else 'Unknown',
+            'ward': meds['location'].astype('string') if 'location' in meds else 'Unassigned',
+            'medication': meds['name'].astype('string'),
+            'stock': meds['quantity']
+        })
+    else:
+        return _empty('stock')
+
+    levels['medication'] = _key(levels['medication'].astype('string').str.extract(_NAME_PATTERN)['name'])
+    levels['stock'] = pd.to_numeric(levels['stock'].astype('string').str.strip(), errors='coerce').astype('float64')
+    levels = levels.dropna(subset=['medication', 'stock'])
+    return levels.groupby(KEY_COLUMNS)['stock'].sum()
+
+class ConsumptionEngine:
+    """Daily medication consumption per ward with rolling burn rates and stock-out projections"""
+    def __init__(self, window_days=BURN_WINDOW_DAYS, history_days=HISTORY_DAYS):
+        self.window_days = window_days
+        self.history_days = history_days
+        self.daily = pd.Series(dtype='float64', name='units')   # (medication, hospital, ward, day) -> units
+
+    def add_visits(self, visits_df):
+        """Fold new visits into the daily consumption totals; only the new rows are parsed"""
+        items = parse_medications(visits_df)
+        if items.empty:
+            return self
+        update = items.groupby(KEY_COLUMNS + ['day'])['units'].sum()
+        self.daily = update if self.daily.empty else self.daily.add(update, fill_value=0)
+        cutoff = pd.Timestamp(datetime.now()).normalize() - pd.Timedelta(days=self.history_days)
+        self.daily = self.daily[self.daily.index.get_level_values('day') >= cutoff]
+        return self
+
+    def record_visit(self, visit):
+        """Incremental update for a single visit dict"""
+        return self.add_visits(pd.DataFrame([visit]))
+
+    def consumption_matrix(self, days=None):
+        """Wide (day x (medication, hospital, ward)) matrix of units used, zero-filled over the date range"""
+        days = days or self.window_days
+        end = pd.Timestamp(datetime.now()).normalize()
+        index = pd.date_range(end=end, periods=days, freq='D', name='day')
+        if self.daily.empty:
+            return pd.DataFrame(index=index)
+        return self.daily.unstack(KEY_COLUMNS).reindex(index).fillna(0.0)
+
+    def burn_rates(self):
+        """Average daily units over the rolling window for every (medication, hospital, ward)"""
+        matrix = self.consumption_matrix(self.window_days)
+        if matrix.empty or matrix.shape[1] == 0:
+            return _empty('burn_rate')
+        rates = matrix.rolling(self.window_days, min_periods=1).mean().iloc[-1]
+        return rates.rename('burn_rate')
+
+    def days_of_stock(self, resources_df):
+        """Per-medication, per-ward stock, burn rate, days of stock and projected stock-out date"""
+        report = pd.concat([stock_levels(resources_df), self.burn_rates()], axis=1)
+        report = report.reindex(columns=['stock', 'burn_rate'])
+        report['burn_rate'] = report['burn_rate'].fillna(0.0)
+        # Unknown stock stays NaN rather than reading as an immediate stock-out
+        with np.errstate(divide='ignore', invalid='ignore'):
+            days = np.where(report['burn_rate'] > 0, report['stock'] / report['burn_rate'], np.inf)
+            days = np.where(report['stock'].isna(), np.nan, days)
+        report['days_of_stock'] = days
+        today = pd.Timestamp(datetime.now()).normalize()
+        report['stockout_date'] = today + pd.to_timedelta(np.floor(np.where(np.isfinite(days), days, np.nan)), unit='D')
+        report.index.names = KEY_COLUMNS
+        return report.reset_index().sort_values('days_of_stock', kind='stable').reset_index(drop=True)
+
+    def min_days_of_stock(self, resources_df):
+        """Days until the first ward runs out of any medication, or None if nothing is being consumed"""
+        report = self.days_of_stock(resources_df)
+        finite = report['days_of_stock'][np.isfinite(report['days_of_stock'])]
+        return int(finite.min()) if not finite.empty else None
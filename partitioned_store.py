@@ -0,0 +1,193 @@
+# partitioned_store.py
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from urllib.parse import quote, unquote
+import pandas as pd
+
+# data/partitions/hospital=<name>/resources.csv
+# data/partitions/hospital=<name>/visits/month=YYYY-MM.csv
+PARTITION_ROOT = os.path.join("data", "partitions")
+UNKNOWN_HOSPITAL = "Unknown"
+
+# Columns pages rely on, so an empty partition still yields a usable frame
+RESOURCE_COLUMNS = ['hospital', 'ward', 'total_beds', 'available_beds', 'medications', 'medication_stock', 'doctors', 'nurses']
+VISIT_COLUMNS = ['patient_name', 'visit_date', 'hospital', 'ward', 'cost']
+
+# Sessions in one process append from their own threads; the check-then-write below must not interleave
+_append_lock = threading.Lock()
+
+def _hospital_dir(hospital, root=PARTITION_ROOT):
+    return os.path.join(root, f"hospital={quote(str(hospital), safe='')}")
+
+def _month_file(hospital, month, root=PARTITION_ROOT):
+    return os.path.join(_hospital_dir(hospital, root), "visits", f"month={month}.csv")
+
+def _write_csv(df, path):
+    """Write via a temp file so readers never see a half-written partition"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # A private temp name per write, so concurrent writers never share (and clobber) one
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "w", newline="") as tmp:
+        df.to_csv(tmp, index=False)
+    os.replace(tmp_path, path)
+
+def has_partitions(root=PARTITION_ROOT):
+    return os.path.isdir(root) and any(name.startswith("hospital=") for name in os.listdir(root))
+
+def list_hospitals(root=PARTITION_ROOT):
+    """Hospital names read from the directory layout alone - no data files are opened"""
+    if not os.path.isdir(root):
+        return []
+    return sorted(unquote(name.split("=", 1)[1]) for name in os.listdir(root) if name.startswith("hospital="))
+
+def list_months(hospital, root=PARTITION_ROOT):
+    visits_dir = os.path.join(_hospital_dir(hospital, root), "visits")
+    if not os.path.isdir(visits_dir):
+        return []
+    return sorted(name[len("month="):-len(".csv")] for name in os.listdir(visits_dir)
+                  if name.startswith("month=") and name.endswith(".csv"))
+
+def write_partitions(resources_df, visits_df, root=PARTITION_ROOT):
+    """Split resources by hospital and visits by hospital and month, replacing existing partitions"""
+    if not resources_df.empty and 'hospital' in resources_df.columns:
+        hospitals = resources_df['hospital'].astype('string').fillna(UNKNOWN_HOSPITAL)
+        for hospital, group in resources_df.groupby(hospitals):
+            _write_csv(group, os.path.join(_hospital_dir(hospital, root), "resources.csv"))
+
+    if not visits_df.empty and 'hospital' in visits_df.columns:
+        dates = pd.to_datetime(visits_df['visit_date'], errors='coerce')
+        keys = [
+            visits_df['hospital'].astype('string').fillna(UNKNOWN_HOSPITAL),
+            dates.dt.strftime('%Y-%m').fillna('undated')
+        ]
+        for (hospital, month), group in visits_df.groupby(keys):
+            _write_csv(group, _month_file(hospital, month, root))
+
+def append_visit(visit, root=PARTITION_ROOT):
+    """Append one visit dict to its hospital/month partition"""
+    hospital = visit.get('hospital') or UNKNOWN_HOSPITAL
+    visit_date = pd.to_datetime(visit.get('visit_date'), errors='coerce')
+    month = visit_date.strftime('%Y-%m') if pd.notna(visit_date) else 'undated'
+    path = _month_file(hospital, month, root)
+    row = pd.DataFrame([visit])
+    with _append_lock:
+        if not os.path.exists(path):
+            _write_csv(row, path)
+            return
+        columns = pd.read_csv(path, nrows=0).columns
+        if set(row.columns) <= set(columns):
+            row.reindex(columns=columns).to_csv(path, mode='a', index=False, header=False)
+        else:
+            # New fields: rewrite this month's partition with the widened header
+            _write_csv(pd.concat([pd.read_csv(path), row], ignore_index=True), path)
+
+def partition_version(hospitals, months=(), root=PARTITION_ROOT):
+    """(mtime, size) of each hospital's resources file and the given visit months; stats only, no reads"""
+    paths = [os.path.join(_hospital_dir(h, root), "resources.csv") for h in hospitals]
+    paths += [_month_file(h, month, root) for h in hospitals for month in months]
+    version = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            version.append((path, stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            version.append((path, None))
+    return tuple(version)
+
+def load_resources(hospitals, root=PARTITION_ROOT):
+    """Resources for the requested hospitals only"""
+    frames = [
+        pd.read_csv(path) for path in
+        (os.path.join(_hospital_dir(h, root), "resources.csv") for h in hospitals)
+        if os.path.exists(path)
+    ]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=RESOURCE_COLUMNS)
+
+def load_visits(hospitals, start=None, end=None, root=PARTITION_ROOT):
+    """Visits for the requested hospitals, opening only month partitions that overlap [start, end]"""
+    first = pd.Timestamp(start).strftime('%Y-%m') if start is not None else None
+    last = pd.Timestamp(end).strftime('%Y-%m') if end is not None else None
+    frames = []
+    for hospital in hospitals:
+        for month in list_months(hospital, root):
+            if month == 'undated' and (first or last):
+                continue
+            if (first and month < first) or (last and month > last):
+                continue
+            frames.append(pd.read_csv(_month_file(hospital, month, root)))
+    if not frames:
+        return pd.DataFrame(columns=VISIT_COLUMNS)
+
+    visits = pd.concat(frames, ignore_index=True)
+    # Month pruning is coarse; trim to the exact day range
+    dates = pd.to_datetime(visits['visit_date'], errors='coerce').dt.normalize()
+    mask = pd.Series(True, index=visits.index)
+    if start is not None:
+        mask &= dates >= pd.Timestamp(start).normalize()
+    if end is not None:
+        mask &= dates <= pd.Timestamp(end).normalize()
+    return visits[mask].reset_index(drop=True)
+
+def hospital_options(resources_df, root=PARTITION_ROOT):
+    """Hospitals to offer in a page selector: from partitions if present, else from the loaded frame"""
+    if has_partitions(root):
+        return list_hospitals(root)
+    if resources_df.empty or 'hospital' not in resources_df.columns:
+        return []
+    return list(resources_df['hospital'].dropna().unique())
+
+class HospitalPartitionCache:
+    """(resources, visits) of one hospital read from its own partitions, reused until those files change.
+
+    Entries are keyed per hospital and visit window, so a session looking at one
+    hospital never opens another's files. Frames are shared, so treat them as read-only.
+    """
+    CACHE_SIZE = 32
+
+    def __init__(self):
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, hospital, since=None, root=PARTITION_ROOT):
+        first = pd.Timestamp(since).strftime('%Y-%m') if since is not None else None
+        months = [m for m in list_months(hospital, root) if first is None or (m != 'undated' and m >= first)]
+        version = partition_version([hospital], months, root)
+        key = (root, hospital, None if since is None else pd.Timestamp(since).normalize())
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None and cached[0] == version:
+                self._cache.move_to_end(key)
+                return cached[1]
+        frames = (load_resources([hospital], root), load_visits([hospital], start=since, root=root))
+        with self._lock:
+            self._cache[key] = (version, frames)
+            self._cache.move_to_end(key)
+            if len(self._cache) > self.CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return frames
+
+# Global instance
+hospital_partitions = HospitalPartitionCache()
+
+def hospital_view(hospital, resources_df, visits_df, since=None, root=PARTITION_ROOT):
+    """(resources, visits) for one hospital, read on demand from its partitions when the partitioned layout exists"""
+    if has_partitions(root):
+        return hospital_partitions.get(hospital, since, root)
+
+    hospital_resources = resources_df[resources_df['hospital'] == hospital] if 'hospital' in resources_df else resources_df.iloc[0:0]
+    if visits_df.empty or 'hospital' not in visits_df.columns:
+        return hospital_resources, visits_df.iloc[0:0]
+    hospital_visits = visits_df[visits_df['hospital'] == hospital]
+    if since is not None:
+        dates = pd.to_datetime(hospital_visits['visit_date'], errors='coerce')
+        hospital_visits = hospital_visits[dates >= pd.Timestamp(since).normalize()]
+    return hospital_resources, hospital_visits
+
+if __name__ == "__main__":
+    from schema_migration import load_canonical
+    canonical = load_canonical()
+    write_partitions(canonical['resources'], canonical['visits'])
+    print(f"Partitioned {len(list_hospitals())} hospitals into {PARTITION_ROOT}/ at {datetime.now():%Y-%m-%d %H:%M}")
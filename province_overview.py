@@ -0,0 +1,218 @@
+# province_overview.py
+import threading
+from collections import OrderedDict
+from datetime import datetime
+import pandas as pd
+from partitioned_store import has_partitions, list_hospitals, load_resources, load_visits, partition_version
+
+HOSPITAL_COLUMNS = ['hospital', 'wards', 'total_beds', 'available_beds', 'occupancy_pct',
+                    'doctors', 'nurses', 'medication_units', 'lowest_stock', 'patients_today']
+WARD_COLUMNS = ['hospital', 'ward', 'total_beds', 'available_beds', 'occupancy_pct',
+                'doctors', 'nurses', 'medication_units', 'patients_today']
+
+def _names(series):
+    """Comma-separated name lists -> one stripped, non-empty name per row (index preserved)"""
+    names = series.astype('string').fillna('').str.split(',').explode().str.strip()
+    return names[names.fillna('') != '']
+
+def _occupancy(total, available):
+    return ((1 - available / total.where(total > 0)) * 100).round(1)
+
+class ProvinceOverview:
+    """Beds, staff and stock for every hospital and ward, computed in one pass over the resources.
+
+    `hospitals` and `wards` are the summary tables; `staff` and `stock` hold the
+    exploded rows that drill-down filters, so selecting a hospital never
+    re-parses its wards.
+    """
+    def __init__(self, resources_df, visits_df=None, today=None):
+        resources = resources_df.reindex(columns=['hospital', 'ward', 'total_beds', 'available_beds',
+                                                  'doctors', 'nurses', 'medications', 'medication_stock'])
+        resources = resources.assign(
+            hospital=resources['hospital'].astype('string').fillna('Unknown'),
+            ward=resources['ward'].astype('string').fillna('Unassigned'),
+            total_beds=pd.to_numeric(resources['total_beds'], errors='coerce').fillna(0),
+            available_beds=pd.to_numeric(resources['available_beds'], errors='coerce').fillna(0),
+        ).reset_index(drop=True)
+        keys = resources[['hospital', 'ward']]
+
+        self.staff = pd.concat([
+            keys.join(_names(resources['doctors']).rename('name'), how='inner').assign(role='Doctor'),
+            keys.join(_names(resources['nurses']).rename('name'), how='inner').assign(role='Nurse'),
+        ], ignore_index=True).reindex(columns=['hospital', 'ward', 'role', 'name'])
+
+        meds = _names(resources['medications'])
+        stock = resources['medication_stock'].astype('string').fillna('').str.split(',').explode().str.strip()
+        # Pair each medication with the stock figure in the same position of its ward's list
+        meds = meds.to_frame('medication').assign(position=meds.groupby(level=0).cumcount())
+        stock = stock.to_frame('stock').assign(position=stock.groupby(level=0).cumcount())
+        paired = meds.reset_index().merge(stock.reset_index(), on=['index', 'position'], how='left')
+        paired['stock'] = pd.to_numeric(paired['stock'], errors='coerce').fillna(0).astype('int64')
+        self.stock = keys.loc[paired['index']].reset_index(drop=True).assign(
+            medication=paired['medication'].to_numpy(), stock=paired['stock'].to_numpy()
+        )
+
+        patients_today = self._patients_today(visits_df, today)
+        self._ward_details = {}
+        group = ['hospital', 'ward']
+        wards = resources.groupby(group, sort=False)[['total_beds', 'available_beds']].sum()
+        role_counts = self.staff.groupby(group + ['role']).size().unstack('role')
+        wards['doctors'] = role_counts.get('Doctor', pd.Series(dtype='float64')).reindex(wards.index).fillna(0).astype('int64')
+        wards['nurses'] = role_counts.get('Nurse', pd.Series(dtype='float64')).reindex(wards.index).fillna(0).astype('int64')
+        wards['medication_units'] = self.stock.groupby(group)['stock'].sum().reindex(wards.index).fillna(0).astype('int64')
+        wards['patients_today'] = patients_today.reindex(wards.index).fillna(0).astype('int64')
+        wards['occupancy_pct'] = _occupancy(wards['total_beds'], wards['available_beds'])
+        self.wards = wards.reset_index()[WARD_COLUMNS]
+
+        hospitals = wards.groupby('hospital').agg(
+            wards=('total_beds', 'size'), total_beds=('total_beds', 'sum'), available_beds=('available_beds', 'sum'),
+            medication_units=('medication_units', 'sum'), patients_today=('patients_today', 'sum')
+        )
+        # Staff covering several wards count once per hospital
+        unique_staff = self.staff.drop_duplicates(['hospital', 'role', 'name']).groupby(['hospital', 'role']).size().unstack('role')
+        hospitals['doctors'] = unique_staff.get('Doctor', pd.Series(dtype='float64')).reindex(hospitals.index).fillna(0).astype('int64')
+        hospitals['nurses'] = unique_staff.get('Nurse', pd.Series(dtype='float64')).reindex(hospitals.index).fillna(0).astype('int64')
+        hospitals['lowest_stock'] = self.stock.groupby('hospital')['stock'].min().reindex(hospitals.index)
+        hospitals['occupancy_pct'] = _occupancy(hospitals['total_beds'], hospitals['available_beds'])
+        self.hospitals = hospitals.reset_index()[HOSPITAL_COLUMNS]
+
+    @classmethod
+    def combine(cls, parts):
+        """One overview from overviews of disjoint hospitals, e.g. one per hospital partition"""
+        parts = list(parts)
+        if not parts:
+            return cls(pd.DataFrame())
+        combined = cls.__new__(cls)
+        for table in ('hospitals', 'wards', 'staff', 'stock', 'admissions'):
+            frames = [getattr(part, table) for part in parts]
+            # Empty tables would turn string columns to object in the concat
+            frames = [frame for frame in frames if not frame.empty] or frames[:1]
+            setattr(combined, table, pd.concat(frames, ignore_index=True))
+        combined._ward_details = {}
+        return combined
+
+    def _patients_today(self, visits_df, today):
+        self.admissions = pd.DataFrame(columns=['hospital', 'ward', 'patient_name'])
+        if visits_df is None or visits_df.empty or not {'hospital', 'ward', 'visit_date'}.issubset(visits_df.columns):
+            return pd.Series(dtype='int64')
+        today = pd.Timestamp(today or datetime.now()).normalize()
+        days = pd.to_datetime(visits_df['visit_date'], errors='coerce').dt.normalize()
+        visits = visits_df[days == today]
+        self.admissions = pd.DataFrame({
+            'hospital': visits['hospital'].astype('string'),
+            'ward': visits['ward'].astype('string'),
+            'patient_name': visits.get('patient_name', pd.Series(index=visits.index, dtype='string')).astype('string'),
+        }).dropna(subset=['patient_name'])
+        return self.admissions.groupby(['hospital', 'ward']).size()
+
+    def filter(self, search=None, min_occupancy=None, max_lowest_stock=None, sort_by='occupancy_pct', ascending=False):
+        """Hospital rows matching the filters, sorted"""
+        rows = self.hospitals
+        if search:
+            rows = rows[rows['hospital'].str.contains(search, case=False, regex=False, na=False)]
+        if min_occupancy:
+            rows = rows[rows['occupancy_pct'].fillna(0) >= min_occupancy]
+        if max_lowest_stock is not None:
+            rows = rows[rows['lowest_stock'].notna() & (rows['lowest_stock'] <= max_lowest_stock)]
+        return rows.sort_values(sort_by, ascending=ascending, kind='stable', na_position='last').reset_index(drop=True)
+
+    def drill_down(self, hospital):
+        """(wards, staff, medication totals) for one hospital, sliced from the precomputed tables"""
+        wards = self.wards[self.wards['hospital'] == hospital].drop(columns='hospital').reset_index(drop=True)
+        staff = (self.staff[self.staff['hospital'] == hospital]
+                 .drop_duplicates(['role', 'name']).sort_values(['role', 'name'])[['role', 'name']]
+                 .reset_index(drop=True))
+        stock = (self.stock[self.stock['hospital'] == hospital]
+                 .groupby('medication', sort=False)['stock'].sum().reset_index())
+        return wards, staff, stock
+
+    def ward_details(self, hospital):
+        """One row per ward with its staff, stock and today's patients as text, built once per hospital"""
+        if hospital not in self._ward_details:
+            wards = self.wards[self.wards['hospital'] == hospital].set_index('ward')
+            staff = self.staff[self.staff['hospital'] == hospital]
+            stock = self.stock[self.stock['hospital'] == hospital]
+            admissions = self.admissions[self.admissions['hospital'] == hospital]
+            names = staff.groupby(['ward', 'role'])['name'].agg(', '.join).unstack('role')
+            details = pd.DataFrame({
+                'Ward': wards.index,
+                'Available Beds': wards['available_beds'].astype('int64').to_numpy(),
+                'Total Beds': wards['total_beds'].astype('int64').to_numpy(),
+                'Occupancy %': wards['occupancy_pct'].to_numpy(),
+                'Doctors on Duty': names.get('Doctor', pd.Series(dtype='string')).reindex(wards.index).fillna('').to_numpy(),
+                'Nurses on Duty': names.get('Nurse', pd.Series(dtype='string')).reindex(wards.index).fillna('').to_numpy(),
+                'Medication Stock': (stock['medication'] + ': ' + stock['stock'].astype('string'))
+                                    .groupby(stock['ward']).agg(', '.join).reindex(wards.index).fillna('').to_numpy(),
+                'Patients Admitted Today': admissions.groupby('ward')['patient_name'].agg(', '.join)
+                                           .reindex(wards.index).fillna('').to_numpy(),
+            })
+            self._ward_details[hospital] = details
+        return self._ward_details[hospital]
+
+    def hospital_summary(self, hospital):
+        rows = self.hospitals[self.hospitals['hospital'] == hospital]
+        return rows.iloc[0] if not rows.empty else None
+
+class ProvinceOverviewCache:
+    """Province overviews reused until the resources or today's visits change.
+
+    Callers pass `version`, a cheap identity of the frames (the data cache's
+    dataset versions); only without one are the frames hashed. With the
+    partitioned layout each hospital's overview is built from its own
+    partitions and kept until their files change, and the province overview is
+    assembled from those, so a change at one hospital re-reads only that one.
+    """
+    CACHE_SIZE = 8
+
+    def __init__(self):
+        self._cache = OrderedDict()
+        self._hospital_parts = {}      # hospital -> (partition version, today, ProvinceOverview)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def data_version(df):
+        return int(pd.util.hash_pandas_object(df, index=False).sum()) if df is not None and not df.empty else 0
+
+    def _hospital_part(self, hospital, today):
+        """One hospital's overview from its resources partition and today's visit month"""
+        version = partition_version([hospital], [today.strftime('%Y-%m')])
+        cached = self._hospital_parts.get(hospital)
+        if cached is None or cached[:2] != (version, today):
+            overview = ProvinceOverview(load_resources([hospital]), load_visits([hospital], start=today, end=today), today)
+            cached = self._hospital_parts[hospital] = (version, today, overview)
+        return cached
+
+    def get(self, resources_df, visits_df=None, today=None, version=None):
+        with self._lock:
+            return self._get(resources_df, visits_df, today, version)
+
+    def _get(self, resources_df, visits_df, today, version):
+        today = pd.Timestamp(today or datetime.now()).normalize()
+        parts = None
+        if has_partitions():
+            hospitals = list_hospitals()
+            parts = [self._hospital_part(hospital, today) for hospital in hospitals]
+            self._hospital_parts = dict(zip(hospitals, parts))
+            key = ('partitions', tuple((h, part[0]) for h, part in zip(hospitals, parts)), today)
+        elif version is not None:
+            key = (version, today)
+        else:
+            key = (self.data_version(resources_df), self.data_version(visits_df), today)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        if parts is not None:
+            overview = ProvinceOverview.combine(part[2] for part in parts)
+        else:
+            overview = ProvinceOverview(resources_df, visits_df, today)
+        self._cache[key] = overview
+        if len(self._cache) > self.CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return overview
+
+# Global instance
+province_overviews = ProvinceOverviewCache()
+
+def province_overview(resources_df, visits_df=None, today=None, version=None):
+    """Build (or reuse) the overview of every hospital in the province"""
+    return province_overviews.get(resources_df, visits_df, today, version)
@@ -1,8 +1,12 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta
+from medication_stock import ConsumptionEngine
+from visit_segments import VisitSegmentStore
+from cost_rollups import CostRollups
+from audit_log import record_event
 
-def display_dashboard(patients_df, visits_df, resources_df, costs_df):
+def display_dashboard(patients_df, visits_df, resources_df, costs_df, consumption=None, visit_store=None, rollups=None):
     """Display the main dashboard with all metrics"""
     cols = st.columns(6)
 
@@ -13,8 +17,14 @@ def display_dashboard(patients_df, visits_df, resources_df, costs_df):
 
     # Safely fetch metrics with fallback values
     beds_available = resources_df['beds_available'].iloc[0] if 'beds_available' in resources_df and not resources_df.empty else 0
-    med_stock = resources_df['medication_stock'].iloc[0] if 'medication_stock' in resources_df and not resources_df.empty else 0
-    today_cost = costs_df['daily_cost'].iloc[0] if 'daily_cost' in costs_df and not costs_df.empty else 0
+    days_left = (consumption or ConsumptionEngine().add_visits(visits_df)).min_days_of_stock(resources_df)
+    if days_left is not None:
+        med_stock = days_left
+    else:
+        med_stock = resources_df['medication_stock'].iloc[0] if 'medication_stock' in resources_df and not resources_df.empty else 0
+    # Costs come from the pre-aggregated rollups, not a rescan of visits and ledger
+    rollups = rollups or CostRollups.from_frames(visits_df, costs_df, patients_df)
+    today_cost, _ = rollups.period_total('day', source='visits')
 
     # Display metrics
     cols[0].metric("SA Patients", sa_citizens)
@@ -42,19 +52,17 @@ def display_dashboard(patients_df, visits_df, resources_df, costs_df):
                 cols[0].write(f"**ID Number:** {patient_data.get('id_number', 'N/A')}")
                 cols[1].write(f"**Nationality:** {patient_data['nationality']}")
 
-                # Convert visit_date to datetime.date safely
-                visits_df['visit_date'] = pd.to_datetime(visits_df['visit_date'], errors='coerce').dt.date
-
-                # Filter recent visits (last 7 days)
-                recent_visits = visits_df[
-                    (visits_df['patient_name'] == patient_data['full_name']) &
-                    (visits_df['visit_date'] >= (datetime.now().date() - timedelta(days=7)))
-                ]
+                # Recent visits (last 7 days) come from the matching daily segments only
+                visit_store = visit_store or VisitSegmentStore.from_frame(visits_df)
+                last_week = visit_store.last_days(7)
+                recent_visits = last_week[last_week['patient_name'] == patient_data['full_name']]
 
                 st.write(f"**Visits (7 days):** {len(recent_visits)}")
 
                 if patient_data['nationality'] != "South African":
                     if st.button("🚨 Refer for Deportation"):
+                        record_event('referral', actor=st.session_state.get('username'), name=patient_data['full_name'],
+                                     doc_number=patient_data.get('id_number'), referred_to='Home Affairs')
                         st.warning(f"Referred {patient_data['full_name']} to Home Affairs")
 
                     if st.button("💳 Generate Invoice"):
@@ -66,7 +74,7 @@ def display_dashboard(patients_df, visits_df, resources_df, costs_df):
             st.subheader("Resource Monitoring")
             res_cols = st.columns(3)
 
-            med_stock_tab = resources_df['medication_stock'].iloc[0] if 'medication_stock' in resources_df and not resources_df.empty else 0
+            med_stock_tab = med_stock
             beds_avail_tab = resources_df['beds_available'].iloc[0] if 'beds_available' in resources_df and not resources_df.empty else 0
             staff_tab = resources_df['staff_available'].iloc[0] if 'staff_available' in resources_df and not resources_df.empty else 0
             utilization = resources_df['utilization'].iloc[0] if 'utilization' in resources_df and not resources_df.empty else 0
@@ -79,15 +87,23 @@ def display_dashboard(patients_df, visits_df, resources_df, costs_df):
 
         with tab3:
             st.subheader("Financial Overview")
-            daily_cost = costs_df['daily_cost'].iloc[0] if 'daily_cost' in costs_df and not costs_df.empty else 0
-            avg_cost = costs_df['avg_patient_cost'].iloc[0] if 'avg_patient_cost' in costs_df and not costs_df.empty else 0
-
-            st.write(f"**Today's Expenditure:** R{daily_cost:,.2f}")
-            st.write(f"**Avg Cost per Patient:** R{avg_cost:,.2f}")
-
-            cost_cols = ['medication_cost', 'staff_cost', 'facility_cost']
-            if all(col in costs_df.columns for col in cost_cols):
-                cost_data = costs_df[cost_cols].melt(var_name="Cost Type", value_name="Amount")
-                st.bar_chart(cost_data.set_index("Cost Type"))
+            month_cost, month_visits = rollups.period_total('month', source='visits')
+            st.write(f"**Today's Expenditure:** R{today_cost:,.2f}")
+            st.write(f"**Avg Cost per Visit (this month):** R{month_cost / month_visits if month_visits else 0:,.2f}")
+
+            grain = st.radio("Period", ["day", "week", "month"], index=2, horizontal=True, format_func=str.title)
+            by = st.multiselect(
+                "Break down by", ["hospital", "cost_category", "patient_category", "source"],
+                default=["hospital", "patient_category"]
+            )
+            table = rollups.rollup(grain, by=['period'] + by)
+            if table.empty:
+                st.warning("No cost data available")
             else:
-                st.warning("Cost breakdown data not available")
\ No newline at end of file
+                breakdown = rollups.rollup('month', start=datetime.now(), by=['cost_category'])
+                if not breakdown.empty:
+                    st.bar_chart(breakdown.set_index('cost_category')['amount'])
+                st.dataframe(
+                    table.sort_values('period', ascending=False).rename(columns={'entries': 'count'}),
+                    hide_index=True, use_container_width=True
+                )
@@ -1,29 +1,36 @@
 import streamlit as st
 from datetime import datetime
 import pytz
-from resource_predictor import predict_resources
+from resource_predictor import available_resources, predict_resources
+from capacity_simulator import simulate_capacity
+from partitioned_store import hospital_options
+from province_overview import province_overview
 
 SA_TIMEZONE = pytz.timezone('Africa/Johannesburg')
-
-def display_resource_monitoring(resources_df, visits_df):
-    st.markdown('<div class="header"><h1>🏥 Resource Monitoring</h1></div>', unsafe_allow_html=True)
-    st.subheader("Daily Hospital Resource Metrics")
-
-    # Select hospital
-    if resources_df.empty:
-        st.warning("No resource data available.")
+OVERVIEW_SORT_OPTIONS = {
+    "Occupancy": 'occupancy_pct',
+    "Available Beds": 'available_beds',
+    "Lowest Medication Stock": 'lowest_stock',
+    "Patients Today": 'patients_today',
+    "Hospital": 'hospital',
+}
+WARD_PAGE_SIZES = [25, 50, 100]
+RESOURCE_TYPES = ["Admissions", "Beds", "Doctors", "Nurses", "Medications"]
+
+def load_overview(resources_df, visits_df, version=None):
+    return province_overview(resources_df, visits_df, today=datetime.now(SA_TIMEZONE).date(), version=version)
+
+# Each section below is a fragment: its widgets rerun only that section, so paging
+# the ward grid or switching the forecast never re-runs the rest of the page.
+@st.fragment
+def display_forecast():
+    # Only resources with a materialized series: without ward snapshots that is admissions alone
+    available = available_resources()
+    options = [name for name in RESOURCE_TYPES if name.lower() in available]
+    if not options:
+        st.info("No resource history materialized yet; run resource_series.py or check back shortly.")
         return
-
-    hospitals = resources_df['hospital'].dropna().unique()
-    selected_hospital = st.selectbox("Select Hospital", hospitals)
-
-    hospital_resources = resources_df[resources_df['hospital'] == selected_hospital]
-
-    # Select resource type for prediction
-    resource_types = ["Beds", "Doctors", "Nurses", "Medications"]
-    selected_resource = st.selectbox("Select resource to predict", resource_types)
-
-    # Prophet forecast
+    selected_resource = st.selectbox("Select resource to predict", options, key="forecast_resource")
     forecast = predict_resources(selected_resource.lower())
     if forecast is not None:
         st.write(f"### Next 7 Days Forecast for {selected_resource}")
@@ -31,79 +38,102 @@ def display_resource_monitoring(resources_df, visits_df):
     else:
         st.info("Not enough historical data for prediction.")
 
-    # Display metrics by ward
-    for _, ward_data in hospital_resources.iterrows():
-        ward_name = ward_data.get('ward', 'Unknown')
-        st.markdown(f"### 🏥 Ward: {ward_name}")
-
-        cols = st.columns([1, 2, 2, 2])
-
-        # Beds Metric
-        total_beds = int(ward_data.get('total_beds', 0))
-        available_beds = int(ward_data.get('available_beds', 0))
-        bed_percentage = (available_beds / total_beds * 100) if total_beds > 0 else 0
-        cols[0].metric("Available Beds", f"{available_beds}/{total_beds}", f"{bed_percentage:.1f}% available")
-
-        # Staff Metric
-        doctors = [d.strip() for d in str(ward_data.get('doctors', '')).split(',') if d.strip()]
-        nurses = [n.strip() for n in str(ward_data.get('nurses', '')).split(',') if n.strip()]
-        cols[1].markdown("**Doctors on Duty:**")
-        for doctor in doctors:
-            cols[1].markdown(f"- {doctor}")
-        cols[1].markdown("**Nurses on Duty:**")
-        for nurse in nurses:
-            cols[1].markdown(f"- {nurse}")
-
-        # Medication Stock Metric
-        medications = [m.strip() for m in str(ward_data.get('medications', '')).split(',') if m.strip()]
-        stocks = [s.strip() for s in str(ward_data.get('medication_stock', '')).split(',') if s.strip()]
-        med_stock_map = {}
-        for med, stock in zip(medications, stocks):
-            med_stock_map[med] = int(stock) if stock.isdigit() else stock
-        cols[2].markdown("**Medication Stock:**")
-        for med, stock in med_stock_map.items():
-            cols[2].markdown(f"- {med}: {stock}")
-
-        # Today's patients in the ward
-        today_str = datetime.now(SA_TIMEZONE).strftime('%Y-%m-%d')
-        today_patients = visits_df[
-            (visits_df['hospital'] == selected_hospital) &
-            (visits_df['ward'] == ward_name) &
-            (visits_df['visit_date'] == today_str)
-        ]
-        cols[3].markdown("**Patients Admitted Today:**")
-        if not today_patients.empty:
-            for pname in today_patients['patient_name']:
-                cols[3].markdown(f"- {pname}")
+@st.fragment
+def display_capacity_simulation(hospital_resources, hospital_visits):
+    with st.expander("🛏️ Bed Capacity Simulation"):
+        sim_cols = st.columns(3)
+        horizon = sim_cols[0].slider("Days Ahead", 7, 60, 14)
+        arrival_multiplier = sim_cols[1].slider("Arrival Volume (x)", 0.5, 3.0, 1.0, 0.1)
+        extra_beds = sim_cols[2].number_input("Extra Beds per Ward", min_value=0, value=0)
+        summary, daily = simulate_capacity(
+            hospital_visits, hospital_resources,
+            horizon_days=horizon, arrival_multiplier=arrival_multiplier, extra_beds=int(extra_beds)
+        )
+        if summary.empty:
+            st.info("No ward bed capacity recorded for this hospital.")
         else:
-            cols[3].markdown("_No new patients today_")
-
-    # Hospital summary
+            st.dataframe(summary, use_container_width=True, hide_index=True)
+            st.line_chart(daily.droplevel('hospital', axis=1))
+
+@st.fragment
+def display_ward_grid(overview, hospital):
+    """All wards of a hospital as one paginated table; only the visible page is sent to the browser"""
+    st.write("### Ward Resources")
+    details = overview.ward_details(hospital)
+    cols = st.columns([2, 1, 1])
+    search = cols[0].text_input("Filter Wards", key=f"ward_search_{hospital}")
+    if search:
+        details = details[details['Ward'].str.contains(search, case=False, regex=False, na=False)]
+    page_size = cols[1].selectbox("Wards per Page", WARD_PAGE_SIZES, key="ward_page_size")
+    pages = max(1, -(-len(details) // page_size))
+    page = cols[2].selectbox("Page", range(1, pages + 1), key=f"ward_page_{hospital}")
+    start = (page - 1) * page_size
+    st.dataframe(details.iloc[start:start + page_size], use_container_width=True, hide_index=True)
+    if len(details):
+        st.caption(f"Wards {start + 1}-{min(start + page_size, len(details))} of {len(details)}")
+    else:
+        st.caption("No wards match.")
+
+@st.fragment
+def display_province_overview(overview):
+    """Every hospital's beds, staff and stock, filtered and sorted from the precomputed overview"""
+    st.subheader("Province Overview")
+    hospitals = overview.hospitals
+    cols = st.columns(4)
+    cols[0].metric("Hospitals", len(hospitals))
+    cols[1].metric("Beds Available", f"{int(hospitals['available_beds'].sum())}/{int(hospitals['total_beds'].sum())}")
+    cols[2].metric("Staff on Duty", int(hospitals['doctors'].sum() + hospitals['nurses'].sum()))
+    cols[3].metric("Patients Today", int(hospitals['patients_today'].sum()))
+
+    filter_cols = st.columns([2, 1, 1, 1])
+    search = filter_cols[0].text_input("Filter Hospitals", key="overview_search")
+    min_occupancy = filter_cols[1].slider("Min Occupancy %", 0, 100, 0, key="overview_min_occupancy")
+    sort_label = filter_cols[2].selectbox("Sort By", list(OVERVIEW_SORT_OPTIONS), key="overview_sort")
+    ascending = filter_cols[3].checkbox("Ascending", value=sort_label in ("Lowest Medication Stock", "Hospital"),
+                                        key="overview_ascending")
+    st.dataframe(
+        overview.filter(search=search, min_occupancy=min_occupancy,
+                        sort_by=OVERVIEW_SORT_OPTIONS[sort_label], ascending=ascending),
+        use_container_width=True, hide_index=True
+    )
+
+@st.fragment
+def display_hospital_summary(overview, hospital):
+    """Drill-down for one hospital, sliced from the precomputed overview"""
     st.subheader("Hospital Daily Summary")
-    total_hospital_beds = hospital_resources['total_beds'].sum()
-    available_hospital_beds = hospital_resources['available_beds'].sum()
-    st.metric("Total Beds Available", f"{available_hospital_beds}/{total_hospital_beds}")
+    summary = overview.hospital_summary(hospital)
+    if summary is None:
+        st.info("No resource data recorded for this hospital.")
+        return
+    wards, staff, stock = overview.drill_down(hospital)
+    cols = st.columns(3)
+    cols[0].metric("Total Beds Available", f"{int(summary['available_beds'])}/{int(summary['total_beds'])}")
+    cols[1].metric("Doctors on Duty Today", int(summary['doctors']))
+    cols[2].metric("Nurses on Duty Today", int(summary['nurses']))
+    st.dataframe(wards, use_container_width=True, hide_index=True)
+    cols = st.columns(2)
+    cols[0].write("**Staff on Duty Today:**")
+    cols[0].dataframe(staff, use_container_width=True, hide_index=True)
+    cols[1].write("**Total Medication Stock Today:**")
+    cols[1].dataframe(stock, use_container_width=True, hide_index=True)
 
-    doctors_names = set()
-    nurses_names = set()
-    medication_stock_total = {}
-    for _, ward in hospital_resources.iterrows():
-        doctors_names.update([d.strip() for d in str(ward.get('doctors', '')).split(',') if d.strip()])
-        nurses_names.update([n.strip() for n in str(ward.get('nurses', '')).split(',') if n.strip()])
-        meds = [m.strip() for m in str(ward.get('medications', '')).split(',') if m.strip()]
-        stocks = [s.strip() for s in str(ward.get('medication_stock', '')).split(',') if s.strip()]
-        for med, stock in zip(meds, stocks):
-            medication_stock_total[med] = medication_stock_total.get(med, 0) + (int(stock) if stock.isdigit() else 0)
+def display_resource_monitoring(resources_df, visits_df):
+    st.markdown('<div class="header"><h1>🏥 Resource Monitoring</h1></div>', unsafe_allow_html=True)
+    st.subheader("Daily Hospital Resource Metrics")
 
-    st.write("**Doctors on Duty Today:**")
-    for d in sorted(doctors_names):
-        st.write(f"- {d}")
+    # Select hospital
+    hospitals = hospital_options(resources_df)
+    if not hospitals:
+        st.warning("No resource data available.")
+        return
 
-    st.write("**Nurses on Duty Today:**")
-    for n in sorted(nurses_names):
-        st.write(f"- {n}")
+    overview = load_overview(resources_df, visits_df)
+    display_province_overview(overview)
+    selected_hospital = st.selectbox("Select Hospital", hospitals)
 
-    st.write("**Total Medication Stock Today:**")
-    for med, stock in medication_stock_total.items():
-        st.write(f"- {med}: {stock}")
+    # Prophet forecast
+    display_forecast()
 
+    # Ward grid and hospital summary, both sliced from the precomputed overview
+    display_ward_grid(overview, selected_hospital)
+    display_hospital_summary(overview, selected_hospital)
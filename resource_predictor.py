@@ -1,44 +1,136 @@
+import logging
+import threading
+from datetime import datetime, timedelta
 import pandas as pd
 import numpy as np
 from prophet import Prophet
 import streamlit as st
+from resource_series import materialize, resource_series
+
+FORECAST_DAYS = 7
+INTERVAL_WIDTH = 0.8
+# Two-sided normal quantile for INTERVAL_WIDTH, used by the baseline engines' intervals
+INTERVAL_Z = 1.2816
+SEASON_DAYS = 7
+
+# ====== FORECAST ENGINES ======
+# Each engine fits on a frame of daily (ds, y) and forecasts `periods` days past its
+# last date as (ds, yhat, yhat_lower, yhat_upper), so engines are interchangeable
+# in ResourcePredictor and comparable in forecast_backtest.
+def _future_dates(last_date, periods):
+    return pd.date_range(pd.Timestamp(last_date) + pd.Timedelta(days=1), periods=periods, freq='D')
+
+class ProphetEngine:
+    def fit(self, df):
+        model = Prophet(daily_seasonality=True, interval_width=INTERVAL_WIDTH)
+        model.fit(df)
+        return model
+
+    def predict(self, model, periods):
+        future = model.make_future_dataframe(periods=periods)
+        return model.predict(future)[['ds', 'yhat', 'yhat_lower', 'yhat_upper']].tail(periods).reset_index(drop=True)
+
+class SeasonalNaiveEngine:
+    """Repeats the last week; the interval comes from the spread of week-on-week changes"""
+    def fit(self, df):
+        y = df['y'].to_numpy(dtype=float)
+        season = min(SEASON_DAYS, len(y))
+        diffs = y[season:] - y[:-season] if len(y) > season else np.zeros(1)
+        return {'last_date': df['ds'].max(), 'last_season': y[-season:], 'scale': float(np.std(diffs))}
+
+    def predict(self, model, periods):
+        season = model['last_season']
+        yhat = np.resize(season, periods)
+        steps = np.arange(periods) // len(season) + 1      # later weeks are further from the data
+        spread = INTERVAL_Z * model['scale'] * np.sqrt(steps)
+        return pd.DataFrame({'ds': _future_dates(model['last_date'], periods),
+                             'yhat': yhat, 'yhat_lower': yhat - spread, 'yhat_upper': yhat + spread})
+
+class MovingAverageEngine:
+    """Flat forecast at the mean of the last `window` days"""
+    def __init__(self, window=SEASON_DAYS):
+        self.window = window
+
+    def fit(self, df):
+        recent = df['y'].to_numpy(dtype=float)[-self.window:]
+        return {'last_date': df['ds'].max(), 'level': float(recent.mean()), 'scale': float(recent.std())}
+
+    def predict(self, model, periods):
+        spread = INTERVAL_Z * model['scale']
+        yhat = np.full(periods, model['level'])
+        return pd.DataFrame({'ds': _future_dates(model['last_date'], periods),
+                             'yhat': yhat, 'yhat_lower': yhat - spread, 'yhat_upper': yhat + spread})
+
+ENGINES = {
+    'prophet': ProphetEngine,
+    'seasonal_naive': SeasonalNaiveEngine,
+    'moving_average': MovingAverageEngine,
+}
 
 class ResourcePredictor:
-    def __init__(self):
+    def __init__(self, engine='prophet'):
+        self.engine = ENGINES[engine]()
         self.models = {}
+        self._caught_up = None          # last "yesterday" a catch-up was started for
+        self._lock = threading.Lock()
 
     def predict_resources(self, resource_type, history_days=30):
-        """Predict resource needs for next 7 days for a resource type (beds, doctors, nurses, medications)"""
+        """Predict resource needs for next 7 days for a resource type (admissions, beds, doctors, nurses, medications)"""
         try:
             df = self._load_historical_data(resource_type, history_days)
             if len(df) < 7:
                 return None
 
-            if resource_type not in self.models:
-                self.models[resource_type] = self._train_model(df)
-            future = self.models[resource_type].make_future_dataframe(periods=7)
-            forecast = self.models[resource_type].predict(future)
-            return forecast[['ds', 'yhat', 'yhat_lower', 'yhat_upper']].tail(7)
+            # Refit only when a newer day has been materialized
+            key = (resource_type, history_days, df['ds'].max())
+            if key not in self.models:
+                self.models = {k: m for k, m in self.models.items() if k[0] != resource_type}
+                self.models[key] = self._train_model(df)
+            return self.engine.predict(self.models[key], FORECAST_DAYS)
         except Exception as e:
             st.error(f"Prediction failed: {str(e)}")
             return None
 
+    def available_resources(self):
+        """Resource types with a materialized series"""
+        self._catch_up()
+        return resource_series.resources()
+
     def _load_historical_data(self, resource_type, history_days):
-        """Load and prepare historical data. Simulated random data for example."""
-        dates = pd.date_range(end=pd.Timestamp.today(), periods=history_days)
-        np.random.seed(hash(resource_type) % 123456) # for repeatable results
-        values = np.random.randint(20, 50, size=history_days) + np.sin(np.arange(history_days)*0.5)*5
-        return pd.DataFrame({'ds': dates, 'y': values})
+        """Daily province totals for the resource from the materialized series"""
+        self._catch_up()
+        return resource_series.daily_totals(resource_type, days=history_days)
+
+    def _catch_up(self):
+        """When the scheduled job hasn't reached yesterday, materialize the missing days on a
+        background thread; started at most once a day, and never blocks the page"""
+        yesterday = datetime.now().date() - timedelta(days=1)
+        with self._lock:
+            if self._caught_up == yesterday:
+                return
+            self._caught_up = yesterday
+        last_day = resource_series.manifest()['last_day']
+        if last_day is not None and pd.Timestamp(last_day).date() >= yesterday:
+            return
+        threading.Thread(target=self._materialize, daemon=True).start()
+
+    @staticmethod
+    def _materialize():
+        try:
+            materialize()
+        except Exception as e:
+            logging.error(f"Resource series catch-up failed: {str(e)}")
 
     def _train_model(self, df):
-        """Train Prophet model"""
-        model = Prophet(daily_seasonality=True)
-        model.fit(df)
-        return model
+        """Train the configured engine's model"""
+        return self.engine.fit(df)
 
 # Singleton instance for easy importing
 predictor = ResourcePredictor()
 
 def predict_resources(resource_type):
     """Get predictions with error handling"""
-    return predictor.predict_resources(resource_type)
\ No newline at end of file
+    return predictor.predict_resources(resource_type)
+
+def available_resources():
+    return predictor.available_resources()
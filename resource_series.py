@@ -0,0 +1,295 @@
+# resource_series.py
+"""Materialized daily resource series per (hospital, ward, resource).
+
+Each run appends only the days since the last run: admissions per ward from
+the visits, and occupied beds, doctors, nurses and medication units per ward
+from the snapshot rings (or the current resource snapshot). Days are stored
+as compact column chunks (int32 day, int32 series id, float32 value) in
+data/resource_series/, with a JSON manifest naming the chunks and the
+series. ResourcePredictor reads the arrays directly. Both jobs are meant to
+be scheduled, e.g. in cron; if the daily run is missed, the predictor starts
+a catch-up on a background thread.
+
+    */15 * * * *  python snapshot_store.py        # one ward snapshot per run
+    10 0 * * *    python resource_series.py       # append yesterday
+
+    python resource_series.py [--through YYYY-MM-DD]
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+from data_cache import file_lock
+from partitioned_store import has_partitions, list_hospitals, load_resources, load_visits
+from province_overview import ProvinceOverview
+from snapshot_store import snapshot_store
+
+SERIES_ROOT = os.path.join("data", "resource_series")
+VISITS_PATH = os.path.join("data", "visits.csv")
+RESOURCES_PATH = os.path.join("data", "resources.csv")
+EPOCH = pd.Timestamp("1970-01-01")
+# Chunks are merged into one once there are more than this many
+COMPACT_AFTER = 32
+# Chunks replaced by a compaction stay on disk this long, for readers still holding the old manifest
+RETIRED_GRACE_SECONDS = 600
+# resource -> ProvinceOverview.wards column it is read from; admissions come from visits
+SNAPSHOT_RESOURCES = {
+    'beds': 'occupied_beds',
+    'doctors': 'doctors',
+    'nurses': 'nurses',
+    'medications': 'medication_units',
+}
+RESOURCES = ['admissions'] + list(SNAPSHOT_RESOURCES)
+_materialize_lock = threading.Lock()
+
+def _to_days(dates):
+    return ((pd.to_datetime(dates) - EPOCH) // pd.Timedelta(days=1)).astype('int32')
+
+def _from_days(days):
+    return EPOCH + pd.to_timedelta(np.asarray(days, dtype='int64'), unit='D')
+
+def admissions_by_day(visits_df, start=None, end=None):
+    """Long (day, hospital, ward, resource, value) of visits per ward per day in [start, end]"""
+    if visits_df.empty or 'visit_date' not in visits_df.columns:
+        return pd.DataFrame(columns=['day', 'hospital', 'ward', 'resource', 'value'])
+    days = pd.to_datetime(visits_df['visit_date'], errors='coerce').dt.normalize()
+    mask = days.notna()
+    if start is not None:
+        mask &= days >= pd.Timestamp(start)
+    if end is not None:
+        mask &= days <= pd.Timestamp(end)
+    visits = pd.DataFrame({
+        'day': days[mask],
+        'hospital': visits_df.loc[mask, 'hospital'].astype('string').fillna('Unknown') if 'hospital' in visits_df else 'Unknown',
+        'ward': visits_df.loc[mask, 'ward'].astype('string').fillna('Unassigned') if 'ward' in visits_df else 'Unassigned',
+    })
+    counts = visits.groupby(['day', 'hospital', 'ward']).size().rename('value').reset_index()
+    return counts.assign(resource='admissions')
+
+def _melt_levels(wards):
+    wards = wards.assign(occupied_beds=wards['total_beds'] - wards['available_beds'])
+    levels = wards.melt(id_vars=['day', 'hospital', 'ward'], value_vars=list(SNAPSHOT_RESOURCES.values()),
+                        var_name='resource', value_name='value')
+    levels['resource'] = levels['resource'].map({column: name for name, column in SNAPSHOT_RESOURCES.items()})
+    return levels
+
+def snapshot_levels(resources_df, day):
+    """Long (day, hospital, ward, resource, value) of one resource snapshot, dated `day`"""
+    return _melt_levels(ProvinceOverview(resources_df).wards.assign(day=pd.Timestamp(day).normalize()))
+
+def recorded_levels(start=None, end=None, snapshots=None):
+    """Long (day, hospital, ward, resource, value) of each ward's last recorded snapshot per day"""
+    return _melt_levels((snapshots or snapshot_store).daily_levels(start, end))
+
+class ResourceSeriesStore:
+    """Append-only columnar store of daily values, one series per (hospital, ward, resource)"""
+    def __init__(self, root=SERIES_ROOT):
+        self.root = root
+        self.manifest_path = os.path.join(root, "manifest.json")
+        self._lock = threading.Lock()
+        self._loaded_version = None
+        self._columns = None
+
+    def manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {'last_day': None, 'next_chunk': 0, 'chunks': [], 'series': [], 'retired': []}
+        with open(self.manifest_path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def _write_atomic(self, path, write):
+        os.makedirs(self.root, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp_path, path)
+
+    def _write_manifest(self, manifest):
+        self._write_atomic(self.manifest_path, lambda f: f.write(json.dumps(manifest, indent=1).encode('utf-8')))
+
+    @staticmethod
+    def _next_chunk_name(manifest):
+        manifest['next_chunk'] += 1
+        return f"chunk-{manifest['next_chunk']:06d}.npz"
+
+    def append(self, rows, last_day):
+        """Add long (day, hospital, ward, resource, value) rows as one new chunk and advance last_day"""
+        manifest = self.manifest()
+        series_ids = {tuple(key): i for i, key in enumerate(manifest['series'])}
+        keys = list(zip(rows['hospital'], rows['ward'], rows['resource']))
+        for key in dict.fromkeys(keys):
+            if key not in series_ids:
+                series_ids[key] = len(manifest['series'])
+                manifest['series'].append(list(key))
+        if len(rows):
+            name = self._next_chunk_name(manifest)
+            columns = {
+                'day': _to_days(rows['day']).to_numpy(),
+                'series': np.array([series_ids[key] for key in keys], dtype='int32'),
+                'value': rows['value'].to_numpy(dtype='float32'),
+            }
+            self._write_atomic(os.path.join(self.root, name), lambda f: np.savez(f, **columns))
+            manifest['chunks'].append(name)
+        manifest['last_day'] = pd.Timestamp(last_day).strftime('%Y-%m-%d')
+        expired = self._expire_retired(manifest)
+        # The manifest swap is the commit point: a crash before it leaves an unreferenced chunk
+        self._write_manifest(manifest)
+        self._remove(expired)
+        if len(manifest['chunks']) > COMPACT_AFTER:
+            self.compact()
+        return manifest
+
+    def compact(self):
+        """Merge every chunk into one, sorted by (series, day)"""
+        manifest = self.manifest()
+        if len(manifest['chunks']) < 2:
+            return manifest
+        day, series, value = self._read_chunks(manifest['chunks'])
+        order = np.lexsort((day, series))
+        name = self._next_chunk_name(manifest)
+        self._write_atomic(os.path.join(self.root, name),
+                           lambda f: np.savez(f, day=day[order], series=series[order], value=value[order]))
+        old_chunks, manifest['chunks'] = manifest['chunks'], [name]
+        # Old chunks are only retired here: a reader in another process may have listed them
+        # just before this swap, so they are deleted by a later append once the grace period ends
+        expired = self._expire_retired(manifest)
+        manifest.setdefault('retired', []).append({'chunks': old_chunks, 'at': time.time()})
+        self._write_manifest(manifest)
+        self._remove(expired)
+        return manifest
+
+    @staticmethod
+    def _expire_retired(manifest, now=None):
+        """Drop retired chunks past the grace period from the manifest and return their names"""
+        cutoff = (now or time.time()) - RETIRED_GRACE_SECONDS
+        retired = manifest.get('retired', [])
+        manifest['retired'] = [entry for entry in retired if entry['at'] > cutoff]
+        return [name for entry in retired if entry['at'] <= cutoff for name in entry['chunks']]
+
+    def _remove(self, chunks):
+        for name in chunks:
+            try:
+                os.remove(os.path.join(self.root, name))
+            except FileNotFoundError:
+                pass
+
+    def _read_chunks(self, chunks):
+        columns = {'day': [np.empty(0, 'int32')], 'series': [np.empty(0, 'int32')], 'value': [np.empty(0, 'float32')]}
+        for name in chunks:
+            with np.load(os.path.join(self.root, name)) as part:
+                for column, arrays in columns.items():
+                    arrays.append(part[column])
+        return tuple(np.concatenate(arrays) for arrays in columns.values())
+
+    def columns(self):
+        """(day, series id, value) arrays and the series table, re-read only when the manifest changes"""
+        with self._lock:
+            try:
+                stat = os.stat(self.manifest_path)
+                version = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                version = None
+            if self._columns is None or version != self._loaded_version:
+                try:
+                    manifest = self.manifest()
+                    chunks = self._read_chunks(manifest['chunks'])
+                except FileNotFoundError:
+                    # Compacted and purged between reading the manifest and its chunks; the new one lists live chunks
+                    manifest = self.manifest()
+                    chunks = self._read_chunks(manifest['chunks'])
+                series = pd.DataFrame(manifest['series'], columns=['hospital', 'ward', 'resource'])
+                self._columns = chunks + (series,)
+                self._loaded_version = version
+            return self._columns
+
+    def resources(self):
+        """Resources with at least one materialized value"""
+        day, series_ids, value, series = self.columns()
+        return set(series['resource'].iloc[np.unique(series_ids)]) if len(series_ids) else set()
+
+    def daily_totals(self, resource, hospital=None, ward=None, days=None):
+        """(ds, y) of one resource summed over the matching wards, one row per calendar day.
+
+        `days` keeps the last that many calendar days up to the latest day on
+        record. Days with no values count as 0 admissions; resource levels
+        carry the last recorded total forward.
+        """
+        day, series_ids, value, series = self.columns()
+        wanted = series['resource'] == resource
+        if hospital is not None:
+            wanted &= series['hospital'] == hospital
+        if ward is not None:
+            wanted &= series['ward'] == ward
+        mask = np.isin(series_ids, np.flatnonzero(wanted.to_numpy()))
+        if not mask.any():
+            return pd.DataFrame({'ds': pd.Series(dtype='datetime64[ns]'), 'y': pd.Series(dtype='float64')})
+        last = int(day[mask].max())
+        first = int(day[mask].min()) if days is None else last - days + 1
+        mask &= day >= first
+        totals = pd.Series(value[mask], dtype='float64').groupby(day[mask]).sum()
+        calendar = np.arange(first, last + 1)
+        if resource == 'admissions':
+            totals = totals.reindex(calendar, fill_value=0)
+        else:
+            totals = totals.reindex(calendar).ffill().dropna()
+        return pd.DataFrame({'ds': _from_days(totals.index), 'y': totals.to_numpy()})
+
+    def to_frame(self):
+        """Every series as long (series, ds, y), labelled 'hospital / ward / resource'"""
+        day, series_ids, value, series = self.columns()
+        labels = (series['hospital'] + ' / ' + series['ward'] + ' / ' + series['resource']).to_numpy()
+        return pd.DataFrame({'series': labels[series_ids], 'ds': _from_days(day), 'y': value}).sort_values(['series', 'ds'], ignore_index=True)
+
+def _read_csv(path, required):
+    """CSV at path, or an empty frame if it is missing or not in the expected layout"""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return pd.DataFrame(columns=required)
+    df = pd.read_csv(path)
+    return df if set(required).issubset(df.columns) else pd.DataFrame(columns=required)
+
+def materialize(store=None, visits_df=None, resources_df=None, through=None):
+    """Append every complete day after the store's last day, through `through` (default yesterday).
+
+    Admissions are derived for each new day; resource levels come from the
+    snapshot rings, or from the current snapshot dated `through` when none
+    are recorded. Returns the number of rows appended.
+    """
+    store = store or resource_series
+    os.makedirs(store.root, exist_ok=True)
+    # One writer at a time, across processes: the loser sees the advanced last_day and appends nothing
+    with _materialize_lock, file_lock(store.manifest_path):
+        through = pd.Timestamp(through or datetime.now().date() - timedelta(days=1)).normalize()
+        last_day = store.manifest()['last_day']
+        start = pd.Timestamp(last_day) + pd.Timedelta(days=1) if last_day else None
+        if start is not None and start > through:
+            return 0
+        if visits_df is None or resources_df is None:
+            if has_partitions():
+                hospitals = list_hospitals()
+                visits_df = load_visits(hospitals, start=start, end=through) if visits_df is None else visits_df
+                resources_df = load_resources(hospitals) if resources_df is None else resources_df
+            else:
+                visits_df = _read_csv(VISITS_PATH, ['visit_date']) if visits_df is None else visits_df
+                resources_df = _read_csv(RESOURCES_PATH, ['hospital', 'ward']) if resources_df is None else resources_df
+        # Recorded snapshots give every day its own levels; without them the current snapshot stands for `through`
+        levels = recorded_levels(start, through)
+        if levels.empty:
+            levels = snapshot_levels(resources_df, through)
+        rows = pd.concat([admissions_by_day(visits_df, start, through), levels], ignore_index=True)
+        store.append(rows[['day', 'hospital', 'ward', 'resource', 'value']], through)
+        return len(rows)
+
+# Global instance
+resource_series = ResourceSeriesStore()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Append new days to the materialized resource series")
+    parser.add_argument("--through", help="last day to materialize (default: yesterday)")
+    args = parser.parse_args()
+    appended = materialize(through=args.through)
+    manifest = resource_series.manifest()
+    print(f"Appended {appended} values; {len(manifest['series'])} series through {manifest['last_day']}")
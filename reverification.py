@@ -0,0 +1,164 @@
+# reverification.py
+"""Nightly batch re-verification of patients still waiting on Home Affairs.
+
+Every patient with legal_status 'Pending' or a "Needs Manual Review" result is
+joined against the registry in one merge on normalized document number, then
+checked on normalized name and nationality, reclassified with the intake
+eligibility rules, and all changes are written back in one atomic file swap.
+
+    python reverification.py [--dry-run]
+"""
+import argparse
+import os
+import tempfile
+import pandas as pd
+from audit_log import record_event
+from data_cache import file_lock
+from home_affairs_client import REGISTRY_CSV
+from logic import classify_patients
+
+PATIENTS_PATH = os.path.join("data", "intake_logs.csv")
+PENDING_STATUS = 'Pending'
+REVIEW_MARKERS = ["Needs Manual Review", "Needs Verification"]
+JOB_ACTOR = 'nightly-reverification'
+
+# Country names used on the intake forms -> the demonyms the registry stores
+NATIONALITY_ALIASES = {
+    'south africa': 'south african',
+    'zimbabwe': 'zimbabwean',
+    'malawi': 'malawian',
+    'mozambique': 'mozambican',
+    'somalia': 'somali',
+    'bangladesh': 'bangladeshi',
+    'lesotho': 'basotho',
+    'nigeria': 'nigerian',
+    'congo': 'congolese',
+}
+
+def normalize_doc(series):
+    return series.astype('string').str.strip().str.upper().str.replace(r'[\s-]+', '', regex=True)
+
+def normalize_name(series):
+    return series.astype('string').str.strip().str.lower().str.replace(r'[^\w\s]', '', regex=True).str.split().str.join(' ')
+
+def normalize_nationality(series):
+    keys = series.astype('string').str.strip().str.lower()
+    return keys.replace(NATIONALITY_ALIASES)
+
+def _column(df, *names):
+    for name in names:
+        if name in df.columns:
+            return df[name]
+    return pd.Series(pd.NA, index=df.index, dtype='string')
+
+def needs_reverification(patients_df):
+    """Mask of patients still awaiting a registry decision"""
+    pending = _column(patients_df, 'legal_status').astype('string').eq(PENDING_STATUS).fillna(False)
+    result = _column(patients_df, 'result', 'status').astype('string')
+    flagged = result.str.contains('|'.join(REVIEW_MARKERS), regex=True).fillna(False)
+    return pending | flagged
+
+def registry_keys(registry_df):
+    """One row per (document number -> registry record), on normalized keys"""
+    docs = registry_df.melt(
+        id_vars=['full_name', 'nationality', 'legal_status'],
+        value_vars=[c for c in ['id_number', 'passport_number'] if c in registry_df.columns],
+        value_name='doc_number'
+    ).dropna(subset=['doc_number'])
+    return pd.DataFrame({
+        'doc_key': normalize_doc(docs['doc_number']),
+        'registry_name': normalize_name(docs['full_name']),
+        'registry_nationality': normalize_nationality(docs['nationality']),
+        'registry_status': docs['legal_status'].astype('string'),
+    }).drop_duplicates('doc_key', keep='last')
+
+def reverify(patients_df, registry_df):
+    """(updated patients, change report) after re-checking every pending patient against the registry"""
+    mask = needs_reverification(patients_df)
+    pending = patients_df[mask]
+    if pending.empty:
+        return patients_df, pd.DataFrame(columns=['name', 'doc_number', 'old_status', 'new_status', 'old_result', 'new_result'])
+
+    keys = pd.DataFrame({
+        'doc_key': normalize_doc(_column(pending, 'doc_number', 'id_number', 'passport_number')),
+        'name_key': normalize_name(_column(pending, 'name', 'full_name')),
+        'nationality_key': normalize_nationality(_column(pending, 'nationality')),
+    }, index=pending.index)
+    merged = keys.merge(registry_keys(registry_df), on='doc_key', how='left')
+    merged.index = pending.index
+    matched = (
+        merged['registry_status'].notna()
+        & merged['registry_name'].eq(merged['name_key']).fillna(False)
+        & merged['registry_nationality'].eq(merged['nationality_key']).fillna(False)
+    )
+
+    old_status = _column(pending, 'legal_status').astype('string')
+    old_result = _column(pending, 'result', 'status').astype('string')
+    # No registry match leaves the patient pending for the clerks, as before
+    new_status = merged['registry_status'].where(matched, old_status)
+    doc_type = _column(pending, 'doc_type', 'document_type')
+    new_result = pd.Series(
+        classify_patients(pending['nationality'], doc_type, new_status.fillna('')), index=pending.index, dtype='string'
+    ).where(matched, old_result)
+
+    changed = new_status.ne(old_status).fillna(True) | new_result.ne(old_result).fillna(True)
+    changed &= matched
+    updated = patients_df.copy()
+    result_column = 'result' if 'result' in updated.columns else 'status'
+    updated.loc[changed[changed].index, 'legal_status'] = new_status[changed]
+    updated.loc[changed[changed].index, result_column] = new_result[changed]
+
+    report = pd.DataFrame({
+        'name': _column(pending, 'name', 'full_name'),
+        'doc_number': _column(pending, 'doc_number', 'id_number', 'passport_number'),
+        'old_status': old_status,
+        'new_status': new_status,
+        'old_result': old_result,
+        'new_result': new_result,
+    })[changed]
+    return updated, report
+
+def write_back(patients_df, path=PATIENTS_PATH):
+    """Replace the patients file in one atomic swap, so readers see all changes or none"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    with os.fdopen(fd, "w", newline="", encoding="utf-8") as tmp:
+        patients_df.to_csv(tmp, index=False)
+    os.replace(tmp_path, path)
+
+def _stat(path):
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+def run(patients_path=PATIENTS_PATH, registry_path=REGISTRY_CSV, dry_run=False, attempts=3):
+    """Re-verify all pending patients in patients_path; returns the change report"""
+    registry_df = pd.read_csv(registry_path, dtype=str)
+    for _ in range(attempts):
+        version = _stat(patients_path)
+        patients_df = pd.read_csv(patients_path, encoding="utf-8-sig", dtype={'doc_number': 'string'})
+        updated, report = reverify(patients_df, registry_df)
+        if report.empty or dry_run:
+            return report
+        # Intakes append under the same lock, so none can land between this check and the swap;
+        # one appended while we were working means starting over rather than dropping it
+        with file_lock(patients_path):
+            if _stat(patients_path) == version:
+                write_back(updated, patients_path)
+                break
+    else:
+        raise RuntimeError(f"{patients_path} kept changing; re-verification not written")
+    for change in report.to_dict('records'):
+        record_event('verification', actor=JOB_ACTOR, name=change['name'], doc_number=change['doc_number'],
+                     legal_status=change['new_status'], result=change['new_result'],
+                     previous_status=change['old_status'])
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-verify pending patients against the Home Affairs registry")
+    parser.add_argument("--patients", default=PATIENTS_PATH)
+    parser.add_argument("--registry", default=REGISTRY_CSV)
+    parser.add_argument("--dry-run", action="store_true", help="report changes without writing them")
+    args = parser.parse_args()
+    report = run(args.patients, args.registry, args.dry_run)
+    print(f"{len(report)} patients {'would change' if args.dry_run else 'updated'}")
+    if not report.empty:
+        print(report.to_string(index=False))
@@ -0,0 +1,524 @@
+# schema_migration.py
+import csv
+import hashlib
+import io
+import json
+import os
+import tempfile
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from data_cache import file_lock
+
+# Bump whenever a canonical schema below changes; older stores are rebuilt on load
+SCHEMA_VERSION = 1
+
+CANONICAL_DIR = "canonical"
+MANIFEST_FILE = "manifest.json"
+QUARANTINE_FILE = "quarantine.csv"
+# Bytes before a source's migrated end that must be unchanged for rows after it to be migrated on their own
+TAIL_CHECK_BYTES = 4096
+
+# ====== SOURCE LAYOUTS ======
+# Every column name that has appeared in each file, plus the headerless layout
+# written by data_initializer for files whose header line went missing.
+SOURCES = {
+    'patients': {
+        'file': 'patients.csv',
+        'known': {'id', 'full_name', 'name', 'nationality', 'id_number', 'passport_number', 'document_type',
+                  'doc_type', 'doc_number', 'legal_status', 'status', 'result', 'last_visit', 'timestamp',
+                  'dob', 'medical_aid', 'conditions', 'verified_by', 'details'},
+        'legacy': None
+    },
+    'visits': {
+        'file': 'visits.csv',
+        'known': {'id', 'visit_id', 'patient_id', 'patient_name', 'hospital', 'ward', 'visit_date', 'visit_type',
+                  'doctor', 'diagnosis', 'treatment', 'medication', 'cost', 'duration_minutes', 'bed_number', 'notes'},
+        'legacy': None
+    },
+    'costs': {
+        'file': 'costs.csv',
+        'known': {'date', 'daily_cost', 'avg_patient_cost', 'medication_cost', 'staff_cost', 'facility_cost',
+                  'total_cost', 'patient_count', 'amount', 'patient_name', 'description', 'category'},
+        'legacy': ['daily_cost', 'avg_patient_cost', 'medication_cost', 'staff_cost', 'facility_cost']
+    },
+    'resources': {
+        'file': 'resources.csv',
+        'known': {'hospital', 'ward', 'total_beds', 'available_beds', 'medications', 'medication_stock', 'doctors',
+                  'nurses', 'beds_available', 'staff_available', 'utilization'},
+        'legacy': ['beds_available', 'medication_stock', 'staff_available', 'utilization']
+    }
+}
+
+# ====== CANONICAL SCHEMAS ======
+CANONICAL_SCHEMAS = {
+    'patients': {
+        'id': 'string',
+        'full_name': 'string',
+        'nationality': 'category',
+        'document_type': 'category',
+        'doc_number': 'string',
+        'id_number': 'string',
+        'passport_number': 'string',
+        'legal_status': 'string',
+        'status': 'string',
+        'result': 'string',
+        'dob': 'string',
+        'medical_aid': 'string',
+        'conditions': 'string',
+        'verified_by': 'string',
+        'details': 'string',
+        'last_visit': 'datetime64[ns]',
+        'timestamp': 'datetime64[ns]'
+    },
+    'visits': {
+        'visit_id': 'string',
+        'patient_id': 'string',
+        'patient_name': 'string',
+        'hospital': 'category',
+        'ward': 'category',
+        'visit_date': 'datetime64[ns]',
+        'visit_type': 'category',
+        'doctor': 'string',
+        'diagnosis': 'string',
+        'treatment': 'string',
+        'medication': 'string',
+        'cost': 'float64',
+        'duration_minutes': 'Int64',
+        'bed_number': 'string',
+        'notes': 'string'
+    },
+    'cost_ledger': {
+        'date': 'datetime64[ns]',
+        'patient_name': 'string',
+        'description': 'string',
+        'category': 'category',
+        'amount': 'float64'
+    },
+    'cost_summary': {
+        'date': 'datetime64[ns]',
+        'daily_cost': 'float64',
+        'avg_patient_cost': 'float64',
+        'medication_cost': 'float64',
+        'staff_cost': 'float64',
+        'facility_cost': 'float64',
+        'total_cost': 'float64',
+        'patient_count': 'Int64'
+    },
+    'resources': {
+        'hospital': 'category',
+        'ward': 'category',
+        'total_beds': 'Int64',
+        'available_beds': 'Int64',
+        'medications': 'string',
+        'medication_stock': 'string',
+        'doctors': 'string',
+        'nurses': 'string'
+    },
+    'resource_summary': {
+        'beds_available': 'Int64',
+        'medication_stock': 'Int64',
+        'staff_available': 'Int64',
+        'utilization': 'float64'
+    }
+}
+
+# ====== READING DRIFTED SOURCES ======
+def _is_header(fields, known):
+    names = [f.strip() for f in fields]
+    return bool(names) and all(n.isidentifier() for n in names) and bool(known.intersection(names))
+
+def _tail_hash(path, size):
+    with open(path, 'rb') as f:
+        start = max(0, size - TAIL_CHECK_BYTES)
+        f.seek(start)
+        return hashlib.sha256(f.read(size - start)).hexdigest()
+
+def _read_source(path, known, legacy=None, since=None):
+    """Read a CSV as raw strings; returns (rows, bad_lines, state) with 1-based source line numbers.
+
+    `state` records how far the file was read. Given the state of an earlier
+    read as `since`, only the records appended after it are read, under that
+    read's header; None is returned if the file was rewritten rather than
+    appended to in the meantime.
+    """
+    # Under the writers' lock, so the read ends on a whole record
+    with file_lock(path):
+        offset = since['size'] if since else 0
+        if since and (os.path.getsize(path) < offset or _tail_hash(path, offset) != since['tail_hash']):
+            return None
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+        size = offset + len(data)
+        state = {'mtime_ns': os.stat(path).st_mtime_ns, 'size': size, 'tail_hash': _tail_hash(path, size)}
+    lines = list(csv.reader(io.StringIO(data.decode('utf-8' if since else 'utf-8-sig'), newline='')))
+
+    first_line = since['records'] if since else 0
+    if since:
+        header, header_at = since['header'], -1
+    else:
+        header_at = next((i for i, fields in enumerate(lines) if _is_header(fields, known)), None)
+        if header_at is not None:
+            header = [f.strip() for f in lines[header_at]]
+        elif legacy:
+            header, header_at = legacy, -1
+        else:
+            raise ValueError(f"No recognisable header in {path}")
+    # A last line without a newline would be continued by the next append, so later rows can't be read alone
+    state.update(header=header, records=first_line + len(lines),
+                 complete=data.endswith(b'\n') if data else (since['complete'] if since else True))
+
+    good, bad = [], []
+    for i, fields in enumerate(lines):
+        line = first_line + i + 1
+        if i == header_at or not any(f.strip() for f in fields):
+            continue
+        if i < header_at:
+            bad.append({'source_line': line, 'reason': 'stray line before header', 'raw': ','.join(fields)})
+        elif len(fields) != len(header):
+            bad.append({'source_line': line, 'reason': 'wrong field count', 'raw': ','.join(fields)})
+        else:
+            good.append([line] + fields)
+
+    raw = pd.DataFrame(good, columns=['source_line'] + header, dtype=object)
+    raw = raw.set_index('source_line')
+    raw = raw.apply(lambda col: col.str.strip()).replace('', None)
+    return raw, bad, state
+
+# ====== VECTORIZED CONVERSION AND VALIDATION ======
+def _col(raw, *names):
+    """First non-null value across alternative column names"""
+    out = pd.Series(None, index=raw.index, dtype=object)
+    for name in names:
+        if name in raw.columns:
+            out = out.fillna(raw[name])
+    return out
+
+def _clean_name(series):
+    return series.str.strip().str.rstrip(',').str.strip().replace('', None)
+
+def _to_id(series):
+    """'12.0' style float ids from pandas round-trips become '12'"""
+    numeric = pd.to_numeric(series, errors='coerce')
+    as_int = numeric.round().astype('Int64').astype('string')
+    return as_int.where(numeric.notna(), series.astype('string'))
+
+def _bad_number(raw_values, parsed, allow_negative=False):
+    bad = raw_values.notna() & parsed.isna()
+    if not allow_negative:
+        bad |= parsed < 0
+    return bad
+
+def _bad_date(raw_values, parsed):
+    return raw_values.notna() & parsed.isna()
+
+def _split_valid(dataset, frame, raw, rules):
+    """Apply row rules in one pass per rule; failing rows go to quarantine with every reason they hit"""
+    reasons = pd.Series('', index=frame.index)
+    for reason, mask in rules.items():
+        reasons = reasons.mask(mask.fillna(False).astype(bool), reasons + reason + '; ')
+    bad = reasons != ''
+    quarantined = pd.DataFrame({
+        'dataset': dataset,
+        'source_line': frame.index[bad],
+        'reason': reasons[bad].str.rstrip('; ').values,
+        'raw': raw.loc[bad].apply(lambda row: json.dumps(row.dropna().to_dict(), ensure_ascii=False), axis=1).values
+               if bad.any() else []
+    })
+    return frame[~bad], quarantined
+
+def _typed(frame, schema):
+    """Cast to the canonical schema, adding any missing column as all-NA"""
+    out = pd.DataFrame(index=frame.index)
+    for col, dtype in schema.items():
+        values = frame[col] if col in frame.columns else pd.Series(None, index=frame.index, dtype=object)
+        if dtype.startswith('datetime64'):
+            out[col] = pd.to_datetime(values, errors='coerce')
+        elif dtype in ('float64', 'Int64'):
+            out[col] = pd.to_numeric(values, errors='coerce').astype(dtype)
+        else:
+            out[col] = values.astype('string').astype(dtype)
+    return out
+
+def _canonical_patients(raw):
+    name = raw.get('name')
+    frame = pd.DataFrame({
+        'id': _to_id(_col(raw, 'id')),
+        # app.load_data fills a missing name with the literal 'Unknown'
+        'full_name': _clean_name(_col(raw, 'full_name').fillna(name.where(name != 'Unknown') if name is not None else None)),
+        'nationality': _col(raw, 'nationality'),
+        'document_type': _col(raw, 'document_type', 'doc_type'),
+        'doc_number': _col(raw, 'doc_number', 'id_number', 'passport_number'),
+        **{col: _col(raw, col) for col in ['id_number', 'passport_number', 'legal_status', 'status', 'result',
+                                           'dob', 'medical_aid', 'conditions', 'verified_by', 'details']},
+        'last_visit': _col(raw, 'last_visit'),
+        'timestamp': _col(raw, 'timestamp')
+    }, index=raw.index)
+    typed = _typed(frame, CANONICAL_SCHEMAS['patients'])
+    rules = {
+        'duplicate row': raw.duplicated(),
+        'missing full_name': typed['full_name'].isna(),
+        'missing nationality': typed['nationality'].isna(),
+        'invalid last_visit': _bad_date(frame['last_visit'], typed['last_visit']),
+        'invalid timestamp': _bad_date(frame['timestamp'], typed['timestamp'])
+    }
+    return [('patients', typed, rules)]
+
+def _canonical_visits(raw):
+    frame = pd.DataFrame({
+        'visit_id': _to_id(_col(raw, 'visit_id', 'id')),
+        'patient_id': _to_id(_col(raw, 'patient_id')),
+        'patient_name': _clean_name(_col(raw, 'patient_name')),
+        **{col: _col(raw, col) for col in ['hospital', 'ward', 'visit_date', 'visit_type', 'doctor', 'diagnosis',
+                                           'treatment', 'medication', 'cost', 'duration_minutes', 'bed_number',
+                                           'notes']}
+    }, index=raw.index)
+    typed = _typed(frame, CANONICAL_SCHEMAS['visits'])
+    rules = {
+        'duplicate row': raw.duplicated(),
+        'missing hospital': typed['hospital'].isna(),
+        'missing visit_date': frame['visit_date'].isna(),
+        'invalid visit_date': _bad_date(frame['visit_date'], typed['visit_date']),
+        'invalid cost': _bad_number(frame['cost'], typed['cost']),
+        'invalid duration_minutes': _bad_number(frame['duration_minutes'], typed['duration_minutes'])
+    }
+    return [('visits', typed, rules)]
+
+def _canonical_costs(raw):
+    is_ledger = _col(raw, 'amount').notna() | _col(raw, 'patient_name').notna()
+    ledger_raw, summary_raw = raw[is_ledger], raw[~is_ledger]
+
+    ledger = pd.DataFrame({
+        'date': _col(ledger_raw, 'date'),
+        'patient_name': _clean_name(_col(ledger_raw, 'patient_name')),
+        'description': _col(ledger_raw, 'description'),
+        'category': _col(ledger_raw, 'category'),
+        'amount': _col(ledger_raw, 'amount')
+    }, index=ledger_raw.index)
+    ledger_typed = _typed(ledger, CANONICAL_SCHEMAS['cost_ledger'])
+    ledger_rules = {
+        'duplicate row': ledger_raw.duplicated(),
+        'invalid date': _bad_date(ledger['date'], ledger_typed['date']),
+        'invalid amount': _bad_number(ledger['amount'], ledger_typed['amount']) | ledger['amount'].isna()
+    }
+
+    summary_cols = [c for c in CANONICAL_SCHEMAS['cost_summary'] if c != 'date']
+    summary = pd.DataFrame({col: _col(summary_raw, col) for col in CANONICAL_SCHEMAS['cost_summary']},
+                           index=summary_raw.index)
+    summary_typed = _typed(summary, CANONICAL_SCHEMAS['cost_summary'])
+    summary_rules = {
+        'empty row': summary[summary_cols].isna().all(axis=1),
+        'invalid date': _bad_date(summary['date'], summary_typed['date']),
+        **{f'invalid {col}': _bad_number(summary[col], summary_typed[col]) for col in summary_cols}
+    }
+    return [('cost_ledger', ledger_typed, ledger_rules), ('cost_summary', summary_typed, summary_rules)]
+
+def _canonical_resources(raw):
+    outputs = []
+    if {'hospital', 'ward'}.intersection(raw.columns):
+        frame = pd.DataFrame({col: _col(raw, col) for col in CANONICAL_SCHEMAS['resources']}, index=raw.index)
+        typed = _typed(frame, CANONICAL_SCHEMAS['resources'])
+        outputs.append(('resources', typed, {
+            'missing hospital': typed['hospital'].isna(),
+            'invalid total_beds': _bad_number(frame['total_beds'], typed['total_beds']),
+            'invalid available_beds': _bad_number(frame['available_beds'], typed['available_beds']),
+            'available_beds exceeds total_beds': typed['available_beds'] > typed['total_beds']
+        }))
+    else:
+        frame = pd.DataFrame({col: _col(raw, col) for col in CANONICAL_SCHEMAS['resource_summary']},
+                             index=raw.index)
+        typed = _typed(frame, CANONICAL_SCHEMAS['resource_summary'])
+        outputs.append(('resource_summary', typed, {
+            f'invalid {col}': _bad_number(frame[col], typed[col]) for col in CANONICAL_SCHEMAS['resource_summary']
+        }))
+    return outputs
+
+CANONICALIZERS = {
+    'patients': _canonical_patients,
+    'visits': _canonical_visits,
+    'costs': _canonical_costs,
+    'resources': _canonical_resources
+}
+
+# ====== CANONICAL STORE ======
+def _store_dir(base_path):
+    return os.path.join(base_path, CANONICAL_DIR)
+
+def _source_stat(path):
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+def _write_atomic(path, write):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, 'wb') as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+def _write_manifest(out_dir, manifest):
+    _write_atomic(os.path.join(out_dir, MANIFEST_FILE),
+                  lambda f: f.write(json.dumps(manifest, indent=2).encode('utf-8')))
+
+def _row_hashes(raw):
+    """One hash per raw source row, so rows appended later can be checked against earlier ones for duplicates"""
+    return pd.Series(pd.util.hash_pandas_object(raw, index=False).to_numpy(), index=raw.index)
+
+def _row_hash_path(out_dir, name):
+    return os.path.join(out_dir, f"{name}.rowhashes.npy")
+
+def read_manifest(base_path="data"):
+    path = os.path.join(_store_dir(base_path), MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def has_store(base_path="data"):
+    """True once a canonical store has been written, current or not"""
+    return read_manifest(base_path) is not None
+
+def is_current(base_path="data"):
+    """True if the canonical store matches SCHEMA_VERSION and the source files as they were last read"""
+    manifest = read_manifest(base_path)
+    if manifest is None or manifest.get('schema_version') != SCHEMA_VERSION:
+        return False
+    sources = manifest.get('sources', {})
+    for source in SOURCES.values():
+        state = sources.get(source['file'])
+        stat = _source_stat(os.path.join(base_path, source['file']))
+        if stat != (state if state is None or not isinstance(state, dict) else [state.get('mtime_ns'), state.get('size')]):
+            return False
+    return True
+
+def _manifest(sources, datasets, quarantined):
+    return {
+        'schema_version': SCHEMA_VERSION,
+        'migrated_at': datetime.now().isoformat(timespec='seconds'),
+        'sources': sources,
+        'rows': {dataset: len(df) for dataset, df in datasets.items()},
+        'quarantined': quarantined
+    }
+
+def _migrate(base_path):
+    out_dir = _store_dir(base_path)
+    datasets = {}
+    quarantine = []
+    sources = {}
+    for name, source in SOURCES.items():
+        path = os.path.join(base_path, source['file'])
+        if not os.path.exists(path):
+            continue
+        raw, bad_lines, sources[source['file']] = _read_source(path, source['known'], source['legacy'])
+        np.save(_row_hash_path(out_dir, name), _row_hashes(raw).to_numpy())
+        quarantine.append(pd.DataFrame(bad_lines, columns=['source_line', 'reason', 'raw']).assign(dataset=name))
+        for dataset, typed, rules in CANONICALIZERS[name](raw):
+            valid, rejected = _split_valid(dataset, typed, raw.loc[typed.index], rules)
+            datasets[dataset] = valid.reset_index(drop=True)
+            quarantine.append(rejected)
+
+    for dataset, schema in CANONICAL_SCHEMAS.items():
+        df = datasets.get(dataset, _typed(pd.DataFrame(), schema))
+        _write_atomic(os.path.join(out_dir, f"{dataset}.pkl"), df.to_pickle)
+        datasets[dataset] = df
+
+    quarantine_df = pd.concat(quarantine, ignore_index=True)[['dataset', 'source_line', 'reason', 'raw']]
+    _write_atomic(os.path.join(out_dir, QUARANTINE_FILE), lambda f: quarantine_df.to_csv(f, index=False))
+
+    manifest = _manifest(sources, datasets, quarantine_df['dataset'].value_counts().to_dict())
+    _write_manifest(out_dir, manifest)
+    return manifest
+
+def _migrate_appends(base_path):
+    """Migrate only the records appended to each source since the store was written.
+
+    Returns the new manifest, or None when the store can't be extended (no
+    store, another schema version, or a source rewritten, added or removed)
+    and a full migration is needed.
+    """
+    manifest = read_manifest(base_path)
+    if manifest is None or manifest.get('schema_version') != SCHEMA_VERSION:
+        return None
+    out_dir = _store_dir(base_path)
+    sources = dict(manifest.get('sources', {}))
+    appended, quarantine = {}, []
+    for name, source in SOURCES.items():
+        path = os.path.join(base_path, source['file'])
+        state = sources.get(source['file'])
+        stat = _source_stat(path)
+        if state is None or stat is None:
+            if state is None and stat is None:
+                continue
+            return None
+        if stat == [state['mtime_ns'], state['size']]:
+            continue
+        # Stores written before sources were tracked by read position are rebuilt once
+        if not isinstance(state, dict) or not state.get('complete') or not os.path.exists(_row_hash_path(out_dir, name)):
+            return None
+        read = _read_source(path, source['known'], source['legacy'], since=state)
+        if read is None:
+            return None
+        raw, bad_lines, sources[source['file']] = read
+        hashes = _row_hashes(raw)
+        earlier = np.load(_row_hash_path(out_dir, name))
+        quarantine.append(pd.DataFrame(bad_lines, columns=['source_line', 'reason', 'raw']).assign(dataset=name))
+        for dataset, typed, rules in CANONICALIZERS[name](raw):
+            if 'duplicate row' in rules:
+                rules['duplicate row'] = rules['duplicate row'] | hashes.loc[typed.index].isin(earlier)
+            valid, rejected = _split_valid(dataset, typed, raw.loc[typed.index], rules)
+            appended.setdefault(dataset, []).append(valid)
+            quarantine.append(rejected)
+        np.save(_row_hash_path(out_dir, name), np.concatenate([earlier, hashes.to_numpy()]))
+
+    datasets = {}
+    for dataset, schema in CANONICAL_SCHEMAS.items():
+        path = os.path.join(out_dir, f"{dataset}.pkl")
+        df = pd.read_pickle(path)
+        new = [frame for frame in appended.get(dataset, []) if not frame.empty]
+        if new:
+            df = pd.concat([df] + new, ignore_index=True)
+            # Categories differing between the parts leave object columns behind
+            df = df.astype({col: dtype for col, dtype in schema.items() if dtype == 'category'})
+            _write_atomic(path, df.to_pickle)
+        datasets[dataset] = df
+
+    quarantined = dict(manifest.get('quarantined', {}))
+    quarantine_df = pd.concat(quarantine, ignore_index=True)[['dataset', 'source_line', 'reason', 'raw']]
+    if not quarantine_df.empty:
+        quarantine_df.to_csv(os.path.join(out_dir, QUARANTINE_FILE), mode='a', header=False, index=False)
+        for dataset, count in quarantine_df['dataset'].value_counts().items():
+            quarantined[dataset] = quarantined.get(dataset, 0) + int(count)
+
+    manifest = _manifest(sources, datasets, quarantined)
+    _write_manifest(out_dir, manifest)
+    return manifest
+
+def migrate(base_path="data"):
+    """Rewrite every source file into the canonical store, quarantining rows that fail validation"""
+    out_dir = _store_dir(base_path)
+    os.makedirs(out_dir, exist_ok=True)
+    with file_lock(os.path.join(out_dir, MANIFEST_FILE)):
+        return _migrate(base_path)
+
+def load_canonical(base_path="data"):
+    """Canonical frames keyed by dataset name.
+
+    The full migration runs once, when the store is missing, of another
+    schema version, or a source file was rewritten. Records appended to a
+    source since (intakes, visits) are migrated on their own.
+    """
+    out_dir = _store_dir(base_path)
+    os.makedirs(out_dir, exist_ok=True)
+    with file_lock(os.path.join(out_dir, MANIFEST_FILE)):
+        if not is_current(base_path) and _migrate_appends(base_path) is None:
+            _migrate(base_path)
+    return {dataset: pd.read_pickle(os.path.join(out_dir, f"{dataset}.pkl")) for dataset in CANONICAL_SCHEMAS}
+
+if __name__ == "__main__":
+    result = migrate()
+    print(f"Canonical store v{result['schema_version']} written to data/{CANONICAL_DIR}/")
+    for dataset, count in result['rows'].items():
+        print(f"  {dataset}: {count} rows")
+    for dataset, count in result['quarantined'].items():
+        print(f"  quarantined from {dataset}: {count}")
@@ -0,0 +1,183 @@
+# snapshot_store.py
+"""Ring-buffer history of bed, staff and medication levels per ward.
+
+Each ward has one fixed-size file of fixed-width records, memory-mapped.
+Every record is written twice, at slot i and i + capacity, so the latest n
+records (n <= capacity) are always one contiguous slice: appends are two
+record writes and window reads are views into the map, with no copying.
+Retention is capacity x cadence; older records are overwritten.
+
+    python snapshot_store.py [--every MINUTES]   # record the current resources on a cadence
+"""
+import argparse
+import os
+import threading
+import time
+from datetime import datetime
+from urllib.parse import quote, unquote
+import numpy as np
+import pandas as pd
+from partitioned_store import has_partitions, list_hospitals, load_resources
+from province_overview import ProvinceOverview
+
+# data/snapshots/hospital=<name>/ward=<name>.ring
+SNAPSHOT_ROOT = os.path.join("data", "snapshots")
+RESOURCES_PATH = os.path.join("data", "resources.csv")
+CADENCE_MINUTES = 60
+RETENTION_DAYS = 90
+MAGIC = 0x52494E47  # "RING"
+HEADER = np.dtype([('magic', '<i8'), ('capacity', '<i8'), ('written', '<i8'), ('cadence_seconds', '<i8')])
+RECORD = np.dtype([
+    ('timestamp', '<i8'),           # seconds since the epoch, start of the cadence slot
+    ('total_beds', '<i4'),
+    ('available_beds', '<i4'),
+    ('doctors', '<i4'),
+    ('nurses', '<i4'),
+    ('medication_units', '<i8'),
+])
+LEVELS = [name for name in RECORD.names if name != 'timestamp']
+
+def _ward_path(hospital, ward, root=SNAPSHOT_ROOT):
+    return os.path.join(root, f"hospital={quote(str(hospital), safe='')}", f"ward={quote(str(ward), safe='')}.ring")
+
+class WardRing:
+    """One ward's mirrored ring buffer, mapped from its file"""
+    def __init__(self, path, capacity, cadence_seconds):
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.truncate(HEADER.itemsize + 2 * capacity * RECORD.itemsize)
+            header = np.memmap(path, dtype=HEADER, mode='r+', shape=(1,))
+            header[0] = (MAGIC, capacity, 0, cadence_seconds)
+            header.flush()
+        self.header = np.memmap(path, dtype=HEADER, mode='r+', shape=(1,))
+        if self.header['magic'][0] != MAGIC:
+            raise ValueError(f"{path} is not a snapshot ring")
+        # An existing ring keeps the capacity it was created with
+        self.capacity = int(self.header['capacity'][0])
+        self.records = np.memmap(path, dtype=RECORD, mode='r+', offset=HEADER.itemsize, shape=(2 * self.capacity,))
+
+    @property
+    def written(self):
+        return int(self.header['written'][0])
+
+    def last_timestamp(self):
+        written = self.written
+        return int(self.records['timestamp'][(written - 1) % self.capacity]) if written else None
+
+    def append(self, record):
+        """O(1): write the record into its slot and the slot's mirror, then publish it"""
+        slot = self.written % self.capacity
+        self.records[slot] = record
+        self.records[slot + self.capacity] = record
+        # Bumping the count last means readers never see a half-written record
+        self.header['written'] += 1
+
+    def window(self, last=None):
+        """View of the latest `last` records (all retained by default), oldest first"""
+        written = self.written
+        count = min(written, self.capacity) if last is None else min(last, written, self.capacity)
+        end = (written - 1) % self.capacity + self.capacity + 1 if written else 0
+        return self.records[end - count:end]
+
+    def between(self, start=None, end=None):
+        """View of the retained records with start <= timestamp <= end (epoch seconds)"""
+        records = self.window()
+        lo = np.searchsorted(records['timestamp'], start, side='left') if start is not None else 0
+        hi = np.searchsorted(records['timestamp'], end, side='right') if end is not None else len(records)
+        return records[lo:hi]
+
+    def flush(self):
+        self.records.flush()
+        self.header.flush()
+
+class SnapshotStore:
+    """Per-ward ring buffers of resource levels, recorded at most once per cadence slot"""
+    def __init__(self, root=SNAPSHOT_ROOT, cadence_minutes=CADENCE_MINUTES, retention_days=RETENTION_DAYS):
+        self.root = root
+        self.cadence_seconds = int(cadence_minutes * 60)
+        self.capacity = max(1, int(retention_days * 86400 // self.cadence_seconds))
+        self._rings = {}
+        self._lock = threading.Lock()
+
+    def ring(self, hospital, ward):
+        key = (hospital, ward)
+        if key not in self._rings:
+            self._rings[key] = WardRing(_ward_path(hospital, ward, self.root), self.capacity, self.cadence_seconds)
+        return self._rings[key]
+
+    def wards(self):
+        """(hospital, ward) of every ward with a ring on disk"""
+        if not os.path.isdir(self.root):
+            return []
+        found = []
+        for hospital_dir in sorted(os.listdir(self.root)):
+            if not hospital_dir.startswith("hospital="):
+                continue
+            for name in sorted(os.listdir(os.path.join(self.root, hospital_dir))):
+                if name.startswith("ward=") and name.endswith(".ring"):
+                    found.append((unquote(hospital_dir[len("hospital="):]), unquote(name[len("ward="):-len(".ring")])))
+        return found
+
+    def record(self, resources_df, when=None):
+        """Append the current level of every ward, once per cadence slot; returns how many wards were recorded"""
+        now = int(pd.Timestamp(when or datetime.now()).timestamp())
+        slot = now - now % self.cadence_seconds
+        wards = ProvinceOverview(resources_df).wards
+        recorded = 0
+        with self._lock:
+            for row in wards.itertuples(index=False):
+                ring = self.ring(row.hospital, row.ward)
+                last = ring.last_timestamp()
+                if last is not None and last >= slot:
+                    continue
+                ring.append((slot, row.total_beds, row.available_beds, row.doctors, row.nurses, row.medication_units))
+                recorded += 1
+            for ring in self._rings.values():
+                ring.flush()
+        return recorded
+
+    def history(self, hospital, ward, start=None, end=None):
+        """A ward's retained records in [start, end] as a zero-copy structured array view"""
+        start = int(pd.Timestamp(start).timestamp()) if start is not None else None
+        end = int(pd.Timestamp(end).timestamp()) if end is not None else None
+        return self.ring(hospital, ward).between(start, end)
+
+    def daily_levels(self, start=None, end=None):
+        """Each ward's last snapshot of every day in [start, end], one row per (day, hospital, ward)"""
+        end = pd.Timestamp(end).normalize() + pd.Timedelta(days=1) - pd.Timedelta(seconds=1) if end is not None else None
+        frames = []
+        for hospital, ward in self.wards():
+            records = self.history(hospital, ward, start, end)
+            if not len(records):
+                continue
+            days = pd.to_datetime(records['timestamp'], unit='s').normalize()
+            last_of_day = np.flatnonzero(np.append(days[1:] != days[:-1], True))
+            frame = pd.DataFrame({name: records[name][last_of_day] for name in LEVELS})
+            frames.append(frame.assign(day=days[last_of_day], hospital=hospital, ward=ward))
+        if not frames:
+            return pd.DataFrame(columns=['day', 'hospital', 'ward'] + LEVELS + ['occupied_beds'])
+        levels = pd.concat(frames, ignore_index=True)
+        levels['occupied_beds'] = levels['total_beds'] - levels['available_beds']
+        return levels
+
+# Global instance
+snapshot_store = SnapshotStore()
+
+def _current_resources():
+    if has_partitions():
+        return load_resources(list_hospitals())
+    if not os.path.exists(RESOURCES_PATH) or os.path.getsize(RESOURCES_PATH) == 0:
+        return pd.DataFrame(columns=['hospital', 'ward'])
+    df = pd.read_csv(RESOURCES_PATH)
+    return df if {'hospital', 'ward'}.issubset(df.columns) else pd.DataFrame(columns=['hospital', 'ward'])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record ward resource levels into the snapshot rings")
+    parser.add_argument("--every", type=float, help="keep recording every this many minutes (default: once)")
+    args = parser.parse_args()
+    while True:
+        print(f"{datetime.now():%Y-%m-%d %H:%M} recorded {snapshot_store.record(_current_resources())} wards")
+        if not args.every:
+            break
+        time.sleep(args.every * 60)
@@ -0,0 +1,59 @@
+import pandas as pd
+import alert_engine
+from alert_engine import AlertEngine, Rule
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+    def __call__(self):
+        return self.now
+
+def _engine(monkeypatch, rules=None):
+    clock = Clock()
+    monkeypatch.setattr(alert_engine.time, 'monotonic', clock)
+    return AlertEngine(rules), clock
+
+def _mismatch(name='Thabo Mokoena', doc='A1234567'):
+    return {'name': name, 'doc_number': doc, 'doc_type': 'Passport', 'nationality': 'South African'}
+
+def test_cooldown_suppresses_repeats_per_key(monkeypatch):
+    engine, clock = _engine(monkeypatch)
+    assert [a['rule'] for a in engine.process('intake', _mismatch())] == ['document_mismatch']
+    assert engine.process('intake', _mismatch()) == []
+    assert engine.stats['suppressed'] == 1
+    # Another document is another key
+    assert len(engine.process('intake', _mismatch(doc='B7654321'))) == 1
+    clock.now += alert_engine.COOLDOWN_SECONDS
+    assert len(engine.process('intake', _mismatch())) == 1
+
+def _ward(available, beds=10):
+    return pd.DataFrame([{'hospital': 'Chris Hani', 'ward': 'A', 'total_beds': beds, 'available_beds': available,
+                          'doctors': 'Dr Dube', 'nurses': 'Sr Nkosi', 'medications': 'Panado', 'medication_stock': '40'}])
+
+def test_level_alerts_fire_when_the_condition_starts(monkeypatch):
+    engine, clock = _engine(monkeypatch)
+    assert [a['rule'] for a in engine.observe_resources(_ward(0))] == ['low_beds']
+    # Still low, with a changed level: the same condition, no new alert
+    assert engine.observe_resources(_ward(0, beds=12)) == []
+    assert engine.observe_resources(_ward(5, beds=12)) == []
+    # Low again after recovering, but inside the cooldown
+    assert engine.observe_resources(_ward(0, beds=12)) == []
+    clock.now += alert_engine.COOLDOWN_SECONDS
+    engine.observe_resources(_ward(5, beds=12))
+    assert [a['rule'] for a in engine.observe_resources(_ward(0, beds=12))] == ['low_beds']
+
+def test_unchanged_resource_version_is_not_reevaluated(monkeypatch):
+    engine, _ = _engine(monkeypatch)
+    engine.observe_resources(_ward(0), version=('cache', 1, 0))
+    events = engine.stats['events']
+    assert engine.observe_resources(_ward(0), version=('cache', 1, 0)) == []
+    assert engine.stats['events'] == events
+
+def test_poll_returns_alerts_after_a_sequence_number(monkeypatch):
+    rule = Rule('always', 'visit', ['cost'], lambda record: True, "{patient_name}", key=['patient_name'], cooldown=0)
+    engine, _ = _engine(monkeypatch, [rule])
+    for name in ('a', 'b', 'c'):
+        engine.process('visit', {'patient_name': name, 'cost': 1})
+    assert [a['message'] for a in engine.poll(after=1)] == ['b', 'c']
+    assert [a['message'] for a in engine.poll(after=0, limit=2)] == ['b', 'c']
+    assert engine.poll(after=engine.last_seq) == []
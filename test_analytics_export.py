@@ -0,0 +1,61 @@
+import gzip
+import multiprocessing
+import pandas as pd
+import pytest
+import analytics_export
+from analytics_export import KEY_ENV, Pseudonymizer, load_key
+
+def _load(path, queue):
+    queue.put(load_key(path))
+
+def test_concurrent_first_use_agrees_on_one_full_key(tmp_path, monkeypatch):
+    monkeypatch.delenv(KEY_ENV, raising=False)
+    path = str(tmp_path / "analytics_export.key")
+    queue = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=_load, args=(path, queue)) for _ in range(8)]
+    for worker in workers:
+        worker.start()
+    keys = [queue.get(timeout=30) for _ in workers]
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+    assert len(set(keys)) == 1
+    assert len(keys[0]) == 2 * analytics_export.KEY_BYTES
+    assert load_key(path) == keys[0]
+    assert [p.name for p in tmp_path.iterdir()] == ["analytics_export.key"]
+
+def test_truncated_key_is_rejected(tmp_path, monkeypatch):
+    monkeypatch.delenv(KEY_ENV, raising=False)
+    path = tmp_path / "analytics_export.key"
+    path.write_bytes(b"abc")
+    with pytest.raises(ValueError):
+        load_key(str(path))
+
+def test_placeholders_and_blanks_tokenize_as_missing():
+    pseudonymizer = Pseudonymizer(key=b"k" * 64)
+    tokens = pseudonymizer.tokenize(pd.Series(["Thabo  Mokoena", "thabo mokoena", "Unknown", " ", None]), 'name')
+    assert tokens[0] == tokens[1]
+    assert tokens[2:].isna().all()
+
+def test_failed_export_leaves_no_files(tmp_path):
+    source = tmp_path / "intake_logs.csv"
+    source.write_text("name,doc_number\nThabo Mokoena,8001015009087\n")
+    destination = tmp_path / "out" / "export.csv.gz"
+    destination.parent.mkdir()
+
+    class Failing(Pseudonymizer):
+        def pseudonymize(self, chunk):
+            raise RuntimeError("disk full")
+
+    with pytest.raises(RuntimeError):
+        analytics_export.export_file(str(source), str(destination), pseudonymizer=Failing(key=b"k" * 64))
+    assert list(destination.parent.iterdir()) == []
+
+def test_export_writes_tokens_not_identities(tmp_path):
+    source = tmp_path / "intake_logs.csv"
+    source.write_text("name,doc_number,result\nThabo Mokoena,8001015009087,ok\nUnknown,,review\n")
+    destination = tmp_path / "export.csv.gz"
+    assert analytics_export.export_file(str(source), str(destination), pseudonymizer=Pseudonymizer(key=b"k" * 64)) == 2
+    text = gzip.decompress(destination.read_bytes()).decode('utf-8')
+    assert "Thabo" not in text and "8001015009087" not in text
+    assert text.splitlines()[0] == "doc_token,patient_token,result"
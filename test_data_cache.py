@@ -0,0 +1,56 @@
+import multiprocessing
+import pandas as pd
+from data_cache import SharedDataCache, append_csv
+
+def _append_in_other_process(path, row):
+    append_csv(pd.DataFrame([row]), path)
+
+def _cache(path):
+    loads = []
+    def loader():
+        loads.append(1)
+        return {'rows': pd.read_csv(path)}
+    return SharedDataCache(loader, [path]), loads
+
+def _settled(cache):
+    """Frames after any background reload the last read started"""
+    cache.get()
+    if cache._refresh_thread is not None:
+        cache._refresh_thread.join(timeout=30)
+    return cache.get()
+
+def test_own_write_through_is_served_without_a_reload(tmp_path):
+    path = str(tmp_path / "rows.csv")
+    pd.DataFrame([{'id': 1, 'who': 'x'}]).to_csv(path, index=False)
+    cache, loads = _cache(path)
+    cache.get()
+    cache.append('rows', [{'id': 2, 'who': 'self'}], path)
+    assert list(_settled(cache)['rows']['id']) == [1, 2]
+    assert len(loads) == 1
+
+def test_other_process_rows_survive_our_write_through(tmp_path):
+    path = str(tmp_path / "rows.csv")
+    pd.DataFrame([{'id': 1, 'who': 'x'}]).to_csv(path, index=False)
+    cache, loads = _cache(path)
+    cache.get()
+    other = multiprocessing.Process(target=_append_in_other_process, args=(path, {'id': 2, 'who': 'fromB'}))
+    other.start()
+    other.join()
+    assert other.exitcode == 0
+    cache.append('rows', [{'id': 3, 'who': 'fromA'}], path)
+    assert sorted(_settled(cache)['rows']['id']) == [1, 2, 3]
+    assert len(loads) == 2
+
+def test_versions_change_only_for_the_dataset_written(tmp_path):
+    cache = SharedDataCache(lambda: {'a': pd.DataFrame({'x': [1]}), 'b': pd.DataFrame({'y': [1]})}, [])
+    _, before = cache.snapshot()
+    cache.append('a', [{'x': 2}])
+    frames, after = cache.snapshot()
+    assert after['a'] != before['a'] and after['b'] == before['b']
+    assert list(frames['a']['x']) == [1, 2]
+
+def test_a_replacement_cache_never_reissues_versions():
+    loader = lambda: {'a': pd.DataFrame({'x': [1]})}
+    _, first = SharedDataCache(loader, []).snapshot()
+    _, second = SharedDataCache(loader, []).snapshot()
+    assert first['a'] != second['a']
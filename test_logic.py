@@ -0,0 +1,13 @@
+import pandas as pd
+from logic import ELIGIBLE_FREE, ELIGIBLE_SUBSIDIZED, MANUAL_REVIEW, PAYMENT_REQUIRED, classify_patient, classify_patients
+
+def test_batch_rules_tolerate_missing_values():
+    nationality = pd.Series(['South African', 'Zimbabwe', pd.NA, 'Malawi'], dtype='string')
+    doc_type = pd.Series(['RSA ID', 'Permit', 'Passport', pd.NA], dtype='string')
+    legal_status = pd.Series(['Valid', 'Valid', pd.NA, pd.NA], dtype='string')
+    assert list(classify_patients(nationality, doc_type, legal_status)) == [
+        ELIGIBLE_FREE, ELIGIBLE_SUBSIDIZED, PAYMENT_REQUIRED, MANUAL_REVIEW]
+
+def test_single_patient_follows_the_batch_rules():
+    assert classify_patient("South African", "RSA ID", "Invalid") == PAYMENT_REQUIRED
+    assert classify_patient("Somalia", "Asylum", "Unknown") == MANUAL_REVIEW
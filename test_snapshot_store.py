@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+from snapshot_store import SnapshotStore
+
+def _resources(available):
+    return pd.DataFrame([{'hospital': 'Chris Hani', 'ward': 'A', 'total_beds': 10, 'available_beds': available,
+                          'doctors': 'Dr Dube', 'nurses': 'Sr Nkosi', 'medications': 'Panado', 'medication_stock': '40'}])
+
+def _store(root):
+    # One-minute cadence and three records of retention
+    return SnapshotStore(root=str(root), cadence_minutes=1, retention_days=3 / 1440)
+
+def test_ring_wraps_and_keeps_the_latest_records_contiguous(tmp_path):
+    store = _store(tmp_path)
+    start = pd.Timestamp('2026-10-19 08:00')
+    for minute in range(5):
+        assert store.record(_resources(minute), when=start + pd.Timedelta(minutes=minute)) == 1
+    ring = store.ring('Chris Hani', 'A')
+    assert ring.capacity == 3 and ring.written == 5
+    window = ring.window()
+    assert list(window['available_beds']) == [2, 3, 4]
+    assert np.shares_memory(window, ring.records)
+    # Every slot is mirrored, so both halves hold the same records
+    assert (ring.records[:3] == ring.records[3:]).all()
+    assert list(ring.window(last=2)['available_beds']) == [3, 4]
+
+def test_history_range_and_reopen_from_disk(tmp_path):
+    store = _store(tmp_path)
+    start = pd.Timestamp('2026-10-19 08:00')
+    for minute in range(4):
+        store.record(_resources(minute), when=start + pd.Timedelta(minutes=minute))
+    history = store.history('Chris Hani', 'A', start + pd.Timedelta(minutes=2), start + pd.Timedelta(minutes=3))
+    assert list(history['available_beds']) == [2, 3]
+    reopened = _store(tmp_path)
+    assert reopened.wards() == [('Chris Hani', 'A')]
+    assert list(reopened.history('Chris Hani', 'A')['available_beds']) == [1, 2, 3]
+
+def test_one_record_per_cadence_slot(tmp_path):
+    store = _store(tmp_path)
+    when = pd.Timestamp('2026-10-19 08:00:10')
+    assert store.record(_resources(5), when=when) == 1
+    assert store.record(_resources(6), when=when + pd.Timedelta(seconds=30)) == 0
+    assert list(store.history('Chris Hani', 'A')['available_beds']) == [5]
@@ -0,0 +1,21 @@
+import numpy as np
+import pandas as pd
+from treatment_plans import patient_categories, patient_category, price_visits
+
+def test_categories_match_the_scalar_rules_and_tolerate_missing_values():
+    nationality = pd.Series(['South African', 'Zimbabwe', 'Zimbabwe', pd.NA, 'South African'], dtype='string')
+    legal_status = pd.Series(['Valid', 'Valid', pd.NA, 'Valid', pd.NA], dtype='string')
+    expected = ['SA Residents', 'Legal Immigrants', 'Illegal Immigrants', 'Legal Immigrants', 'SA Residents']
+    assert list(patient_categories(nationality, legal_status)) == expected
+    assert list(patient_categories(nationality.astype('category'), legal_status.to_numpy(dtype=object))) == expected
+    assert patient_category('Zimbabwe', None) == expected[2]
+
+def test_price_visits_with_string_dtype_patients():
+    patients = pd.DataFrame({
+        'full_name': ['Thabo Mokoena', 'Chipo Dube'],
+        'nationality': ['South African', pd.NA],
+        'legal_status': ['Valid', pd.NA],
+    }).astype('string')
+    visits = pd.DataFrame({'patient_name': ['Thabo Mokoena', 'Chipo Dube', 'Nobody'],
+                           'diagnosis': ['Hypertension', 'Type 2 Diabetes', 'Hypertension']})
+    assert np.allclose(price_visits(visits, patients), [0, 1150, 800])
@@ -1,17 +1,130 @@
 import random
-from datetime import datetime
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import datetime, timedelta
 import pandas as pd
 from treatment_plans import CONDITIONS, get_treatment_plan
 import streamlit as st
 
+HISTORY_FIELDS = ['visit_date', 'diagnosis', 'treatment', 'outcome']
+HISTORY_DAYS = 365
+
+class PatientHistoryStore:
+    """Per-patient visit history kept sorted by date for O(log n) range queries"""
+    def __init__(self):
+        self._dates = {}    # patient_id -> sorted list of visit timestamps (ns)
+        self._visits = {}   # patient_id -> visit dicts aligned with _dates
+        self._digests = {}
+
+    def load(self, visits_df, patient_col='patient_id'):
+        """Bulk-load a visits frame, replacing any existing history"""
+        self._dates, self._visits, self._digests = {}, {}, {}
+        if visits_df.empty:
+            return
+        visits = visits_df.assign(visit_date=pd.to_datetime(visits_df['visit_date'], errors='coerce'))
+        visits = visits[visits[patient_col].notna() & visits['visit_date'].notna()].sort_values('visit_date', kind='stable')
+        fields = [f for f in HISTORY_FIELDS if f in visits.columns]
+        for patient_id, group in visits.groupby(patient_col, sort=False):
+            self._dates[patient_id] = group['visit_date'].astype('datetime64[ns]').astype('int64').tolist()
+            self._visits[patient_id] = group[fields].to_dict('records')
+
+    def add_visit(self, patient_id, visit_date, **details):
+        """Record one visit in date order; returns the patient's new history digest"""
+        stamp = pd.Timestamp(visit_date).value
+        dates = self._dates.setdefault(patient_id, [])
+        visits = self._visits.setdefault(patient_id, [])
+        position = bisect_right(dates, stamp)
+        dates.insert(position, stamp)
+        visits.insert(position, {'visit_date': pd.Timestamp(stamp), **details})
+        self._digests.pop(patient_id, None)
+        return self.digest(patient_id)
+
+    def visits_between(self, patient_id, start=None, end=None):
+        """Visits with start <= visit_date <= end, found by binary search"""
+        dates = self._dates.get(patient_id, [])
+        lo = bisect_left(dates, pd.Timestamp(start).value) if start is not None else 0
+        hi = bisect_right(dates, pd.Timestamp(end).value) if end is not None else len(dates)
+        return self._visits.get(patient_id, [])[lo:hi]
+
+    def visit_count(self, patient_id):
+        return len(self._dates.get(patient_id, []))
+
+    def digest(self, patient_id):
+        """Cheap identity of a patient's history; changes whenever a visit is added"""
+        if patient_id not in self._digests:
+            dates = self._dates.get(patient_id, [])
+            self._digests[patient_id] = f"{patient_id}:{len(dates)}:{dates[-1] if dates else 0}"
+        return self._digests[patient_id]
+
 class TreatmentAI:
+    CACHE_SIZE = 1024
+
     def __init__(self):
-        self.patient_history = pd.DataFrame(columns=[
-            'patient_id', 'visit_date', 'diagnosis', 'treatment', 'outcome'
-        ])
-        
-    def generate_suggestions(self, diagnosis, patient_history=None):
-        """Generate AI-enhanced treatment suggestions"""
+        self.patient_history = PatientHistoryStore()
+        self._suggestion_cache = OrderedDict()
+        self._cache_keys = {}   # patient_id -> cache keys built from that patient's history
+        # Shared by every session's script thread; guards the history and both cache maps
+        self._lock = threading.Lock()
+
+    def load_history(self, visits_df, patients_df=None):
+        """Fill the history from a visits frame, keyed by doc_number like record_visit.
+
+        Visits without a doc_number are matched to one through the patients'
+        names; visits that match no patient are left out.
+        """
+        visits = visits_df.copy()
+        if 'doc_number' not in visits.columns:
+            visits['doc_number'] = pd.NA
+        if patients_df is not None and {'name', 'doc_number'}.issubset(patients_df.columns) and 'patient_name' in visits.columns:
+            names = patients_df['name'].astype('string').str.strip()
+            docs = patients_df.assign(_name=names, doc_number=patients_df['doc_number'].replace('', pd.NA))
+            docs = docs[docs['_name'].notna() & docs['doc_number'].notna() & (docs['_name'] != 'Unknown')]
+            docs = docs.drop_duplicates('_name', keep='last').set_index('_name')['doc_number']
+            missing = visits['doc_number'].isna()
+            visits.loc[missing, 'doc_number'] = visits.loc[missing, 'patient_name'].astype('string').str.strip().map(docs)
+        with self._lock:
+            self.patient_history.load(visits, patient_col='doc_number')
+            self._suggestion_cache.clear()
+            self._cache_keys.clear()
+        return self
+
+    def record_visit(self, patient_id, visit_date, **details):
+        """Add a visit to the history and drop suggestions cached against the old history"""
+        with self._lock:
+            for key in self._cache_keys.pop(patient_id, ()):
+                self._suggestion_cache.pop(key, None)
+            return self.patient_history.add_visit(patient_id, visit_date, **details)
+
+    def generate_suggestions(self, diagnosis, patient_history=None, patient_id=None):
+        """Generate AI-enhanced treatment suggestions, memoized per (diagnosis, history digest)"""
+        if patient_id is None:
+            return self._build_suggestions(diagnosis, patient_history)
+
+        # The window start is part of the key: the same history yields a different year of visits tomorrow
+        start = (datetime.now() - timedelta(days=HISTORY_DAYS)).date()
+        with self._lock:
+            key = (patient_id, diagnosis, self.patient_history.digest(patient_id), start)
+            if key in self._suggestion_cache:
+                self._suggestion_cache.move_to_end(key)
+                return self._suggestion_cache[key]
+            history = self.patient_history.visits_between(patient_id, start=start)
+
+        suggestions = self._build_suggestions(diagnosis, history)
+        if "error" not in suggestions:
+            with self._lock:
+                self._suggestion_cache[key] = suggestions
+                self._cache_keys.setdefault(patient_id, set()).add(key)
+                if len(self._suggestion_cache) > self.CACHE_SIZE:
+                    evicted, _ = self._suggestion_cache.popitem(last=False)
+                    keys = self._cache_keys.get(evicted[0])
+                    if keys is not None:
+                        keys.discard(evicted)
+                        if not keys:
+                            del self._cache_keys[evicted[0]]
+        return suggestions
+
+    def _build_suggestions(self, diagnosis, patient_history):
         base_plan = get_treatment_plan(diagnosis, "SA Residents")
         
         try:
@@ -48,8 +161,19 @@ class TreatmentAI:
                 "recommendation": "Consider adding SGLT2 inhibitor if HbA1c > 8%",
                 "evidence": "Reduces cardiovascular risk by 30%"
             })
+
+        # Repeat presentations in the last year suggest the current plan is not holding
+        if isinstance(patient_history, list):
+            repeats = sum(1 for visit in patient_history if visit.get('diagnosis') == diagnosis)
+            if repeats >= 3:
+                recommendations.append({
+                    "type": "Care Review",
+                    "recommendation": f"{repeats} visits for {diagnosis} in the past year - review adherence and escalate plan",
+                    "evidence": "Patient visit history"
+                })
             
-        # Add random simulated recommendations if none matched
+        # Add a simulated recommendation if none matched, seeded by the diagnosis so a
+        # cached suggestion and a fresh one for the same case agree
         if not recommendations:
             options = [
                 "Consider genetic testing for drug metabolism",
@@ -59,7 +183,7 @@ class TreatmentAI:
             ]
             recommendations.append({
                 "type": "General Recommendation",
-                "recommendation": random.choice(options),
+                "recommendation": random.Random(diagnosis).choice(options),
                 "evidence": "Based on similar patient profiles"
             })
             
@@ -93,9 +217,9 @@ class TreatmentAI:
 # Global instance
 treatment_ai = TreatmentAI()
 
-def generate_treatment_plan(diagnosis, patient_history=None):
+def generate_treatment_plan(diagnosis, patient_history=None, patient_id=None):
     """Get AI-enhanced treatment plan with fallback"""
     try:
-        return treatment_ai.generate_suggestions(diagnosis, patient_history)
+        return treatment_ai.generate_suggestions(diagnosis, patient_history, patient_id)
     except Exception:
         return get_treatment_plan(diagnosis, "SA Residents")
\ No newline at end of file
@@ -1,10 +1,14 @@
 # treatment_plans.py
+import numpy as np
+import pandas as pd
+
 CONDITIONS = {
     "Hypertension": {
-        "treatment_plan": "Lifestyle changes and medication based on severity",
+        "treatment_plan": "Lifestyle changes (salt reduction, exercise, stress management) and medication based on severity",
         "medications": [
             {"name": "Amlodipine", "dosage": "5-10 mg", "frequency": "Once daily"},
-            {"name": "Hydrochlorothiazide", "dosage": "12.5-25 mg", "frequency": "Once daily"}
+            {"name": "Hydrochlorothiazide", "dosage": "12.5-25 mg", "frequency": "Once daily"},
+            {"name": "Enalapril/Losartan", "dosage": "10-40 mg", "frequency": "Once daily"}
         ],
         "costs": {
             "SA Residents": 0,
@@ -27,6 +31,9 @@ CONDITIONS = {
     # Add all other conditions similarly
 }
 
+# Tariff columns, in the order used by the cost matrix
+PATIENT_CATEGORIES = ["SA Residents", "Legal Immigrants", "Illegal Immigrants"]
+
 def get_condition_options():
     return list(CONDITIONS.keys())
 
@@ -37,4 +44,71 @@ def get_treatment_plan(condition, patient_status):
         "treatment": plan.get("treatment_plan", ""),
         "medications": plan.get("medications", []),
         "cost": cost
-    }
\ No newline at end of file
+    }
+
+def patient_category(nationality, legal_status):
+    """Tariff category for one patient"""
+    if nationality == 'South African':
+        return "SA Residents"
+    if legal_status == 'Valid':
+        return "Legal Immigrants"
+    return "Illegal Immigrants"
+
+def _is(values, *options):
+    """Boolean mask of values among options; missing values (None, NaN, pd.NA) never match"""
+    return pd.Series(values).isin(options).to_numpy(dtype=bool)
+
+def patient_categories(nationality, legal_status):
+    """Vectorized patient_category over aligned nationality/legal_status arrays"""
+    return np.select(
+        [_is(nationality, 'South African'), _is(legal_status, 'Valid')],
+        PATIENT_CATEGORIES[:2],
+        default=PATIENT_CATEGORIES[2]
+    )
+
+class TariffCatalog:
+    """CONDITIONS compiled into a (condition x patient category) cost matrix"""
+    def __init__(self, conditions=CONDITIONS):
+        self.conditions = pd.Index(list(conditions))
+        self.categories = pd.Index(PATIENT_CATEGORIES)
+        self.matrix = np.array([
+            [conditions[name].get("costs", {}).get(category, 0) for category in PATIENT_CATEGORIES]
+            for name in self.conditions
+        ], dtype=float).reshape(len(self.conditions), len(PATIENT_CATEGORIES))
+
+    def price(self, diagnosis, category):
+        """Tariff for a single diagnosis/category; 0 for unknown conditions, like get_treatment_plan"""
+        prices = self.price_batch([diagnosis], [category], default=0.0)
+        return float(prices[0])
+
+    def price_batch(self, diagnoses, categories, default=np.nan):
+        """Tariffs for aligned arrays of diagnoses and categories via matrix indexing"""
+        rows = self.conditions.get_indexer(pd.Index(diagnoses, dtype=object))
+        cols = self.categories.get_indexer(pd.Index(categories, dtype=object))
+        known = (rows >= 0) & (cols >= 0)
+        prices = np.full(len(rows), default, dtype=float)
+        prices[known] = self.matrix[rows[known], cols[known]]
+        return prices
+
+    def price_visits(self, visits_df, patients_df=None):
+        """Tariff for every visit; patient category comes from the visit row or, failing that, patients_df by name"""
+        visits = visits_df
+        if not {'nationality', 'legal_status'}.issubset(visits.columns):
+            if patients_df is None:
+                raise ValueError("visits_df lacks nationality/legal_status and no patients_df was given")
+            name_col = 'full_name' if 'full_name' in patients_df.columns else 'name'
+            lookup = (
+                patients_df[[name_col, 'nationality', 'legal_status']]
+                .drop_duplicates(subset=name_col, keep='last')
+                .set_index(name_col)
+            )
+            visits = visits.drop(columns=['nationality', 'legal_status'], errors='ignore').join(lookup, on='patient_name')
+        categories = patient_categories(visits['nationality'], visits['legal_status'])
+        return pd.Series(self.price_batch(visits['diagnosis'], categories), index=visits_df.index, name='tariff')
+
+# Global instance
+tariff_catalog = TariffCatalog()
+
+def price_visits(visits_df, patients_df=None):
+    """Price a batch of visits against the treatment plan catalog"""
+    return tariff_catalog.price_visits(visits_df, patients_df)
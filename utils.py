@@ -2,6 +2,11 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime
 import os
+import tempfile
+from audit_log import record_event
+from analytics_export import export_file
+from identity_matcher import verify_status
+from logic import classify_patient
 
 # --- Custom CSS for styling ---
 st.markdown(
@@ -38,6 +43,9 @@ st.set_page_config(page_title="Batho Pele Intake AI", layout="wide")
 # --- Paths and Data ---
 DATA_DIR = "data"
 LOG_PATH = os.path.join(DATA_DIR, "intake_logs.csv")
+EXPORT_DIR = os.path.join(DATA_DIR, "exports")
+# Streamlit holds a download in memory, so only extracts up to this size are offered in the browser
+DOWNLOAD_LIMIT_BYTES = 50 * 2**20
 
 if not os.path.exists(DATA_DIR):
     os.makedirs(DATA_DIR)
@@ -98,36 +106,10 @@ with st.expander("📋 Patient Intake Form", expanded=True):
 
 submit = st.button("🔍 Check Eligibility")
 
-# --- Eligibility Logic ---
-def classify_patient(nationality, doc_type, legal_status):
-    if nationality == "South African" and doc_type == "RSA ID" and legal_status == "Valid":
-        return "✅ Eligible for Free Public Healthcare"
-    elif doc_type in ["Permit", "Asylum"] and legal_status == "Valid":
-        return "🟡 Eligible for Subsidized or Emergency Care"
-    elif doc_type in ["Passport", "No Document"] or legal_status == "Invalid":
-        return "🔴 Payment Required or Refer to Admin"
-    else:
-        return "⚠️ Needs Manual Review"
-
-# --- Simulated Home Affairs Verification (mock) ---
+# --- Home Affairs Verification (cached registry client, fuzzy identity matching) ---
 def verify_legal_status(name, nationality, doc_type, doc_number):
     try:
-        df = pd.read_csv("mock_home_affairs.csv")
-        name_clean = name.strip().lower()
-        nationality_clean = nationality.strip().lower()
-        doc_type_clean = doc_type.strip().lower()
-        doc_number_clean = doc_number.strip()
-
-        match = df[
-            (df['full_name'].str.lower() == name_clean) &
-            (df['nationality'].str.lower() == nationality_clean) &
-            (df['doc_type'].str.lower() == doc_type_clean) &
-            (df['doc_number'] == doc_number_clean)
-        ]
-        if not match.empty:
-            return match.iloc[0]['legal_status']
-        else:
-            return "Unknown"
+        return verify_status(name, nationality, doc_number)
     except Exception as e:
         return f"Error: {e}"
 
@@ -152,6 +134,10 @@ if submit:
     else:
         legal_status = verify_legal_status(name, nationality, doc_type, doc_number)
         result = classify_patient(nationality, doc_type, legal_status)
+        record_event('verification', name=name, nationality=nationality, doc_type=doc_type,
+                     doc_number=doc_number, legal_status=legal_status)
+        record_event('intake', name=name, nationality=nationality, doc_type=doc_type,
+                     doc_number=doc_number, legal_status=legal_status, result=result)
 
         st.subheader(f"🩺 Eligibility Result for {name}:")
         st.info(result)
@@ -169,9 +155,27 @@ with st.sidebar:
     if st.checkbox("Show Logged Patients"):
         st.dataframe(df_logs)
 
-    if st.button("Download Logs CSV"):
-        csv = df_logs.to_csv(index=False).encode('utf-8')
-        st.download_button("Download CSV", data=csv, file_name="intake_logs.csv", mime="text/csv")
+    if st.button("Export Logs for Analytics") and os.path.exists(LOG_PATH):
+        # Streamed in chunks to a gzip on disk; names and document numbers become HMAC tokens.
+        # A private file per export, so concurrent sessions don't overwrite each other's extract;
+        # it stays on disk for collection, and only small extracts are also sent to the browser
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        fd, export_path = tempfile.mkstemp(dir=EXPORT_DIR, prefix=f"intake_logs_analytics_{datetime.now():%Y%m%d_%H%M%S}_",
+                                           suffix=".csv.gz")
+        os.close(fd)
+        try:
+            rows = export_file(LOG_PATH, export_path)
+        except Exception:
+            os.remove(export_path)
+            raise
+        size = os.path.getsize(export_path)
+        st.caption(f"{rows} records pseudonymized to {export_path} ({size / 2**20:.1f} MB)")
+        if size <= DOWNLOAD_LIMIT_BYTES:
+            with open(export_path, 'rb') as export:
+                st.download_button("Download Export", data=export, file_name="intake_logs_analytics.csv.gz",
+                                   mime="application/gzip")
+        else:
+            st.info("Extract is too large to download in the browser; collect it from the path above.")
 
     st.markdown("---")
     st.write("Contact: support@bathopele.gov.za")
@@ -0,0 +1,96 @@
+# visit_segments.py
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+import pandas as pd
+
+class VisitSegmentStore:
+    """Visits split into daily (or monthly) segments with parsed timestamps and min/max metadata.
+
+    Range queries use the sorted segment keys to find candidates and the
+    metadata to skip segments outside the range, so "today" or "last 7 days"
+    only touch the segments they need.
+    """
+    def __init__(self, granularity='D'):
+        self.granularity = granularity
+        self._keys = []        # sorted segment start timestamps
+        self._segments = {}    # key -> DataFrame with visit_date as datetime64
+        self.metadata = {}     # key -> {'min': Timestamp, 'max': Timestamp, 'rows': int}
+        self.columns = []
+
+    @classmethod
+    def from_frame(cls, visits_df, granularity='D'):
+        store = cls(granularity)
+        store.add_visits(visits_df)
+        return store
+
+    def _segment_key(self, timestamps):
+        return timestamps.dt.to_period(self.granularity).dt.start_time
+
+    def add_visits(self, visits_df):
+        """Parse visit dates once and file each visit under its segment"""
+        if visits_df.empty:
+            self.columns = self.columns or list(visits_df.columns)
+            return self
+        visits = visits_df.assign(visit_date=pd.to_datetime(visits_df['visit_date'], errors='coerce'))
+        visits = visits[visits['visit_date'].notna()]
+        self.columns = list(dict.fromkeys(self.columns + list(visits.columns)))
+        for key, segment in visits.groupby(self._segment_key(visits['visit_date'])):
+            if key in self._segments:
+                segment = pd.concat([self._segments[key], segment], ignore_index=True)
+            else:
+                self._keys.insert(bisect_left(self._keys, key), key)
+            self._segments[key] = segment.reset_index(drop=True)
+            self.metadata[key] = {
+                'min': segment['visit_date'].min(),
+                'max': segment['visit_date'].max(),
+                'rows': len(segment)
+            }
+        return self
+
+    def record_visit(self, visit):
+        return self.add_visits(pd.DataFrame([visit]))
+
+    def _matching_keys(self, start, end):
+        start = pd.Timestamp(start)
+        end = pd.Timestamp(end)
+        first_key = pd.Timestamp(start).to_period(self.granularity).start_time
+        lo = bisect_left(self._keys, first_key)
+        hi = bisect_right(self._keys, end)
+        return [
+            key for key in self._keys[lo:hi]
+            if self.metadata[key]['max'] >= start and self.metadata[key]['min'] <= end
+        ]
+
+    def between(self, start, end):
+        """Visits with start <= visit_date <= end (end inclusive to the end of its day)"""
+        start = pd.Timestamp(start).normalize()
+        end = pd.Timestamp(end).normalize() + pd.Timedelta(days=1) - pd.Timedelta(1, unit='ns')
+        keys = self._matching_keys(start, end)
+        if not keys:
+            return pd.DataFrame(columns=self.columns)
+        visits = pd.concat([self._segments[key] for key in keys], ignore_index=True)
+        # Only boundary segments can hold visits outside the range
+        if self.metadata[keys[0]]['min'] < start or self.metadata[keys[-1]]['max'] > end:
+            visits = visits[(visits['visit_date'] >= start) & (visits['visit_date'] <= end)]
+        return visits.reset_index(drop=True)
+
+    def count_between(self, start, end):
+        """Visit count from segment metadata alone when the range covers whole segments"""
+        start = pd.Timestamp(start).normalize()
+        end = pd.Timestamp(end).normalize() + pd.Timedelta(days=1) - pd.Timedelta(1, unit='ns')
+        keys = self._matching_keys(start, end)
+        if all(self.metadata[k]['min'] >= start and self.metadata[k]['max'] <= end for k in keys):
+            return sum(self.metadata[k]['rows'] for k in keys)
+        return len(self.between(start, end))
+
+    def today(self, now=None):
+        now = pd.Timestamp(now or datetime.now())
+        return self.between(now, now)
+
+    def last_days(self, days, now=None):
+        now = pd.Timestamp(now or datetime.now())
+        return self.between(now - pd.Timedelta(days=days), now)
+
+    def this_month(self, now=None):
+        now = pd.Timestamp(now or datetime.now())
+        return self.between(now.replace(day=1), now)